@@ -69,6 +69,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "DENRO.context_processors.nav_templates",
+                "DENRO.context_processors.notifications",
             ],
         },
     },
@@ -128,6 +129,10 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 
+# Uploaded photos (GeoTaggedImage files)
+MEDIA_URL = "/media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -150,6 +155,129 @@ GOOGLE_STATIC_MAPS_KEY = config('GOOGLE_STATIC_MAPS_KEY')
 # Mapbox API Token
 MAPBOX_TOKEN = config('MAPBOX_TOKEN', default='sk.eyJ1IjoiY2Fwc3RvbmUtZGVucm8iLCJhIjoiY21mM3JvMTIxMDE0aDJpc2c5eW9jOTAxbSJ9.mKKeeW21OUkqBalJeLRWRQ')
 
+# Location ingest filter (see DENRO/locations.py). Fixes that are less
+# accurate than MAX_ACCURACY_M, or closer than MIN_DISTANCE_M / sooner than
+# MIN_INTERVAL_S after the previous stored fix, are dropped; a stationary
+# device still stores one point every STATIONARY_INTERVAL_S.
+LOCATION_FILTER = {
+    "ENABLED": True,
+    "MIN_DISTANCE_M": 25,
+    "MIN_INTERVAL_S": 30,
+    "STATIONARY_INTERVAL_S": 600,
+    "MAX_ACCURACY_M": 200,
+}
+
+# Dashboard numbers (see DENRO/stats.py). They are cached for CACHE_TTL
+# seconds; with USE_COUNTERS they are instead read from StatCounter rows
+# that the User/EnumeratorsReport signals keep exact.
+DASHBOARD_STATS = {
+    "CACHE_TTL": 30,
+    "USE_COUNTERS": False,
+}
+
+# Activity log writes (see DENRO/activity.py). With ASYNC the request path
+# only queues the row; a background thread inserts queued rows in batches
+# of up to MAX_BATCH every FLUSH_INTERVAL_S seconds. Keep it off for tests
+# and management commands that read their own logs back immediately.
+ACTIVITY_LOG_WRITER = {
+    "ASYNC": config('ACTIVITY_LOG_ASYNC', default=False, cast=bool),
+    "MAX_BATCH": 200,
+    "FLUSH_INTERVAL_S": 1.0,
+    "MAX_QUEUE": 10000,
+    "BLOCK_TIMEOUT_S": 0.5,
+}
+
+# Activity log archival (see DENRO/archive.py). archive_activity_logs moves
+# rows older than RETENTION_DAYS (per-action overrides in
+# ACTION_RETENTION_DAYS) into gzipped JSONL files under DIR, one per day.
+ACTIVITY_LOG_ARCHIVE = {
+    "DIR": BASE_DIR / "archive" / "activity_logs",
+    "RETENTION_DAYS": 180,
+    "ACTION_RETENTION_DAYS": {},
+    "CHUNK_SIZE": 2000,
+}
+
+# Notification bell and feed API (see DENRO/notifications.py). Long-polling
+# needs the ASGI server and a cache shared by all workers (e.g. Redis) to
+# see changes made in other processes; under WSGI the bell polls every
+# POLL_INTERVAL_S instead.
+NOTIFICATIONS = {
+    "COUNT_TTL": 600,
+    "LIST_SIZE": 10,
+    "LONG_POLL_MAX_S": 25,
+    "LONG_POLL_INTERVAL_S": 1.0,
+    "POLL_INTERVAL_S": 15,
+}
+
+# Live map updates (see DENRO/pubsub.py and location_stream). The
+# in-process broker only works with a single ASGI worker; set
+# PUBSUB_BACKEND=DENRO.pubsub.RedisBroker when running more.
+PUBSUB = {
+    "BACKEND": config('PUBSUB_BACKEND', default='DENRO.pubsub.InProcessBroker'),
+    "REDIS_URL": config('REDIS_URL', default='redis://localhost:6379/0'),
+    "QUEUE_SIZE": 100,
+}
+LIVE_LOCATIONS = {
+    "HEARTBEAT_S": 15,
+    "MAX_STREAM_S": 300,
+    "RETRY_MS": 3000,
+}
+
+# Map endpoint clustering (see DENRO/mapfeatures.py)
+MAP_FEATURES = {
+    "CELL_PX": 64,
+    "MAX_CELLS": 300,
+}
+
+# Geohash spatial index lookups (see DENRO/spatial.py)
+SPATIAL_INDEX = {
+    "MAX_COVER_CELLS": 16,
+}
+
+# Protected-area boundary lookups (see DENRO/boundaries.py)
+BOUNDARIES = {
+    "GRID_CELL_DEG": 0.02,
+}
+
+# Geofence transitions on location pings (see DENRO/geofence.py): who
+# hears about a user of each role crossing a protected-area boundary
+GEOFENCE = {
+    "ENABLED": True,
+    "NOTIFY_ROLES": {
+        "EVALUATOR": ["CENRO"],
+        "CENRO": ["PENRO"],
+        "PENRO": ["ADMIN"],
+    },
+}
+
+# Resumable photo uploads (see DENRO/uploads.py). Part files live in DIR
+# until finalized; run purge_uploads daily to drop abandoned ones.
+UPLOADS = {
+    "DIR": BASE_DIR / "uploads" / "partial",
+    "MAX_BYTES": 25 * 1024 * 1024,
+    "MAX_CHUNK_BYTES": 4 * 1024 * 1024,
+    "EXPIRE_HOURS": 48,
+}
+
+# Photo storage and derivatives (see DENRO/images.py). Thumbnails and
+# web-sized copies are rendered by a thread pool after each upload;
+# generate_image_derivatives catches up on any that are missing.
+IMAGES = {
+    "ASYNC": True,
+    "WORKERS": 2,
+    "VARIANTS": {
+        "thumb": {"SIZE": 320, "QUALITY": 75},
+        "web": {"SIZE": 1600, "QUALITY": 82},
+    },
+}
+
+# Likely-duplicate photo flags on the report review pages (see
+# DENRO/duplicates.py). Photos are hashed after upload; index_photo_hashes
+# hashes the existing archive.
+DUPLICATES = {
+    "MAX_DISTANCE": 10,
+}
+
 # CSRF Failure View
 CSRF_FAILURE_VIEW = 'DENRO.views.csrf_failure'
 
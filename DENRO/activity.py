@@ -0,0 +1,193 @@
+# DENRO/activity.py
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+# Defaults for settings.ACTIVITY_LOG_WRITER. With ASYNC off (the default,
+# and what tests get) log_activity() inserts the row before returning. With
+# ASYNC on, rows are queued and a background thread inserts them with
+# bulk_create once MAX_BATCH rows are waiting or FLUSH_INTERVAL_S has
+# passed. At most MAX_QUEUE + MAX_BATCH rows are held in memory; when the
+# queue is full the caller waits up to BLOCK_TIMEOUT_S and then writes the
+# row itself, so events are slowed down rather than dropped.
+WRITER_DEFAULTS = {
+    "ASYNC": False,
+    "MAX_BATCH": 200,
+    "FLUSH_INTERVAL_S": 1.0,
+    "MAX_QUEUE": 10000,
+    "BLOCK_TIMEOUT_S": 0.5,
+}
+
+
+# Time allowed on top of FLUSH_INTERVAL_S for a backed-up queue to drain
+DRAIN_MARGIN = timedelta(seconds=30)
+
+
+def get_writer_settings() -> Dict:
+    return {**WRITER_DEFAULTS, **getattr(settings, "ACTIVITY_LOG_WRITER", {})}
+
+
+def written_before() -> datetime:
+    """
+    A moment before which every event is in ActivityLog, whichever process
+    logged it. Each process's writer only buffers for FLUSH_INTERVAL_S,
+    and flush_activity_log() can't reach another process's queue, so
+    readers that need complete counts up to some moment (the rollups) wait
+    until this has passed it.
+    """
+    config = get_writer_settings()
+    if not config["ASYNC"]:
+        return timezone.now()
+    return timezone.now() - timedelta(seconds=config["FLUSH_INTERVAL_S"]) - DRAIN_MARGIN
+
+
+class _Flush:
+    """Queue marker: wake the writer, write everything queued so far."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class ActivityLogWriter:
+    """Background thread draining a bounded queue of ActivityLog rows."""
+
+    def __init__(self, max_batch: int, flush_interval: float, max_queue: int,
+                 block_timeout: float):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.pid = os.getpid()
+        self.thread = threading.Thread(
+            target=self._run, name="activity-log-writer", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, entry: ActivityLog) -> bool:
+        """Queue a row; False if the queue stayed full (caller writes it)."""
+        try:
+            self.queue.put(entry, timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every row queued before this call is written."""
+        marker = _Flush()
+        self.queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+
+    def _run(self):
+        batch: List[ActivityLog] = []
+        markers: List[_Flush] = []
+        deadline = None
+        while True:
+            wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            stop = item is _STOP
+            if isinstance(item, ActivityLog):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            elif isinstance(item, _Flush):
+                markers.append(item)
+
+            if batch and (item is None or stop or markers or len(batch) >= self.max_batch):
+                self._write(batch)
+                batch, deadline = [], None
+            for marker in markers:
+                marker.done.set()
+            markers = []
+            if stop:
+                connection.close()
+                return
+
+    def _write(self, batch: List[ActivityLog]):
+        close_old_connections()
+        try:
+            ActivityLog.objects.bulk_create(batch)
+        except Exception:
+            # Don't let one bad batch kill the thread (or grow the queue
+            # forever by retrying it).
+            logger.exception("Dropped %d activity log rows", len(batch))
+
+
+_writer: Optional[ActivityLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer(config: Dict) -> ActivityLogWriter:
+    global _writer
+    # A forked worker inherits the parent's writer object but not its
+    # thread; start a fresh one per process.
+    if _writer is None or _writer.pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = ActivityLogWriter(
+                    config["MAX_BATCH"], config["FLUSH_INTERVAL_S"],
+                    config["MAX_QUEUE"], config["BLOCK_TIMEOUT_S"],
+                )
+    return _writer
+
+
+def log_activity(user, action: str, details: Optional[str] = None,
+                 ip_address: Optional[str] = None):
+    """
+    Record an ActivityLog event. Every view should log through here rather
+    than calling ActivityLog.objects.create() so the write can be buffered
+    (see ACTIVITY_LOG_WRITER).
+    """
+    entry = ActivityLog(
+        user_id=getattr(user, "pk", user), action=action,
+        details=details, ip_address=ip_address,
+    )
+    config = get_writer_settings()
+    if config["ASYNC"] and _get_writer(config).submit(entry):
+        return
+    entry.save()
+
+
+def flush_activity_log(timeout: Optional[float] = None) -> bool:
+    """
+    Write out every event queued in this process now (no-op when nothing
+    is buffered). Other processes' queues are out of reach: the management
+    commands run in a process of their own, so they rely on
+    written_before() instead.
+    """
+    writer = _writer
+    if writer is None or writer.pid != os.getpid() or not writer.thread.is_alive():
+        return True
+    return writer.flush(timeout)
+
+
+@atexit.register
+def _shutdown():
+    writer = _writer
+    if writer is not None and writer.pid == os.getpid() and writer.thread.is_alive():
+        writer.stop(timeout=10)
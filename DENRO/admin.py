@@ -38,7 +38,7 @@
 #     ordering = ("username",)
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from .models import SiteAssignment, User
 
 
 @admin.register(User)
@@ -105,3 +105,10 @@ class UserAdmin(BaseUserAdmin):
     )
 
     ordering = ("username",)
+
+
+@admin.register(SiteAssignment)
+class SiteAssignmentAdmin(admin.ModelAdmin):
+    list_display = ("name", "user", "radius_m", "assigned_by", "is_active", "created_at")
+    list_filter = ("is_active",)
+    search_fields = ("name", "user__username")
@@ -0,0 +1,243 @@
+# DENRO/archive.py
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog
+from .pagination import CursorPage, InvalidCursor, decode_cursor, encode_cursor
+from .rollups import ONE_DAY, day_start, rolled_up_through
+
+# Defaults for settings.ACTIVITY_LOG_ARCHIVE. Rows older than
+# RETENTION_DAYS (or a per-action override, e.g. {"LOGIN": 30}) are moved
+# out of ActivityLog into DIR/YYYY/MM/activitylog-YYYY-MM-DD.jsonl.gz, one
+# file per local day, with DIR/manifest.json listing every file.
+ARCHIVE_DEFAULTS = {
+    "DIR": Path(settings.BASE_DIR) / "archive" / "activity_logs",
+    "RETENTION_DAYS": 180,
+    "ACTION_RETENTION_DAYS": {},
+    "CHUNK_SIZE": 2000,
+}
+
+MANIFEST_NAME = "manifest.json"
+
+
+def get_archive_settings() -> Dict:
+    return {**ARCHIVE_DEFAULTS, **getattr(settings, "ACTIVITY_LOG_ARCHIVE", {})}
+
+
+def archive_file(day: date) -> str:
+    """Path of a day's archive file, relative to the archive directory."""
+    return f"{day:%Y}/{day:%m}/activitylog-{day.isoformat()}.jsonl.gz"
+
+
+def load_manifest(root: Path) -> Dict:
+    try:
+        with open(root / MANIFEST_NAME) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+
+def save_manifest(root: Path, manifest: Dict):
+    tmp = root / (MANIFEST_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, root / MANIFEST_NAME)
+
+
+def archived_through() -> Optional[date]:
+    """Newest day with rows in the archive (None if nothing is archived)."""
+    files = load_manifest(Path(get_archive_settings()["DIR"]))["files"]
+    days = [entry["day"] for entry in files.values()]
+    return date.fromisoformat(max(days)) if days else None
+
+
+# ----------------- Writing -----------------
+def archivable_logs(config: Optional[Dict] = None, now: Optional[datetime] = None):
+    """
+    ActivityLog rows past their retention. Only days already covered by
+    ActivityLogRollup are eligible, so the activity-log metrics keep
+    counting archived events.
+    """
+    config = config or get_archive_settings()
+    now = now or timezone.now()
+    through = rolled_up_through()
+    if through is None:
+        return ActivityLog.objects.none()
+    watermark = day_start(through + ONE_DAY)
+
+    def cutoff(days):
+        return min(now - timedelta(days=days), watermark)
+
+    overrides = config["ACTION_RETENTION_DAYS"]
+    q = Q(created_at__lt=cutoff(config["RETENTION_DAYS"])) & ~Q(action__in=list(overrides))
+    for action, days in overrides.items():
+        q |= Q(action=action, created_at__lt=cutoff(days))
+    return ActivityLog.objects.filter(q)
+
+
+def _serialize(row: Dict) -> str:
+    return json.dumps({
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "username": row["user__username"],
+        "action": row["action"],
+        "details": row["details"],
+        "ip_address": row["ip_address"],
+        "created_at": row["created_at"].isoformat(),
+    }, separators=(",", ":"))
+
+
+def _append(path: Path, lines: List[str]):
+    # Each append is a separate gzip member; gzip readers concatenate them.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            gz.write(("\n".join(lines) + "\n").encode())
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_logs(chunk_size: Optional[int] = None, dry_run: bool = False,
+                 progress=None) -> Tuple[int, int]:
+    """
+    Move archivable rows to the day files, chunk by chunk. Each chunk is
+    appended and synced to disk before its rows are deleted, so an
+    interrupted run loses nothing; at worst a chunk is written twice, which
+    readers ignore (rows are de-duplicated by id). Returns
+    (rows archived, files touched).
+    """
+    config = get_archive_settings()
+    chunk_size = chunk_size or config["CHUNK_SIZE"]
+    root = Path(config["DIR"])
+    source = archivable_logs(config).order_by("id").values(
+        "id", "user_id", "user__username", "action", "details", "ip_address", "created_at"
+    )
+    if dry_run:
+        return source.count(), 0
+
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(root)
+    archived, touched, last_id = 0, set(), 0
+    while True:
+        rows = list(source.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[timezone.localdate(row["created_at"])].append(row)
+        for day, day_rows in sorted(by_day.items()):
+            name = archive_file(day)
+            _append(root / name, [_serialize(r) for r in day_rows])
+            entry = manifest["files"].setdefault(name, {
+                "day": day.isoformat(), "rows": 0, "min_id": None, "max_id": None,
+                "user_ids": [],
+            })
+            ids = [r["id"] for r in day_rows]
+            entry["rows"] += len(day_rows)
+            entry["min_id"] = min(filter(None, [entry["min_id"], *ids]))
+            entry["max_id"] = max(filter(None, [entry["max_id"], *ids]))
+            entry["user_ids"] = sorted(
+                set(entry["user_ids"]) | {r["user_id"] for r in day_rows if r["user_id"]}
+            )
+            touched.add(name)
+        save_manifest(root, manifest)
+
+        with transaction.atomic():
+            ActivityLog.objects.filter(id__in=[r["id"] for r in rows]).delete()
+        archived += len(rows)
+        if progress:
+            progress(archived, last_id)
+    return archived, len(touched)
+
+
+# ----------------- Reading -----------------
+class ArchivedLog:
+    """An archived ActivityLog row, with the attributes the templates use."""
+
+    def __init__(self, data: Dict, user=None):
+        self.id = self.pk = data["id"]
+        self.user_id = data["user_id"]
+        self.username = data.get("username")
+        self.user = user
+        self.action = data["action"]
+        self.details = data["details"]
+        self.ip_address = data["ip_address"]
+        self.created_at = parse_datetime(data["created_at"])
+        self.archived = True
+
+
+def _read_file(path: Path) -> Iterator[Dict]:
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_archived_logs(user_id: int, before: Optional[Tuple[datetime, int]] = None,
+                       limit: int = 20) -> List[Dict]:
+    """
+    Up to `limit` archived rows of one user, newest first, strictly older
+    than `before` = (created_at, id). Only the day files that the manifest
+    lists for the user (and that can hold older rows) are opened.
+    """
+    root = Path(get_archive_settings()["DIR"])
+    files = load_manifest(root)["files"]
+    last_day = timezone.localdate(before[0]).isoformat() if before else None
+
+    rows, seen = [], set()
+    candidates = sorted(
+        ((entry["day"], name) for name, entry in files.items() if user_id in entry["user_ids"]),
+        reverse=True,
+    )
+    for day, name in candidates:
+        if last_day and day > last_day:
+            continue
+        if len(rows) >= limit:
+            # Earlier day files only hold older rows
+            break
+        for data in _read_file(root / name):
+            if data["user_id"] != user_id or data["id"] in seen:
+                continue
+            data["_key"] = (parse_datetime(data["created_at"]), data["id"])
+            if before and data["_key"] >= before:
+                continue
+            seen.add(data["id"])
+            rows.append(data)
+        rows.sort(key=lambda d: d["_key"], reverse=True)
+        del rows[limit:]
+    return rows
+
+
+def archived_page(user, cursor: Optional[str] = None, per_page: int = 20) -> CursorPage:
+    """Older-only cursor page over a user's archived history."""
+    before = None
+    if cursor:
+        try:
+            created_at, pk, _ = decode_cursor(cursor)
+            before = (created_at, pk)
+        except InvalidCursor:
+            pass
+    rows = read_archived_logs(user.pk, before, per_page + 1)
+    has_next = len(rows) > per_page
+    logs = [ArchivedLog(data, user) for data in rows[:per_page]]
+    next_cursor = None
+    if has_next:
+        next_cursor = encode_cursor(logs[-1].created_at, logs[-1].pk, "next")
+    return CursorPage(logs, has_next, before is not None, next_cursor, None)
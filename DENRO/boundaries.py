@@ -0,0 +1,368 @@
+# DENRO/boundaries.py
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import LeasedPropertyProfile, ManagementZone, ProtectedArea
+
+try:
+    import numpy as np
+except ImportError:  # optional: batch classification falls back to a Python loop
+    np = None
+
+# Defaults for settings.BOUNDARIES. The point lookup index is a uniform
+# grid of GRID_CELL_DEG-degree cells, each listing the shapes whose
+# bounding box touches it.
+BOUNDARY_DEFAULTS = {
+    "GRID_CELL_DEG": 0.02,
+}
+
+BOUNDARY_VERSION_KEY = "boundaries:version"
+
+Ring = List[Tuple[float, float]]  # closed ring of (lon, lat)
+Polygon = List[Ring]  # exterior ring, then holes
+
+
+def get_boundary_settings() -> Dict:
+    return {**BOUNDARY_DEFAULTS, **getattr(settings, "BOUNDARIES", {})}
+
+
+# ----------------- Geometry -----------------
+def polygons(geometry: Dict) -> List[Polygon]:
+    """
+    The polygons of a GeoJSON Polygon or MultiPolygon geometry, with every
+    ring closed. Raises ValueError for anything else.
+    """
+    if not isinstance(geometry, dict):
+        raise ValueError("geometry must be an object")
+    kind, coords = geometry.get("type"), geometry.get("coordinates")
+    if kind == "Polygon":
+        coords = [coords]
+    elif kind != "MultiPolygon":
+        raise ValueError(f"unsupported geometry type {kind!r}")
+
+    result = []
+    for polygon in coords or ():
+        rings = []
+        for ring in polygon:
+            ring = [(float(p[0]), float(p[1])) for p in ring]
+            if ring and ring[0] != ring[-1]:
+                ring.append(ring[0])
+            if len(ring) < 4:
+                raise ValueError("polygon rings need at least 3 distinct points")
+            if not all(-180 <= x <= 180 and -90 <= y <= 90 for x, y in ring):
+                raise ValueError("coordinates must be lon, lat in degrees")
+            rings.append(ring)
+        if rings:
+            result.append(rings)
+    if not result:
+        raise ValueError("geometry has no polygons")
+    return result
+
+
+def bounds(geometry: Dict) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a geometry's exterior rings."""
+    points = [p for polygon in polygons(geometry) for p in polygon[0]]
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _ring_contains(ring: Ring, x: float, y: float) -> bool:
+    # Even-odd ray casting towards +x
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def contains(shape: List[Polygon], x: float, y: float) -> bool:
+    """Whether (lon x, lat y) lies inside any polygon (holes excluded)."""
+    for polygon in shape:
+        if _ring_contains(polygon[0], x, y) and not any(
+            _ring_contains(hole, x, y) for hole in polygon[1:]
+        ):
+            return True
+    return False
+
+
+def _edges(shape: List[Polygon]):
+    # Every ring edge of the shape as arrays x1, y1, x2, y2. Under the
+    # even-odd rule holes need no special casing: crossing a hole edge
+    # flips "inside" back off.
+    x1, y1, x2, y2 = [], [], [], []
+    for polygon in shape:
+        for ring in polygon:
+            for (ax, ay), (bx, by) in zip(ring, ring[1:]):
+                x1.append(ax)
+                y1.append(ay)
+                x2.append(bx)
+                y2.append(by)
+    return tuple(np.array(v)[:, None] for v in (x1, y1, x2, y2))
+
+
+def contains_many(shape: List[Polygon], xs, ys):
+    """
+    Vectorised contains() over NumPy arrays of points: a boolean mask.
+    Edges x points are tested in blocks to bound memory.
+    """
+    x1, y1, x2, y2 = _edges(shape)
+    dy = np.where(y2 == y1, 1.0, y2 - y1)
+    block = max(1, 2_000_000 // len(x1))
+    inside = np.zeros(len(xs), dtype=bool)
+    for start in range(0, len(xs), block):
+        px, py = xs[None, start:start + block], ys[None, start:start + block]
+        crosses = ((y1 > py) != (y2 > py)) & (px < x1 + (py - y1) * (x2 - x1) / dy)
+        inside[start:start + block] = np.count_nonzero(crosses, axis=0) % 2 == 1
+    return inside
+
+
+# ----------------- Index -----------------
+class GridIndex:
+    """
+    Uniform grid of `cell`-degree cells over items with bounding boxes;
+    each cell lists the items whose box touches it.
+    """
+
+    def __init__(self, cell: float):
+        self.cell = cell
+        self.grid: Dict[Tuple[int, int], List[Tuple[Tuple, object]]] = defaultdict(list)
+
+    def _c(self, value: float) -> int:
+        return math.floor(value / self.cell)
+
+    def add(self, bbox: Tuple[float, float, float, float], item):
+        x0, y0, x1, y1 = bbox
+        for cx in range(self._c(x0), self._c(x1) + 1):
+            for cy in range(self._c(y0), self._c(y1) + 1):
+                self.grid[cx, cy].append((bbox, item))
+
+    def candidates(self, x: float, y: float) -> Iterable:
+        """Items whose bounding box contains (x, y), in insertion order."""
+        for (x0, y0, x1, y1), item in self.grid.get((self._c(x), self._c(y)), ()):
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                yield item
+
+
+class Shape(NamedTuple):
+    kind: str  # "zone" or "area"
+    id: int
+    area_id: int
+    name: str
+    bbox: Tuple[float, float, float, float]
+    polygons: List[Polygon]
+
+
+class Classification(NamedTuple):
+    protected_area_id: Optional[int]
+    management_zone_id: Optional[int]
+    zone_name: Optional[str]
+
+
+UNCLASSIFIED = Classification(None, None, None)
+
+
+class BoundaryIndex:
+    """
+    Every imported zone and protected-area boundary, in a uniform grid.
+    A point is classified into the first zone containing it (and that
+    zone's protected area); failing that, into the first protected area
+    whose boundary contains it.
+    """
+
+    def __init__(self, shapes: List[Shape], cell: float):
+        # Zones before areas, each in id order, is the precedence order
+        self.shapes = sorted(shapes, key=lambda s: (s.kind != "zone", s.id))
+        self.grid = GridIndex(cell)
+        for shape in self.shapes:
+            self.grid.add(shape.bbox, shape)
+
+    @classmethod
+    def load(cls) -> "BoundaryIndex":
+        shapes = [
+            Shape("zone", z.pk, z.protected_area_id, z.name,
+                  (z.min_lon, z.min_lat, z.max_lon, z.max_lat), polygons(z.boundary))
+            for z in ManagementZone.objects.all()
+        ] + [
+            Shape("area", pa.pk, pa.pk, pa.name,
+                  (pa.min_lon, pa.min_lat, pa.max_lon, pa.max_lat), polygons(pa.boundary))
+            for pa in ProtectedArea.objects.filter(boundary__isnull=False)
+        ]
+        return cls(shapes, get_boundary_settings()["GRID_CELL_DEG"])
+
+    @staticmethod
+    def _result(shape: Shape) -> Classification:
+        if shape.kind == "zone":
+            return Classification(shape.area_id, shape.id, shape.name)
+        return Classification(shape.id, None, None)
+
+    def classify(self, lat, lon) -> Classification:
+        x, y = float(lon), float(lat)
+        for shape in self.grid.candidates(x, y):
+            if contains(shape.polygons, x, y):
+                return self._result(shape)
+        return UNCLASSIFIED
+
+    def classify_many(self, lats: Sequence, lons: Sequence) -> List[Classification]:
+        """classify() for many points; vectorised shape by shape with NumPy if installed."""
+        if np is None:
+            return [self.classify(lat, lon) for lat, lon in zip(lats, lons)]
+        xs = np.asarray(lons, dtype=float)
+        ys = np.asarray(lats, dtype=float)
+        winner = np.full(len(xs), -1)
+        for i, shape in enumerate(self.shapes):
+            x0, y0, x1, y1 = shape.bbox
+            candidates = np.flatnonzero(
+                (winner < 0) & (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+            )
+            if len(candidates):
+                hit = contains_many(shape.polygons, xs[candidates], ys[candidates])
+                winner[candidates[hit]] = i
+        results = [self._result(shape) for shape in self.shapes]
+        return [results[i] if i >= 0 else UNCLASSIFIED for i in winner.tolist()]
+
+
+_index: Optional[Tuple[object, BoundaryIndex]] = None
+_index_lock = threading.Lock()
+
+
+def boundaries_changed():
+    """Make every process rebuild its index (after the transaction commits)."""
+    transaction.on_commit(lambda: cache.delete(BOUNDARY_VERSION_KEY))
+
+
+def get_boundary_index() -> BoundaryIndex:
+    """This process's index, rebuilt when the boundaries have changed."""
+    global _index
+    version = cache.get_or_set(BOUNDARY_VERSION_KEY, time.time_ns, timeout=None)
+    current = _index
+    if current is None or current[0] != version:
+        with _index_lock:
+            if _index is None or _index[0] != version:
+                _index = (version, BoundaryIndex.load())
+            current = _index
+    return current[1]
+
+
+# ----------------- Import and classification -----------------
+def import_boundaries(features: Iterable[Dict], name_field: str = "name",
+                      zone_field: str = "zone") -> Tuple[int, int]:
+    """
+    Create or replace boundaries from GeoJSON features. A feature with a
+    `zone_field` property is a management zone of the protected area
+    named by `name_field`; one without is the protected area's boundary.
+    Returns (areas, zones) written. Raises ValueError on bad input.
+    """
+    areas = zones = 0
+    with transaction.atomic():
+        for n, feature in enumerate(features, 1):
+            props = feature.get("properties") or {}
+            name = props.get(name_field)
+            if not name:
+                raise ValueError(f"feature {n} has no {name_field!r} property")
+            geometry = feature.get("geometry")
+            try:
+                box = bounds(geometry)
+            except (ValueError, TypeError, IndexError) as e:
+                raise ValueError(f"feature {n} ({name}): {e}")
+            extent = dict(zip(("min_lon", "min_lat", "max_lon", "max_lat"), box))
+
+            area = ProtectedArea.objects.filter(name=name).order_by("pk").first()
+            if area is None:
+                area = ProtectedArea.objects.create(name=name)
+            zone = props.get(zone_field)
+            if zone:
+                ManagementZone.objects.update_or_create(
+                    protected_area=area, name=zone,
+                    defaults={"boundary": geometry, **extent},
+                )
+                zones += 1
+            else:
+                ProtectedArea.objects.filter(pk=area.pk).update(boundary=geometry, **extent)
+                areas += 1
+        boundaries_changed()
+    return areas, zones
+
+
+def load_feature_file(path) -> List[Dict]:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("type") == "FeatureCollection":
+        return data.get("features") or []
+    if data.get("type") == "Feature":
+        return [data]
+    raise ValueError("expected a GeoJSON Feature or FeatureCollection")
+
+
+def classification_fields(result: Classification, current_zone_text=None,
+                          current_zone_id=None) -> Dict:
+    """
+    LeasedPropertyProfile field values for a classification. Outside any
+    mapped zone the zone text is kept only if it was typed by hand, not
+    written by an earlier classification (current_zone_id set).
+    """
+    typed = current_zone_text if current_zone_id is None else None
+    return {
+        "protected_area_id": result.protected_area_id,
+        "management_zone_id": result.management_zone_id,
+        "pa_management_zone": result.zone_name or typed,
+    }
+
+
+def classify_profile(profile: LeasedPropertyProfile):
+    """Set a profile's protected area and zone from its coordinates (not saved)."""
+    if profile.latitude is None or profile.longitude is None:
+        result = UNCLASSIFIED
+    else:
+        result = get_boundary_index().classify(profile.latitude, profile.longitude)
+    fields = classification_fields(result, profile.pa_management_zone, profile.management_zone_id)
+    for field, value in fields.items():
+        setattr(profile, field, value)
+
+
+def reclassify_profiles(batch_size: int = 5000, progress=None) -> Tuple[int, int]:
+    """
+    Re-run classification for every profile, batch by batch, writing only
+    rows whose result changed (one UPDATE per distinct result per batch).
+    Returns (profiles checked, profiles changed).
+    """
+    index = BoundaryIndex.load()
+    qs = LeasedPropertyProfile.objects.order_by("pk").values_list(
+        "pk", "latitude", "longitude", "protected_area_id", "management_zone_id",
+        "pa_management_zone",
+    )
+    checked = changed = 0
+    last_pk = 0
+    while True:
+        rows = list(qs.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return checked, changed
+        last_pk = rows[-1][0]
+        located = [r for r in rows if r[1] is not None and r[2] is not None]
+        results = dict(zip(
+            (r[0] for r in located),
+            index.classify_many([r[1] for r in located], [r[2] for r in located]),
+        ))
+
+        updates = defaultdict(list)
+        for pk, _, _, area_id, zone_id, zone_text in rows:
+            fields = classification_fields(results.get(pk, UNCLASSIFIED), zone_text, zone_id)
+            if (fields["protected_area_id"], fields["management_zone_id"],
+                    fields["pa_management_zone"]) != (area_id, zone_id, zone_text):
+                updates[tuple(fields.items())].append(pk)
+        with transaction.atomic():
+            for fields, pks in updates.items():
+                LeasedPropertyProfile.objects.filter(pk__in=pks).update(**dict(fields))
+                changed += len(pks)
+        checked += len(rows)
+        if progress:
+            progress(checked, changed)
@@ -4,6 +4,8 @@ from __future__ import annotations
 import re
 from typing import Dict, Tuple, Any
 
+from django.utils.functional import SimpleLazyObject
+
 
 def _normalize_role(raw: Any) -> str:
     """
@@ -93,3 +95,25 @@ def nav_templates(request) -> Dict[str, str]:
         "side_nav_template": side,
         "user_role": role_code,
     }
+
+
+def notifications(request) -> Dict[str, Any]:
+    """
+    The notification bell for every template:
+
+      - notifications  (newest unread notifications, see NOTIFICATIONS["LIST_SIZE"])
+      - unread_count   (from the per-user cache)
+
+    Both are lazy, so pages that never render the bell don't query for it.
+    """
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {"notifications": [], "unread_count": 0}
+
+    # Imported here so the module stays importable before apps are ready
+    from .notifications import latest_unread, unread_count
+
+    return {
+        "notifications": SimpleLazyObject(lambda: latest_unread(user)),
+        "unread_count": SimpleLazyObject(lambda: unread_count(user)),
+    }
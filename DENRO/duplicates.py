@@ -0,0 +1,288 @@
+# DENRO/duplicates.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .images import derivative_name
+from .models import EnumeratorsReport, GeoTaggedImage
+
+# Defaults for settings.DUPLICATES. Two photos whose 64-bit difference
+# hashes differ in at most MAX_DISTANCE bits are reported as likely
+# duplicates; about 10 catches re-encoded, resized and lightly cropped
+# copies without matching merely similar scenes.
+DUPLICATE_DEFAULTS = {
+    "MAX_DISTANCE": 10,
+}
+
+INDEX_VERSION_KEY = "duplicates:index_version"
+
+# Stored in GeoTaggedImage.dhash when a photo couldn't be hashed
+UNHASHABLE = ""
+
+# Index refreshes re-read photos hashed this long before the previous
+# refresh, to catch hashes whose transaction committed late
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def get_duplicate_settings() -> Dict:
+    return {**DUPLICATE_DEFAULTS, **getattr(settings, "DUPLICATES", {})}
+
+
+# ----------------- Hashing -----------------
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: the photo shrunk to 9x8 greyscale, one bit per
+    pair of horizontal neighbours (set when brightness falls to the right).
+    """
+    small = ImageOps.exif_transpose(image).convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(0, 72, 9):
+        for col in range(8):
+            value = (value << 1) | (pixels[row + col] > pixels[row + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def hash_stored(names: Sequence[str]) -> str:
+    """
+    Hex dhash of the first of `names` (storage names, smallest rendition
+    first) that exists and decodes, or UNHASHABLE.
+    """
+    for name in names:
+        try:
+            with default_storage.open(name, "rb") as fh:
+                image = Image.open(fh)
+                # Decode JPEGs at 1/8 scale; 9x8 pixels is all dhash needs
+                image.draft("RGB", (64, 64))
+                return f"{dhash(image):016x}"
+        except (OSError, ValueError, SyntaxError):
+            continue
+    return UNHASHABLE
+
+
+def _sources(name: str, digest: Optional[str]) -> List[str]:
+    # The thumbnail is far cheaper to decode than the original
+    return ([derivative_name(digest, "thumb")] if digest else []) + [name]
+
+
+def index_photo(digest: str, source: str):
+    """Hash the rows holding this content that have no hash yet (reusing a known hash)."""
+    rows = GeoTaggedImage.objects.filter(sha256=digest)
+    value = rows.exclude(dhash__isnull=True).exclude(dhash=UNHASHABLE).values_list("dhash", flat=True).first()
+    if value is None:
+        value = hash_stored(_sources(source, digest))
+    rows.filter(dhash__isnull=True).update(dhash=value, hashed_at=timezone.now())
+
+
+def _hash_batch(items: List[Tuple[str, Optional[str]]]) -> List[str]:
+    # Runs in a worker process
+    return [hash_stored(_sources(name, digest)) for name, digest in items]
+
+
+def compute_dhashes(batch_size: int = 500, workers: Optional[int] = None, everything: bool = False,
+                    progress: Optional[Callable[[int, int], None]] = None) -> Tuple[int, int]:
+    """
+    Hash photos that have no dhash yet (all of them if `everything`),
+    decoding in `workers` processes, each distinct content once, and save
+    the hashes batch by batch. Returns (photos hashed, unhashable).
+    """
+    qs = GeoTaggedImage.objects.all() if everything else GeoTaggedImage.objects.filter(dhash__isnull=True)
+    qs = qs.only("pk", "image", "sha256", "dhash", "hashed_at").order_by("pk")
+    workers = workers or os.cpu_count() or 1
+
+    hashed = failed = 0
+    last_pk = 0
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            # Same content, same hash: decode each file once
+            keys = list({image.sha256 or image.image: (image.image, image.sha256) for image in batch}.items())
+            items = [item for _, item in keys]
+            chunk = max(1, len(items) // workers + 1)
+            parts = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+            values = [v for part in (pool.map(_hash_batch, parts) if pool else map(_hash_batch, parts)) for v in part]
+            by_key = {key: value for (key, _), value in zip(keys, values)}
+            hashed_at = timezone.now()
+            for image in batch:
+                image.dhash = by_key[image.sha256 or image.image]
+                image.hashed_at = hashed_at
+            GeoTaggedImage.objects.bulk_update(batch, ["dhash", "hashed_at"])
+            hashed += len(batch)
+            failed += sum(1 for image in batch if image.dhash == UNHASHABLE)
+            last_pk = batch[-1].pk
+            if progress:
+                progress(hashed, failed)
+    finally:
+        if pool:
+            pool.shutdown()
+    if everything:
+        hashes_changed()
+    return hashed, failed
+
+
+# ----------------- Index -----------------
+class BKTree:
+    """
+    Burkhard-Keller tree of 64-bit hashes under Hamming distance. Children
+    are keyed by their distance to the parent, so by the triangle
+    inequality a search within r of a query at distance d from a node
+    only descends into children keyed d-r..d+r. For small r that visits
+    a small fraction of the tree.
+    """
+
+    def __init__(self):
+        self.root: Optional[list] = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, value: int, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """(distance, item) of every item within `max_distance`, nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for key, child in node[2].items():
+                if distance - max_distance <= key <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return found
+
+
+class PhotoIndex:
+    """
+    BK-tree of every hashed photo (items are GeoTaggedImage ids). New
+    hashes are picked up incrementally: after the first load, each refresh
+    reads only the photos hashed since the previous one (by hashed_at),
+    however old the photo itself is.
+    """
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.ids = set()
+        self.since = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            started = timezone.now()
+            rows = GeoTaggedImage.objects.exclude(dhash__isnull=True).exclude(dhash=UNHASHABLE)
+            if self.since is not None:
+                rows = rows.filter(hashed_at__gte=self.since - REFRESH_OVERLAP)
+            for pk, value in rows.values_list("pk", "dhash").iterator():
+                if pk not in self.ids:
+                    self.ids.add(pk)
+                    self.tree.add(int(value, 16), pk)
+            self.since = started
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        with self.lock:
+            return self.tree.search(value, max_distance)
+
+
+_index: Optional[Tuple[object, PhotoIndex]] = None
+_index_lock = threading.Lock()
+
+
+def hashes_changed():
+    """Make every process rebuild its index (after the transaction commits)."""
+    transaction.on_commit(lambda: cache.delete(INDEX_VERSION_KEY))
+
+
+def get_photo_index() -> PhotoIndex:
+    """This process's index, brought up to date with newly hashed photos."""
+    global _index
+    version = cache.get_or_set(INDEX_VERSION_KEY, time.time_ns, timeout=None)
+    current = _index
+    if current is None or current[0] != version:
+        with _index_lock:
+            if _index is None or _index[0] != version:
+                _index = (version, PhotoIndex())
+            current = _index
+    current[1].refresh()
+    return current[1]
+
+
+def similar_photos(image: GeoTaggedImage, max_distance: Optional[int] = None,
+                   index: Optional[PhotoIndex] = None) -> List[Tuple[int, int]]:
+    """
+    (distance, image id) of the other photos that look like `image`,
+    nearest first. Pass `index` to reuse one fetched by get_photo_index().
+    """
+    if not image.dhash:
+        return []
+    if max_distance is None:
+        max_distance = get_duplicate_settings()["MAX_DISTANCE"]
+    if index is None:
+        index = get_photo_index()
+    return [
+        match for match in index.search(int(image.dhash, 16), max_distance)
+        if match[1] != image.pk
+    ]
+
+
+def flag_duplicates(reports: Iterable[EnumeratorsReport]) -> List[EnumeratorsReport]:
+    """
+    The reports as a list, each with `similar_reports`: (report id,
+    distance) of the other reports whose photo looks like its own,
+    closest first. Expects geo_tag_image to be select_related.
+    """
+    reports = list(reports)
+    matches: Dict[int, List[Tuple[int, int]]] = {}
+    index = get_photo_index() if reports else None
+    max_distance = get_duplicate_settings()["MAX_DISTANCE"]
+    for report in reports:
+        if report.geo_tag_image_id is not None:
+            matches[report.pk] = similar_photos(report.geo_tag_image, max_distance, index)
+    image_ids = {image_id for found in matches.values() for _, image_id in found}
+    owners: Dict[int, List[int]] = {}
+    for report_id, image_id in EnumeratorsReport.objects.filter(
+        geo_tag_image_id__in=image_ids
+    ).values_list("pk", "geo_tag_image_id") if image_ids else []:
+        owners.setdefault(image_id, []).append(report_id)
+
+    for report in reports:
+        similar = {}
+        for distance, image_id in matches.get(report.pk, []):
+            for other in owners.get(image_id, []):
+                if other != report.pk and other not in similar:
+                    similar[other] = distance
+        report.similar_reports = sorted(similar.items(), key=lambda item: (item[1], item[0]))
+    return reports
@@ -0,0 +1,171 @@
+# DENRO/exif.py
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import ExifTags, Image
+
+from .models import GeoTaggedImage
+from .spatial import geohash_for
+
+logger = logging.getLogger(__name__)
+
+EXIF_FIELDS = ["latitude", "longitude", "geohash", "taken_at", "orientation", "exif_gps", "exif_read"]
+
+
+class ExifData(NamedTuple):
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    taken_at: Optional[datetime] = None
+    orientation: Optional[int] = None
+
+    @property
+    def has_gps(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+
+NO_EXIF = ExifData()
+
+
+# ----------------- Reading -----------------
+def _degrees(value, ref) -> Optional[float]:
+    # (degrees, minutes, seconds) as rationals; S and W are negative
+    try:
+        d, m, s = (float(v) for v in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    result = d + m / 60 + s / 3600
+    if isinstance(ref, bytes):
+        ref = ref.decode(errors="ignore")
+    return -result if str(ref).strip().upper() in ("S", "W") else result
+
+
+def _gps(exif) -> Tuple[Optional[float], Optional[float]]:
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    if not gps:
+        return None, None
+    lat = _degrees(gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef))
+    lon = _degrees(gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef))
+    # Cameras without a fix write zeros
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None, None
+    return lat, lon
+
+
+def _taken_at(exif) -> Optional[datetime]:
+    ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    value = ifd.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)
+    try:
+        taken = datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    offset = str(ifd.get(ExifTags.Base.OffsetTimeOriginal) or "").strip("\x00 ")
+    if len(offset) == 6 and offset[0] in "+-" and offset[3] == ":":
+        try:
+            delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+        except ValueError:
+            delta = None
+        if delta is not None:
+            return taken.replace(tzinfo=dt_timezone(delta if offset[0] == "+" else -delta))
+    # No offset recorded: the camera's clock is taken to be in local time
+    return timezone.make_aware(taken)
+
+
+def read_exif(fileobj) -> ExifData:
+    """
+    GPS position, capture time and orientation from a photo's EXIF. Only
+    the header is read (Pillow stops at the start of the image data), so
+    this is cheap even for large files. NO_EXIF if there is none.
+    """
+    position = fileobj.tell() if hasattr(fileobj, "tell") else None
+    try:
+        with Image.open(fileobj) as image:
+            exif = image.getexif()
+            if not exif:
+                return NO_EXIF
+            lat, lon = _gps(exif)
+            orientation = exif.get(ExifTags.Base.Orientation)
+            return ExifData(lat, lon, _taken_at(exif), orientation if orientation in range(1, 9) else None)
+    except Exception:
+        return NO_EXIF
+    finally:
+        if position is not None:
+            fileobj.seek(position)
+
+
+def read_stored_exif(name: str) -> ExifData:
+    with default_storage.open(name, "rb") as fh:
+        return read_exif(fh)
+
+
+# ----------------- Applying -----------------
+def apply_exif(image: GeoTaggedImage, data: ExifData):
+    """
+    Set an image's EXIF fields (not saved). A GPS position in the photo
+    replaces the one it was given, which is usually the report's.
+    """
+    if data.has_gps:
+        image.latitude = Decimal(f"{data.latitude:.7f}")
+        image.longitude = Decimal(f"{data.longitude:.7f}")
+        image.geohash = geohash_for(image)
+    image.exif_gps = data.has_gps
+    image.taken_at = data.taken_at
+    image.orientation = data.orientation
+    image.exif_read = True
+
+
+def _read_batch(names: List[Tuple[int, str]]) -> List[Tuple[int, ExifData]]:
+    # Runs in a worker process
+    results = []
+    for pk, name in names:
+        try:
+            results.append((pk, read_stored_exif(name)))
+        except OSError:
+            logger.warning("Photo file %s of image %s is missing", name, pk)
+            results.append((pk, NO_EXIF))
+    return results
+
+
+def extract_exif(batch_size: int = 500, workers: Optional[int] = None, everything: bool = False,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Tuple[int, int]:
+    """
+    Read the EXIF of stored photos not read yet (all of them if
+    `everything`), spreading the file reads over `workers` processes, and
+    save the results batch by batch. Returns (photos read, with GPS).
+    """
+    qs = GeoTaggedImage.objects.all() if everything else GeoTaggedImage.objects.filter(exif_read=False)
+    qs = qs.order_by("pk")
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, batch_size // workers)
+
+    read = located = 0
+    last_pk = 0
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return read, located
+            names = [(image.pk, image.image) for image in batch]
+            chunks = [names[i:i + chunk] for i in range(0, len(names), chunk)]
+            results: Dict[int, ExifData] = {}
+            for part in (pool.map(_read_batch, chunks) if pool else map(_read_batch, chunks)):
+                results.update(part)
+            for image in batch:
+                apply_exif(image, results.get(image.pk, NO_EXIF))
+            GeoTaggedImage.objects.bulk_update(batch, EXIF_FIELDS)
+            read += len(batch)
+            located += sum(1 for image in batch if image.exif_gps)
+            last_pk = batch[-1].pk
+            if progress:
+                progress(read, located)
+    finally:
+        if pool:
+            pool.shutdown()
@@ -0,0 +1,193 @@
+# DENRO/geofence.py
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .activity import log_activity
+from .boundaries import BOUNDARY_VERSION_KEY, GridIndex, contains, get_boundary_settings, polygons
+from .models import ActivityAction, ManagementZone, ProtectedArea, SiteAssignment, User
+from .notifications import broadcast, notify_users
+
+logger = logging.getLogger(__name__)
+
+# Defaults for settings.GEOFENCE. When a user crosses a protected-area
+# boundary, the roles NOTIFY_ROLES lists for the user's role are told;
+# site assignments notify whoever assigned the site.
+GEOFENCE_DEFAULTS = {
+    "ENABLED": True,
+    "NOTIFY_ROLES": {
+        "EVALUATOR": ["CENRO"],
+        "CENRO": ["PENRO"],
+        "PENRO": ["ADMIN"],
+    },
+}
+
+# Fences each user was inside at their last fix; kept without expiry
+STATE_KEY = "geofence:inside:{}"
+SITES_VERSION_KEY = "geofence:sites_version"
+
+# Metres per degree of latitude (and of longitude at the equator)
+METRES_PER_DEGREE = 111_320.0
+
+
+def get_geofence_settings() -> Dict:
+    return {**GEOFENCE_DEFAULTS, **getattr(settings, "GEOFENCE", {})}
+
+
+class Fence(NamedTuple):
+    key: str  # "pa:<id>" or "site:<id>"
+    name: str
+    user_id: Optional[int]  # sites only apply to the assigned user
+    notify_user_id: Optional[int]
+    test: Callable[[float, float], bool]  # (lon, lat) -> inside
+
+
+def _circle(lat0: float, lon0: float, radius_m: float):
+    # Local flat projection around the centre: a few multiplications per
+    # test, and accurate to well under a metre at site-visit radii.
+    kx = METRES_PER_DEGREE * math.cos(math.radians(lat0))
+    ky = METRES_PER_DEGREE
+    r2 = radius_m * radius_m
+
+    def test(lon, lat):
+        dx, dy = (lon - lon0) * kx, (lat - lat0) * ky
+        return dx * dx + dy * dy <= r2
+
+    dlon, dlat = radius_m / max(kx, 1e-9), radius_m / ky
+    return test, (lon0 - dlon, lat0 - dlat, lon0 + dlon, lat0 + dlat)
+
+
+def _polygon_test(shape):
+    return lambda lon, lat: contains(shape, lon, lat)
+
+
+class FenceIndex:
+    """Protected areas and active site assignments in a uniform grid."""
+
+    def __init__(self, cell: float):
+        self.grid = GridIndex(cell)
+        self.fences: Dict[str, Fence] = {}
+
+    def add(self, fence: Fence, bbox):
+        self.fences[fence.key] = fence
+        self.grid.add(bbox, fence)
+
+    @classmethod
+    def load(cls) -> "FenceIndex":
+        index = cls(get_boundary_settings()["GRID_CELL_DEG"])
+        # An area's fence is its boundary, or the union of its zones when
+        # only zones were imported.
+        shapes = {
+            pa.pk: (pa.name, polygons(pa.boundary), (pa.min_lon, pa.min_lat, pa.max_lon, pa.max_lat))
+            for pa in ProtectedArea.objects.filter(boundary__isnull=False)
+        }
+        for zone in ManagementZone.objects.exclude(protected_area__in=list(shapes)).select_related("protected_area"):
+            name, shape, box = shapes.get(zone.protected_area_id, (zone.protected_area.name, [], None))
+            zone_box = (zone.min_lon, zone.min_lat, zone.max_lon, zone.max_lat)
+            box = zone_box if box is None else (
+                min(box[0], zone_box[0]), min(box[1], zone_box[1]),
+                max(box[2], zone_box[2]), max(box[3], zone_box[3]),
+            )
+            shapes[zone.protected_area_id] = (name, shape + polygons(zone.boundary), box)
+        for pk, (name, shape, box) in shapes.items():
+            index.add(Fence(f"pa:{pk}", name, None, None, _polygon_test(shape)), box)
+
+        for site in SiteAssignment.objects.filter(is_active=True):
+            test, box = _circle(float(site.latitude), float(site.longitude), site.radius_m)
+            index.add(Fence(f"site:{site.pk}", site.name, site.user_id, site.assigned_by_id, test), box)
+        return index
+
+    def inside(self, user_id: int, lat, lon) -> FrozenSet[str]:
+        """Keys of the fences that contain (lat, lon) for this user."""
+        x, y = float(lon), float(lat)
+        return frozenset(
+            fence.key for fence in self.grid.candidates(x, y)
+            if (fence.user_id is None or fence.user_id == user_id) and fence.test(x, y)
+        )
+
+
+_index: Optional[Tuple[Tuple, FenceIndex]] = None
+_index_lock = threading.Lock()
+
+
+def sites_changed():
+    """Make every process rebuild its fence index (after the transaction commits)."""
+    transaction.on_commit(lambda: cache.delete(SITES_VERSION_KEY))
+
+
+def _get_index(versions: Dict) -> FenceIndex:
+    global _index
+    version = (
+        versions.get(BOUNDARY_VERSION_KEY) or cache.get_or_set(BOUNDARY_VERSION_KEY, time.time_ns, timeout=None),
+        versions.get(SITES_VERSION_KEY) or cache.get_or_set(SITES_VERSION_KEY, time.time_ns, timeout=None),
+    )
+    current = _index
+    if current is None or current[0] != version:
+        with _index_lock:
+            if _index is None or _index[0] != version:
+                _index = (version, FenceIndex.load())
+            current = _index
+    return current[1]
+
+
+# ----------------- Evaluation -----------------
+def check_geofences(user, fixes: Iterable[Tuple]) -> List[Tuple[str, Fence]]:
+    """
+    Run a user's newly accepted fixes, (lat, lon) in capture order, through
+    the fences and record every enter/exit transition. The steady-state cost
+    is one cache round trip plus a grid lookup per fix; only transitions
+    touch the database. With no stored state (a user's first fix, or an
+    evicted key) the current state is recorded without events. Never
+    raises: a geofence failure must not lose the location write.
+    """
+    if not get_geofence_settings()["ENABLED"]:
+        return []
+    try:
+        state_key = STATE_KEY.format(user.pk)
+        values = cache.get_many([BOUNDARY_VERSION_KEY, SITES_VERSION_KEY, state_key])
+        index = _get_index(values)
+
+        previous = inside = values.get(state_key)
+        events = []
+        for lat, lon in fixes:
+            now = index.inside(user.pk, lat, lon)
+            if inside is not None:
+                events += [("exit", index.fences[k]) for k in sorted(inside - now) if k in index.fences]
+                events += [("enter", index.fences[k]) for k in sorted(now - inside)]
+            inside = now
+        if inside != previous:
+            cache.set(state_key, inside, timeout=None)
+        if events:
+            _record_events(user, events)
+        return events
+    except Exception:
+        logger.exception("Geofence check failed for user %s", user.pk)
+        return []
+
+
+def _record_events(user, events: List[Tuple[str, Fence]]):
+    notify_roles = get_geofence_settings()["NOTIFY_ROLES"].get(user.role, [])
+    assigners = User.objects.in_bulk(
+        {fence.notify_user_id for _, fence in events if fence.notify_user_id}
+    )
+    with transaction.atomic():
+        for event, fence in events:
+            verb = "entered" if event == "enter" else "left"
+            message = f"{user.username} {verb} {fence.name}"
+            log_activity(
+                user,
+                ActivityAction.GEOFENCE_ENTER if event == "enter" else ActivityAction.GEOFENCE_EXIT,
+                f"{verb.capitalize()} {fence.name}",
+            )
+            if fence.notify_user_id in assigners:
+                notify_users([assigners[fence.notify_user_id]], message)
+            elif fence.user_id is None and notify_roles:
+                broadcast(notify_roles, message)
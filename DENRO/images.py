@@ -0,0 +1,190 @@
+# DENRO/images.py
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Set
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .exif import NO_EXIF, ExifData, read_exif
+
+logger = logging.getLogger(__name__)
+
+# Defaults for settings.IMAGES. Photos are stored once per content, under
+# their SHA-256 (UPLOAD_TO/ab/abcdef....jpg). Each VARIANT is a JPEG no
+# larger than SIZE px on its longest side, generated by a pool of WORKERS
+# threads after the upload commits (ASYNC) or inline (ASYNC off, for
+# tests and scripts). At most MAX_PENDING photos wait for the pool; beyond
+# that they are done when first requested or by the
+# generate_image_derivatives command. The same pass records each photo's
+# perceptual hash for duplicate detection (DENRO/duplicates.py).
+IMAGE_DEFAULTS = {
+    "UPLOAD_TO": "images",
+    "ASYNC": True,
+    "WORKERS": 2,
+    "MAX_PENDING": 500,
+    "VARIANTS": {
+        "thumb": {"SIZE": 320, "QUALITY": 75},
+        "web": {"SIZE": 1600, "QUALITY": 82},
+    },
+    "CACHE_MAX_AGE": 365 * 24 * 3600,
+}
+
+HASH_BLOCK = 64 * 1024
+
+# Stored extension by detected format, so equal bytes get one name
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "MPO": ".jpg"}
+
+
+def get_image_settings() -> Dict:
+    return {**IMAGE_DEFAULTS, **getattr(settings, "IMAGES", {})}
+
+
+class StoredImage(NamedTuple):
+    name: str  # storage name of the original
+    sha256: str
+    exif: ExifData = NO_EXIF
+
+
+# ----------------- Storage -----------------
+def original_name(digest: str, ext: str) -> str:
+    return f"{get_image_settings()['UPLOAD_TO']}/{digest[:2]}/{digest}{ext}"
+
+
+def derivative_name(digest: str, variant: str) -> str:
+    return f"{get_image_settings()['UPLOAD_TO']}/{variant}/{digest[:2]}/{digest}.jpg"
+
+
+def _file_digest(fileobj) -> str:
+    hasher = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(HASH_BLOCK), b""):
+        hasher.update(block)
+    fileobj.seek(0)
+    return hasher.hexdigest()
+
+
+def _extension(fileobj, filename: str) -> str:
+    fileobj.seek(0)
+    try:
+        # Only reads the header
+        detected = FORMAT_EXTENSIONS.get(Image.open(fileobj).format)
+    except Exception:
+        detected = None
+    fileobj.seek(0)
+    return detected or os.path.splitext(filename)[1].lower() or ".jpg"
+
+
+def store_image(fileobj, filename: Optional[str] = None, digest: Optional[str] = None) -> StoredImage:
+    """
+    Save a photo under its content hash, once: storing the same bytes
+    again returns the existing file. `digest` skips hashing when the
+    caller already has it (e.g. a verified resumable upload). The EXIF
+    is read from the header on the way.
+    """
+    filename = filename or getattr(fileobj, "name", "") or ""
+    digest = digest or _file_digest(fileobj)
+    name = original_name(digest, _extension(fileobj, filename))
+    exif = read_exif(fileobj)
+    if not default_storage.exists(name):
+        fileobj.seek(0)
+        saved = default_storage.save(name, fileobj)
+        if saved != name:
+            # Another request stored the same content meanwhile
+            default_storage.delete(saved)
+    return StoredImage(name, digest, exif)
+
+
+# ----------------- Derivatives -----------------
+def render_derivatives(digest: str, source: str, force: bool = False) -> int:
+    """
+    Write the missing variants of a stored original (all of them if
+    `force`). Returns the number written.
+    """
+    variants = {
+        variant: options for variant, options in get_image_settings()["VARIANTS"].items()
+        if force or not default_storage.exists(derivative_name(digest, variant))
+    }
+    if not variants:
+        return 0
+    largest = max(options["SIZE"] for options in variants.values())
+    with default_storage.open(source, "rb") as fh:
+        image = Image.open(fh)
+        # Let JPEG decode at a reduced scale; much faster for phone photos
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    for variant, options in sorted(variants.items(), key=lambda item: -item[1]["SIZE"]):
+        image.thumbnail((options["SIZE"], options["SIZE"]), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=options["QUALITY"], optimize=True, progressive=True)
+        name = derivative_name(digest, variant)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(out.getvalue()))
+    return len(variants)
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pending: Set[str] = set()
+_pool_lock = threading.Lock()
+
+
+def _get_pool(config: Dict) -> ThreadPoolExecutor:
+    global _pool, _pool_pid
+    # As with the activity log writer, a forked worker needs its own threads
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(config["WORKERS"], thread_name_prefix="image-derivatives")
+                _pool_pid = os.getpid()
+                _pending.clear()
+    return _pool
+
+
+def _run(digest: str, source: str, pooled: bool = False):
+    # Imported here: duplicates needs derivative_name from this module
+    from .duplicates import index_photo
+
+    try:
+        render_derivatives(digest, source)
+    except Exception:
+        logger.exception("Could not render derivatives of %s", source)
+    try:
+        # After rendering, so the thumbnail can be hashed instead of the original
+        index_photo(digest, source)
+    except Exception:
+        logger.exception("Could not hash %s", source)
+    finally:
+        with _pool_lock:
+            _pending.discard(digest)
+        if pooled:
+            close_old_connections()
+
+
+def schedule_derivatives(image: StoredImage):
+    """Render the variants of a stored photo once the current transaction commits."""
+    config = get_image_settings()
+    if not config["ASYNC"]:
+        transaction.on_commit(lambda: _run(image.sha256, image.name))
+        return
+
+    def submit():
+        pool = _get_pool(config)
+        with _pool_lock:
+            if image.sha256 in _pending or len(_pending) >= config["MAX_PENDING"]:
+                return
+            _pending.add(image.sha256)
+        pool.submit(_run, image.sha256, image.name, True)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,411 @@
+# DENRO/locations.py
+from __future__ import annotations
+
+import math
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .geofence import check_geofences
+from .models import LastKnownLocation, LocationPing
+from .pubsub import publish
+
+# Legacy ActivityLog action that used to carry location fixes as text
+LOCATION_ACTION = "LOCATION_UPDATE"
+
+# Upper bound on fixes accepted in one batch upload
+MAX_BATCH_FIXES = 500
+
+
+def parse_location_details(details: Optional[str]) -> Optional[Tuple[float, float]]:
+    """
+    Parse a legacy ActivityLog detail string ("Location updated: lat, lon")
+    into a (lat, lon) tuple. Returns None if the string is not a location.
+    """
+    if not details:
+        return None
+    parts = details.split(": ")
+    if len(parts) != 2:
+        return None
+    coords = parts[1].split(", ")
+    if len(coords) != 2:
+        return None
+    try:
+        return float(coords[0]), float(coords[1])
+    except ValueError:
+        return None
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """
+    Parse a device timestamp. Accepts ISO-8601 strings or epoch seconds /
+    milliseconds (expo-location reports milliseconds). Returns None if the
+    value is missing or unparseable.
+    """
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000 if value > 1e11 else value
+        try:
+            return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def clean_fix(data: Dict) -> Dict:
+    """
+    Validate one location fix from a client payload. Returns the keyword
+    arguments for record_location(); raises ValueError with a user-facing
+    message if the fix is unusable.
+    """
+    latitude = data.get("latitude")
+    longitude = data.get("longitude")
+    if latitude in (None, "") or longitude in (None, ""):
+        raise ValueError("Invalid coordinates")
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid coordinates")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Invalid coordinates")
+
+    accuracy = data.get("accuracy")
+    if accuracy not in (None, ""):
+        try:
+            accuracy = float(accuracy)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid accuracy")
+    else:
+        accuracy = None
+
+    captured_at = None
+    if data.get("timestamp") not in (None, ""):
+        captured_at = parse_timestamp(data["timestamp"])
+        if captured_at is None:
+            raise ValueError("Invalid timestamp")
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "accuracy": accuracy,
+        "captured_at": captured_at,
+    }
+
+
+# ----------------- Movement filter -----------------
+# Defaults for settings.LOCATION_FILTER. A fix is stored only if it is
+# accurate enough and either far enough (MIN_DISTANCE_M) and late enough
+# (MIN_INTERVAL_S) after the stored fix preceding it in capture time, or
+# the user has been stationary for STATIONARY_INTERVAL_S (a heartbeat
+# point). Fixes older than the current position (an offline buffer being
+# replayed) are filtered the same way against their neighbour in history.
+FILTER_DEFAULTS = {
+    "ENABLED": True,
+    "MIN_DISTANCE_M": 25,
+    "MIN_INTERVAL_S": 30,
+    "STATIONARY_INTERVAL_S": 600,
+    "MAX_ACCURACY_M": 200,
+}
+
+FILTER_STATS_KEY = "location_filter:{}"
+DROP_REASONS = ("inaccurate", "duplicate", "too_soon", "stationary")
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def get_filter_settings() -> Dict:
+    return {**FILTER_DEFAULTS, **getattr(settings, "LOCATION_FILTER", {})}
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> float:
+    """Great-circle distance in metres between two (lat, lon) points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def check_fix(fix: Dict, previous: Optional[Tuple], config: Dict) -> Optional[str]:
+    """
+    Compare a cleaned fix against the stored fix (lat, lon, captured_at)
+    at or just before it in capture time. Returns None if the fix should
+    be stored, otherwise the reason it is dropped.
+    """
+    if not config["ENABLED"]:
+        return None
+    accuracy = fix.get("accuracy")
+    if accuracy is not None and accuracy > config["MAX_ACCURACY_M"]:
+        return "inaccurate"
+    if previous is None:
+        return None
+
+    prev_lat, prev_lon, prev_at = previous
+    elapsed = (fix["captured_at"] - prev_at).total_seconds()
+    if elapsed <= 0:
+        # Same capture time: the fix was already uploaded
+        return "duplicate"
+    if elapsed >= config["STATIONARY_INTERVAL_S"]:
+        return None
+    if elapsed < config["MIN_INTERVAL_S"]:
+        return "too_soon"
+    if haversine_m(prev_lat, prev_lon, fix["latitude"], fix["longitude"]) < config["MIN_DISTANCE_M"]:
+        return "stationary"
+    return None
+
+
+def _stored_fixes(user, after=None, until=None):
+    pings = LocationPing.objects.filter(user=user)
+    if after is not None:
+        pings = pings.filter(captured_at__gt=after)
+    if until is not None:
+        pings = pings.filter(captured_at__lte=until)
+    return pings.values_list("latitude", "longitude", "captured_at")
+
+
+def _previous_fix(user, before) -> Optional[Tuple]:
+    # The user's stored fix at or just before `before`
+    ping = _stored_fixes(user, until=before).order_by("-captured_at").first()
+    if ping is None:
+        return None
+    return float(ping[0]), float(ping[1]), ping[2]
+
+
+def _count(name: str, n: int = 1):
+    if not n:
+        return
+    key = FILTER_STATS_KEY.format(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, n, timeout=None)
+
+
+def get_filter_stats() -> Dict[str, int]:
+    """Accepted/dropped counters of the movement filter, by reason."""
+    names = ["accepted"] + [f"dropped_{r}" for r in DROP_REASONS]
+    values = cache.get_many([FILTER_STATS_KEY.format(n) for n in names])
+    stats = {n: values.get(FILTER_STATS_KEY.format(n), 0) for n in names}
+    stats["dropped"] = sum(stats[f"dropped_{r}"] for r in DROP_REASONS)
+    return stats
+
+
+def record_location(user, latitude, longitude, accuracy=None, captured_at=None,
+                    ip_address=None) -> Optional[LocationPing]:
+    """
+    Store a location fix as a LocationPing and keep the user's
+    LastKnownLocation current. Every location write should go through here.
+    Returns None if the movement filter dropped the fix as redundant.
+    """
+    fix = {
+        "latitude": round(float(latitude), 7),
+        "longitude": round(float(longitude), 7),
+        "accuracy": accuracy,
+        "captured_at": captured_at or timezone.now(),
+    }
+    config = get_filter_settings()
+    previous = _previous_fix(user, fix["captured_at"]) if config["ENABLED"] else None
+    reason = check_fix(fix, previous, config)
+    if reason:
+        _count(f"dropped_{reason}")
+        return None
+
+    with transaction.atomic():
+        ping = LocationPing.objects.create(user=user, ip_address=ip_address, **fix)
+        advanced = _advance_last_location(user, fix["latitude"], fix["longitude"], fix["captured_at"])
+        if advanced:
+            _publish_position(user, fix["latitude"], fix["longitude"], fix["captured_at"])
+    if advanced:
+        check_geofences(user, [(fix["latitude"], fix["longitude"])])
+    _count("accepted")
+    return ping
+
+
+def record_locations(user, fixes: List[Dict], ip_address=None) -> List[Dict]:
+    """
+    Store a batch of location fixes (e.g. replayed from a device's offline
+    buffer). Every fix is validated and run through the movement filter in
+    capture order first, each against whichever comes just before it of
+    the stored fixes and the batch's accepted ones; the survivors are
+    inserted with a single bulk write in one transaction. Returns one
+    result per input fix, in input order: {"index", "status": "ok", "id"},
+    {"index", "status": "dropped", "reason"} or {"index", "status":
+    "error", "message"}.
+    """
+    results, cleaned = [None] * len(fixes), []
+    now = timezone.now()
+    for index, data in enumerate(fixes):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("Invalid fix")
+            fix = clean_fix(data)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "message": str(e)}
+            continue
+        fix["latitude"] = round(fix["latitude"], 7)
+        fix["longitude"] = round(fix["longitude"], 7)
+        fix["captured_at"] = fix["captured_at"] or now
+        cleaned.append((index, fix))
+
+    config = get_filter_settings()
+    cleaned.sort(key=lambda item: item[1]["captured_at"])
+    stored = []
+    if config["ENABLED"] and cleaned:
+        first, last = cleaned[0][1]["captured_at"], cleaned[-1][1]["captured_at"]
+        # Two queries: the fix before the batch, and those within its span
+        before = _previous_fix(user, first)
+        stored = ([before] if before else []) + [
+            (float(lat), float(lon), at)
+            for lat, lon, at in _stored_fixes(user, after=first, until=last).order_by("captured_at")
+        ]
+    previous, position = None, 0
+    pings = []
+    for index, fix in cleaned:
+        while position < len(stored) and stored[position][2] <= fix["captured_at"]:
+            if previous is None or stored[position][2] >= previous[2]:
+                previous = stored[position]
+            position += 1
+        reason = check_fix(fix, previous, config)
+        if reason:
+            _count(f"dropped_{reason}")
+            results[index] = {"index": index, "status": "dropped", "reason": reason}
+            continue
+        previous = (fix["latitude"], fix["longitude"], fix["captured_at"])
+        pings.append((index, LocationPing(user=user, ip_address=ip_address, **fix)))
+
+    if pings:
+        with transaction.atomic():
+            LocationPing.objects.bulk_create([ping for _, ping in pings])
+            since = LastKnownLocation.objects.select_for_update().filter(
+                user=user
+            ).values_list("updated_at", flat=True).first()
+            newest = pings[-1][1]
+            advanced = _advance_last_location(user, newest.latitude, newest.longitude, newest.captured_at)
+            if advanced:
+                _publish_position(user, newest.latitude, newest.longitude, newest.captured_at)
+        if advanced:
+            # Only the fixes past the previous position: replayed older ones
+            # would report crossings the fence state has already moved past
+            check_geofences(user, [
+                (ping.latitude, ping.longitude) for _, ping in pings
+                if since is None or ping.captured_at > since
+            ])
+        _count("accepted", len(pings))
+
+    for index, ping in pings:
+        results[index] = {"index": index, "status": "ok", "id": ping.pk}
+    return results
+
+
+def _advance_last_location(user, latitude, longitude, captured_at) -> bool:
+    # Only move forward in time, so replayed (older) fixes never overwrite
+    # a newer position. Returns True if the position changed.
+    fields = {"latitude": latitude, "longitude": longitude, "updated_at": captured_at}
+    updated = LastKnownLocation.objects.filter(
+        user=user, updated_at__lt=captured_at
+    ).update(**fields)
+    if updated:
+        return True
+    _, created = LastKnownLocation.objects.get_or_create(user=user, defaults=fields)
+    return created
+
+
+# ----------------- Live updates -----------------
+# Channel carrying every accepted position change (see DENRO/pubsub.py)
+LOCATION_CHANNEL = "denro:locations"
+
+# Whose positions each role may follow live; None means everyone. Mirrors
+# the users shown on that role's dashboard and report maps.
+LIVE_SCOPES = {
+    "SUPER_ADMIN": None,
+    "ADMIN": None,
+    "PENRO": ["PENRO", "CENRO", "EVALUATOR"],
+    "CENRO": ["CENRO", "EVALUATOR"],
+}
+
+
+# Defaults for settings.LIVE_LOCATIONS (the SSE stream). Idle streams get a
+# comment line every HEARTBEAT_S; each stream is closed after MAX_STREAM_S
+# and the browser reconnects after RETRY_MS.
+LIVE_LOCATION_DEFAULTS = {
+    "HEARTBEAT_S": 15,
+    "MAX_STREAM_S": 300,
+    "RETRY_MS": 3000,
+}
+
+
+def get_live_settings() -> Dict:
+    return {**LIVE_LOCATION_DEFAULTS, **getattr(settings, "LIVE_LOCATIONS", {})}
+
+
+def live_scope(role, wanted: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Roles whose positions `role` may see (None = all), narrowed to the
+    comma-separated `wanted` roles if given. Raises KeyError if none.
+    """
+    scope = LIVE_SCOPES[role]
+    if wanted:
+        wanted = set(wanted.split(","))
+        scope = sorted(wanted if scope is None else wanted & set(scope))
+    return scope
+
+
+def _publish_position(user, latitude, longitude, captured_at):
+    message = {
+        "id": user.pk,
+        "username": user.username,
+        "role": user.role,
+        "lat": float(latitude),
+        "lon": float(longitude),
+        "last_update": captured_at.isoformat(),
+    }
+    transaction.on_commit(lambda: publish(LOCATION_CHANNEL, message))
+
+
+def _as_dict(loc: LastKnownLocation, with_user: bool = True) -> Dict:
+    data = {
+        "lat": float(loc.latitude),
+        "lon": float(loc.longitude),
+        "last_update": loc.updated_at,
+    }
+    if with_user:
+        data.update({
+            "id": loc.user_id,
+            "username": loc.user.username,
+            "role": loc.user.role,
+        })
+    return data
+
+
+def get_user_locations(users) -> List[Dict]:
+    """
+    Last known positions for every user in the given queryset, fetched in a
+    single query. Each entry has id, username, role, lat, lon, last_update.
+    """
+    locations = (
+        LastKnownLocation.objects.filter(user__in=users)
+        .select_related("user")
+        .order_by("user_id")
+    )
+    return [_as_dict(loc) for loc in locations]
+
+
+def get_user_location(user) -> Optional[Dict]:
+    """Last known position (lat, lon, last_update) of a single user."""
+    loc = LastKnownLocation.objects.filter(user=user).first()
+    return _as_dict(loc, with_user=False) if loc else None
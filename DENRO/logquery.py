@@ -0,0 +1,89 @@
+# DENRO/logquery.py
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from .models import ActivityLog, User
+from .rollups import ONE_DAY, day_start
+from .search import search_logs
+
+# Query-string parameters shared by every activity-log listing
+FILTER_PARAMS = ("q", "role", "action", "from", "to")
+
+# Whose events each activity-log listing in views.py shows (None = every
+# role), by view name
+LOG_SCOPES = {
+    "admin_dashboard": None,
+    "admin_activity_logs": None,
+    "penro_dashboard": ["PENRO", "EVALUATOR"],
+    "cenro_dashboard": ["EVALUATOR"],
+    "evaluator_dashboard": ["CENRO", "EVALUATOR"],
+    "cenro_activitylogs": None,
+    "penro_activity_logs": ["CENRO", "EVALUATOR"],
+}
+
+
+def _parse_day(value) -> Optional[date]:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def date_range(dfrom=None, dto=None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Turn the inclusive from/to days (YYYY-MM-DD, in the active timezone)
+    into a half-open [start, end) timestamp range. Comparing created_at
+    against plain timestamps keeps the predicate sargable, unlike
+    created_at__date which wraps the column in a date function. Invalid
+    days are ignored.
+    """
+    first, last = _parse_day(dfrom), _parse_day(dto)
+    return (
+        day_start(first) if first else None,
+        day_start(last + ONE_DAY) if last else None,
+    )
+
+
+def log_filters(params) -> Dict[str, Optional[str]]:
+    """The activity-log filters from request.GET, as activity_metrics() takes them."""
+    return {
+        "q": params.get("q"),
+        "role": params.get("role"),
+        "action": params.get("action"),
+        "dfrom": params.get("from"),
+        "dto": params.get("to"),
+    }
+
+
+def filter_logs(filters: Dict, roles: Optional[List[str]] = None):
+    """
+    ActivityLog queryset for a listing, newest first. `roles` limits the
+    listing to users with those roles (the view's scope); `filters` are the
+    user's filters from log_filters().
+
+    Predicates follow the composite indexes: action equality and the
+    created_at range sit on (action, created_at), and role scopes become a
+    user_id IN (...) semi-join on (user, action, created_at) instead of a
+    join against User that the aggregates would have to carry too.
+    """
+    qs = ActivityLog.objects.all()
+    if filters.get("action"):
+        qs = qs.filter(action=filters["action"])
+
+    if filters.get("role"):
+        roles = [r for r in (roles if roles is not None else [filters["role"]])
+                 if r == filters["role"]]
+    if roles is not None:
+        qs = qs.filter(user_id__in=User.objects.filter(role__in=roles).values("pk"))
+
+    start, end = date_range(filters.get("dfrom"), filters.get("dto"))
+    if start is not None:
+        qs = qs.filter(created_at__gte=start)
+    if end is not None:
+        qs = qs.filter(created_at__lt=end)
+
+    if filters.get("q"):
+        qs = search_logs(qs, filters["q"])
+    return qs.select_related("user").order_by("-created_at")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from DENRO.archive import archive_logs, get_archive_settings
+from DENRO.rollups import rolled_up_through, rollup_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Move ActivityLog rows past their retention period into compressed "
+        "per-day JSONL files (see ACTIVITY_LOG_ARCHIVE). Run it daily, e.g. "
+        "from cron, to keep the table at a bounded size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=None,
+            help="Rows written and deleted per batch (default: CHUNK_SIZE setting)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report how many rows would be archived",
+        )
+
+    def handle(self, *args, **options):
+        # Archived days must already be in the rollups, or their metrics
+        # would disappear with the rows. A dry run writes nothing, so it
+        # only counts the days rolled up so far.
+        if options["dry_run"]:
+            self.stdout.write(
+                f"Rollups cover through {rolled_up_through() or 'nothing'}; later finished "
+                "days would be rolled up first and may add to the count below."
+            )
+        else:
+            rollup_days()
+
+        def progress(archived, last_id):
+            self.stdout.write(f"  archived {archived} rows (up to log id {last_id})")
+
+        archived, files = archive_logs(
+            chunk_size=options["chunk_size"], dry_run=options["dry_run"], progress=progress,
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"{archived} rows would be archived.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} rows into {files} files under {get_archive_settings()['DIR']}."
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from DENRO.models import GeoTaggedImage, LeasedPropertyProfile
+from DENRO.spatial import backfill_geohashes
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the geohash spatial-index column of LeasedPropertyProfile and "
+        "GeoTaggedImage rows (rows saved through the ORM keep it current; "
+        "run this after bulk imports or raw SQL updates of coordinates)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Rows per bulk update (default: 1000)",
+        )
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Recompute every row, not just rows without a geohash",
+        )
+
+    def handle(self, *args, **options):
+        for model in (LeasedPropertyProfile, GeoTaggedImage):
+            updated = backfill_geohashes(
+                model, batch_size=options["batch_size"], everything=options["all"]
+            )
+            self.stdout.write(f"{model.__name__}: {updated} rows updated")
+        self.stdout.write(self.style.SUCCESS("Geohash backfill complete."))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from DENRO.locations import LOCATION_ACTION, parse_location_details
+from DENRO.models import ActivityLog, LastKnownLocation, LocationPing, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill LastKnownLocation from each user's latest LocationPing "
+        "(or legacy LOCATION_UPDATE activity log)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Rows per bulk upsert (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        latest_ping = LocationPing.objects.filter(
+            user=OuterRef("pk")
+        ).order_by("-captured_at", "-id")
+        latest_log = ActivityLog.objects.filter(
+            user=OuterRef("pk"), action=LOCATION_ACTION
+        ).order_by("-created_at", "-id")
+        users = (
+            User.objects.annotate(
+                ping_lat=Subquery(latest_ping.values("latitude")[:1]),
+                ping_lon=Subquery(latest_ping.values("longitude")[:1]),
+                ping_at=Subquery(latest_ping.values("captured_at")[:1]),
+                log_details=Subquery(latest_log.values("details")[:1]),
+                log_at=Subquery(latest_log.values("created_at")[:1]),
+            )
+            .exclude(ping_at__isnull=True, log_at__isnull=True)
+            .values_list("id", "ping_lat", "ping_lon", "ping_at", "log_details", "log_at")
+        )
+
+        rows, written, skipped = [], 0, 0
+        for user_id, lat, lon, ping_at, details, log_at in users.iterator(chunk_size=batch_size):
+            coords = parse_location_details(details) if log_at else None
+            if coords and (ping_at is None or log_at > ping_at):
+                lat, lon, updated_at = round(coords[0], 7), round(coords[1], 7), log_at
+            elif ping_at is not None:
+                updated_at = ping_at
+            else:
+                skipped += 1
+                continue
+            rows.append(LastKnownLocation(
+                user_id=user_id, latitude=lat, longitude=lon, updated_at=updated_at,
+            ))
+            if len(rows) >= batch_size:
+                written += self._flush(rows)
+                rows = []
+        written += self._flush(rows)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {written} last known locations ({skipped} unparseable skipped)."
+        ))
+
+    def _flush(self, rows):
+        if not rows:
+            return 0
+        LastKnownLocation.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["latitude", "longitude", "updated_at"],
+        )
+        return len(rows)
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from DENRO.exif import extract_exif
+
+
+class Command(BaseCommand):
+    help = (
+        "Read GPS position, capture time and orientation from the EXIF of "
+        "stored GeoTaggedImage photos (only each file's header is read) and "
+        "place photos that carry a GPS fix at their own position. New "
+        "uploads are read when stored; run this for photos stored before."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Photos per database batch (default: 500)",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Processes reading files (default: CPU count; 1 reads inline)",
+        )
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Read every photo again, not just photos not read yet",
+        )
+
+    def handle(self, *args, **options):
+        def progress(read, located):
+            self.stdout.write(f"  {read} photos read, {located} with GPS")
+
+        read, located = extract_exif(
+            batch_size=options["batch_size"], workers=options["workers"],
+            everything=options["all"], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Read EXIF of {read} photos; {located} placed at their GPS position."
+        ))
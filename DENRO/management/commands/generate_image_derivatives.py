@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from DENRO.images import render_derivatives
+from DENRO.models import GeoTaggedImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Render missing thumbnails and web-sized copies of stored photos "
+        "(see IMAGES), e.g. after adding a variant or when the background "
+        "workers were stopped before finishing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Render every variant again, even those that exist",
+        )
+
+    def handle(self, *args, **options):
+        photos = (
+            GeoTaggedImage.objects.filter(sha256__isnull=False)
+            .order_by("sha256").values_list("sha256", "image").distinct()
+        )
+        seen = rendered = failed = 0
+        for digest, name in photos.iterator():
+            seen += 1
+            try:
+                rendered += render_derivatives(digest, name, force=options["force"])
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"  {name}: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {seen} photos: rendered {rendered} derivatives, {failed} failed."
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from DENRO.boundaries import import_boundaries, load_feature_file, reclassify_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Import protected-area boundaries and management zones from GeoJSON "
+        "files. Features are matched to protected areas by name; features "
+        "with a zone property become management zones of that area."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="GeoJSON Feature or FeatureCollection files")
+        parser.add_argument(
+            "--name-field", default="name",
+            help="Feature property holding the protected area name (default: name)",
+        )
+        parser.add_argument(
+            "--zone-field", default="zone",
+            help="Feature property holding the management zone name (default: zone)",
+        )
+        parser.add_argument(
+            "--reclassify", action="store_true",
+            help="Reclassify every leased property profile afterwards",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            try:
+                areas, zones = import_boundaries(
+                    load_feature_file(path), options["name_field"], options["zone_field"]
+                )
+            except (OSError, ValueError) as e:
+                raise CommandError(f"{path}: {e}")
+            self.stdout.write(f"{path}: {areas} area boundaries, {zones} zones")
+
+        if options["reclassify"]:
+            checked, changed = reclassify_profiles()
+            self.stdout.write(f"Reclassified {checked} profiles ({changed} changed).")
+        self.stdout.write(self.style.SUCCESS("Import complete."))
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from DENRO.duplicates import compute_dhashes
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the perceptual hash of stored GeoTaggedImage photos that "
+        "have none, used to flag likely duplicate reports on the review "
+        "pages. New uploads are hashed when stored; run this for photos "
+        "stored before, or with --all after changing how photos are hashed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Photos per database batch (default: 500)",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Processes decoding photos (default: CPU count; 1 decodes inline)",
+        )
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Hash every photo again, not just photos without a hash",
+        )
+
+    def handle(self, *args, **options):
+        def progress(hashed, failed):
+            self.stdout.write(f"  {hashed} photos hashed, {failed} unreadable")
+
+        hashed, failed = compute_dhashes(
+            batch_size=options["batch_size"], workers=options["workers"],
+            everything=options["all"], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Hashed {hashed} photos; {failed} could not be decoded."
+        ))
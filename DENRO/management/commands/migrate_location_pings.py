@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from DENRO.locations import LOCATION_ACTION, parse_location_details
+from DENRO.models import ActivityLog, LocationPing
+
+
+class Command(BaseCommand):
+    help = (
+        "Move legacy LOCATION_UPDATE activity logs into LocationPing, "
+        "streaming them in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="Activity log rows per chunk (default: 1000)",
+        )
+        parser.add_argument(
+            "--keep-source", action="store_true",
+            help="Leave the migrated rows in ActivityLog. Re-running without "
+                 "this flag afterwards will copy them again.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        keep_source = options["keep_source"]
+
+        source = ActivityLog.objects.filter(
+            action=LOCATION_ACTION, user__isnull=False
+        ).order_by("id")
+
+        last_id, migrated, skipped = 0, 0, 0
+        while True:
+            rows = list(
+                source.filter(id__gt=last_id).values_list(
+                    "id", "user_id", "details", "ip_address", "created_at"
+                )[:chunk_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            pings, parsed_ids = [], []
+            for log_id, user_id, details, ip_address, created_at in rows:
+                coords = parse_location_details(details)
+                if coords is None:
+                    # Left in ActivityLog for inspection
+                    skipped += 1
+                    continue
+                parsed_ids.append(log_id)
+                pings.append(LocationPing(
+                    user_id=user_id,
+                    latitude=round(coords[0], 7),
+                    longitude=round(coords[1], 7),
+                    captured_at=created_at,
+                    ip_address=ip_address,
+                ))
+
+            # Copy and delete together so an interrupted run can simply be
+            # restarted without duplicating pings.
+            with transaction.atomic():
+                LocationPing.objects.bulk_create(pings)
+                if not keep_source:
+                    ActivityLog.objects.filter(id__in=parsed_ids).delete()
+            migrated += len(pings)
+            self.stdout.write(f"  migrated {migrated} pings (up to log id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrated {migrated} location updates ({skipped} unparseable left in ActivityLog)."
+        ))
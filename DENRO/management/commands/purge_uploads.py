@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from DENRO.uploads import get_upload_settings, purge_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete resumable upload sessions that haven't received data for "
+        "EXPIRE_HOURS (see UPLOADS), with their part files. Finalized "
+        "photos are kept. Run it daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours", type=int, default=None,
+            help="Age in hours after which a session is removed (default: EXPIRE_HOURS setting)",
+        )
+
+    def handle(self, *args, **options):
+        removed = purge_uploads(options["hours"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} upload sessions from {get_upload_settings()['DIR']}."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from DENRO.search import LikeSearchBackend, get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ActivityLog full-text search index from scratch."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if isinstance(backend, LikeSearchBackend):
+            self.stdout.write("The LIKE search backend has no index to rebuild.")
+            return
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the search index ({type(backend).__name__})."
+        ))
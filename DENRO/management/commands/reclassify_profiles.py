@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from DENRO.boundaries import reclassify_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the protected area and management zone of every leased "
+        "property profile from its coordinates (run after importing or "
+        "editing boundaries)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="Profiles classified per batch (default: 5000)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(checked, changed):
+            self.stdout.write(f"  {checked} checked, {changed} changed")
+
+        checked, changed = reclassify_profiles(options["batch_size"], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Reclassified {checked} profiles ({changed} changed) "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
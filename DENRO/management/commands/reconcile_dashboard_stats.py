@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from DENRO.stats import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard counters from scratch and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report drift, don't overwrite the stored counters.",
+        )
+
+    def handle(self, *args, **options):
+        stats, drift = reconcile_counters(dry_run=options["dry_run"])
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All dashboard counters are exact."))
+            return
+
+        for name, (stored, actual) in sorted(drift.items()):
+            stored_text = "missing" if stored is None else stored
+            self.stdout.write(f"  {name}: stored {stored_text}, actual {actual}")
+        verb = "Found" if options["dry_run"] else "Fixed"
+        self.stdout.write(self.style.WARNING(f"{verb} drift in {len(drift)} counter(s)."))
@@ -0,0 +1,41 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from DENRO.archive import archived_through
+from DENRO.rollups import rolled_up_through, rollup_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll finished days of ActivityLog up into ActivityLogRollup. "
+        "Run it daily (e.g. from cron) shortly after midnight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild-from", metavar="YYYY-MM-DD",
+            help="Rebuild the rollups from this day on instead of only "
+                 "adding days after the last rolled-up one. Must be after "
+                 "the last day archive_activity_logs has archived.",
+        )
+
+    def handle(self, *args, **options):
+        first = None
+        if options["rebuild_from"]:
+            try:
+                first = date.fromisoformat(options["rebuild_from"])
+            except ValueError:
+                raise CommandError("--rebuild-from must be a date (YYYY-MM-DD)")
+            archived = archived_through()
+            if archived is not None and first <= archived:
+                raise CommandError(
+                    f"Days through {archived} are archived and their rollups can't be "
+                    f"rebuilt; use --rebuild-from {archived + timedelta(days=1)} or later"
+                )
+
+        written = rollup_days(first=first)
+        through = rolled_up_through()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} rollup rows; rollups now cover through {through or 'nothing'}."
+        ))
@@ -0,0 +1,201 @@
+# DENRO/mapfeatures.py
+from __future__ import annotations
+
+import math
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Min, QuerySet
+from django.db.models.functions import Floor
+
+from .models import GeoTaggedImage, LastKnownLocation, LeasedPropertyProfile
+from .spatial import in_bbox, nearest, within_radius
+
+# Defaults for settings.MAP_FEATURES. Points are grouped into square grid
+# cells about CELL_PX screen pixels wide at the requested zoom; a viewport
+# is never split into more than MAX_CELLS cells per layer (the cells grow
+# instead), so a response holds at most a few hundred features however
+# many rows fall inside it.
+MAP_FEATURE_DEFAULTS = {
+    "CELL_PX": 64,
+    "MAX_CELLS": 300,
+    "MAX_ZOOM": 20,
+}
+
+# Upper bound on rows returned by one nearby/nearest lookup
+MAX_NEARBY = 100
+
+# Web-map tiles are 256 px wide; zoom z shows 360 degrees in 256 * 2**z px
+TILE_PX = 256
+
+BBox = Tuple[float, float, float, float]  # west, south, east, north
+
+
+def get_map_settings() -> Dict:
+    return {**MAP_FEATURE_DEFAULTS, **getattr(settings, "MAP_FEATURES", {})}
+
+
+def parse_bbox(value: Optional[str]) -> BBox:
+    """
+    "west,south,east,north" in degrees (Leaflet's toBBoxString()), clamped
+    to valid coordinates. Raises ValueError if malformed.
+    """
+    if not value:
+        return (-180.0, -90.0, 180.0, 90.0)
+    west, south, east, north = (float(v) for v in value.split(","))
+    if not all(math.isfinite(v) for v in (west, south, east, north)):
+        raise ValueError("bbox must be finite")
+    if west > east or south > north:
+        raise ValueError("bbox must be west,south,east,north")
+    return (max(west, -180.0), max(south, -90.0), min(east, 180.0), min(north, 90.0))
+
+
+def cell_size(bbox: BBox, zoom: int, config: Dict) -> float:
+    """
+    Grid cell width in degrees for `zoom`, doubled until the bbox fits in
+    MAX_CELLS cells. Cells are square in degrees, which is close enough to
+    square on screen at the region's latitudes.
+    """
+    size = config["CELL_PX"] * 360.0 / (TILE_PX * 2 ** zoom)
+    west, south, east, north = bbox
+    while math.ceil((east - west) / size) * math.ceil((north - south) / size) > config["MAX_CELLS"]:
+        size *= 2
+    return size
+
+
+# ----------------- Layers -----------------
+class Layer(NamedTuple):
+    queryset: Callable[..., QuerySet]  # (viewer, roles) -> rows with coordinates
+    key: str  # field identifying a point (sent as its id)
+    fields: Tuple[str, ...]  # values() fields sent for single points
+    props: Callable[[Dict], Dict]
+    indexed: bool = False  # has a geohash column (see DENRO/spatial.py)
+
+
+def _staff(viewer, roles: Optional[List[str]]):
+    qs = LastKnownLocation.objects.filter(
+        user__is_approved=True, user__is_deactivated=False
+    ).exclude(user=viewer)
+    if roles is not None:
+        qs = qs.filter(user__role__in=roles)
+    return qs
+
+
+def _reports(viewer, roles):
+    return LeasedPropertyProfile.objects.filter(latitude__isnull=False, longitude__isnull=False)
+
+
+def _images(viewer, roles):
+    return GeoTaggedImage.objects.all()
+
+
+LAYERS: Dict[str, Layer] = {
+    "staff": Layer(
+        _staff, "user_id", ("user__username", "user__role", "updated_at"),
+        lambda row: {
+            "username": row["user__username"],
+            "role": row["user__role"],
+            "last_update": row["updated_at"],
+        },
+    ),
+    "reports": Layer(
+        _reports, "id", ("proponent_name", "location", "report_date"),
+        lambda row: {
+            "name": row["proponent_name"],
+            "location": row["location"],
+            "report_date": row["report_date"],
+        },
+        indexed=True,
+    ),
+    "images": Layer(
+        _images, "id", ("location", "captured_at"),
+        lambda row: {"location": row["location"], "captured_at": row["captured_at"]},
+        indexed=True,
+    ),
+}
+
+
+# ----------------- Clustering -----------------
+def _point(lon, lat, properties: Dict) -> Dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+        "properties": properties,
+    }
+
+
+def cluster_layer(name: str, qs: QuerySet, bbox: BBox, size: float) -> List[Dict]:
+    """
+    Features of one layer inside `bbox`: one query groups the rows by grid
+    cell (count, mean position), and a second fetches the details of the
+    cells that hold a single row, which are sent as plain points.
+    """
+    layer = LAYERS[name]
+    if layer.indexed:
+        qs = in_bbox(qs, bbox)
+    else:
+        west, south, east, north = bbox
+        qs = qs.filter(
+            latitude__gte=south, latitude__lte=north,
+            longitude__gte=west, longitude__lte=east,
+        )
+    cells = (
+        qs
+        .annotate(
+            cx=Floor(ExpressionWrapper(F("longitude") / size, output_field=FloatField())),
+            cy=Floor(ExpressionWrapper(F("latitude") / size, output_field=FloatField())),
+        )
+        .values("cx", "cy")
+        .annotate(n=Count("pk"), lat=Avg("latitude"), lon=Avg("longitude"), first=Min(layer.key))
+        .order_by()
+    )
+
+    features, singles = [], []
+    for cell in cells:
+        if cell["n"] == 1:
+            singles.append(cell["first"])
+        else:
+            features.append(_point(cell["lon"], cell["lat"], {
+                "layer": name, "cluster": True, "count": cell["n"],
+            }))
+
+    rows = qs.filter(**{f"{layer.key}__in": singles}).values(
+        layer.key, "latitude", "longitude", *layer.fields
+    ) if singles else []
+    for row in rows:
+        features.append(_point(row["longitude"], row["latitude"], {
+            "layer": name, "id": row[layer.key], **layer.props(row),
+        }))
+    return features
+
+
+def feature_collection(viewer, layers: List[str], bbox: BBox, zoom: int,
+                       roles: Optional[List[str]] = None) -> Dict:
+    """GeoJSON FeatureCollection of the requested layers, clustered for `zoom`."""
+    config = get_map_settings()
+    zoom = max(0, min(zoom, config["MAX_ZOOM"]))
+    size = cell_size(bbox, zoom, config)
+    features = []
+    for name in layers:
+        features += cluster_layer(name, LAYERS[name].queryset(viewer, roles), bbox, size)
+    return {"type": "FeatureCollection", "features": features, "zoom": zoom, "cell": size}
+
+
+def nearby_features(viewer, name: str, lat: float, lon: float,
+                    radius_m: Optional[float] = None, k: int = 10) -> Dict:
+    """
+    GeoJSON of the rows of an indexed layer within `radius_m` of (lat, lon),
+    or of the `k` nearest when no radius is given, nearest first, each with
+    its distance_m.
+    """
+    layer = LAYERS[name]
+    qs = layer.queryset(viewer, None)
+    rows = within_radius(qs, lat, lon, radius_m, k) if radius_m else nearest(qs, lat, lon, k)
+    features = []
+    for row in rows:
+        values = {field: getattr(row, field) for field in layer.fields}
+        features.append(_point(row.longitude, row.latitude, {
+            "layer": name, "id": row.pk, "distance_m": round(row.distance_m, 1),
+            **layer.props(values),
+        }))
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0011_alter_user_gender'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LastKnownLocation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='last_location', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('latitude', models.DecimalField(decimal_places=7, max_digits=10)),
+                ('longitude', models.DecimalField(decimal_places=7, max_digits=10)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-updated_at'], name='DENRO_lastk_updated_3a025d_idx')],
+            },
+        ),
+    ]
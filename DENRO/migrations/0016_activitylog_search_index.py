@@ -0,0 +1,115 @@
+# Full-text search shadow table for ActivityLog, kept in sync by triggers:
+# FTS5 on SQLite, a tsvector table with a GIN index on PostgreSQL. Other
+# databases fall back to LIKE searches (see DENRO/search.py).
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS "DENRO_activitylog_fts"
+       USING fts5(username, action, details, tokenize='unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS "DENRO_activitylog_fts_ai"
+       AFTER INSERT ON "DENRO_activitylog" BEGIN
+         INSERT INTO "DENRO_activitylog_fts"(rowid, username, action, details)
+         VALUES (new.id, (SELECT username FROM "DENRO_user" WHERE id = new.user_id),
+                 new.action, new.details);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS "DENRO_activitylog_fts_ad"
+       AFTER DELETE ON "DENRO_activitylog" BEGIN
+         DELETE FROM "DENRO_activitylog_fts" WHERE rowid = old.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS "DENRO_activitylog_fts_au"
+       AFTER UPDATE OF user_id, action, details ON "DENRO_activitylog" BEGIN
+         UPDATE "DENRO_activitylog_fts"
+            SET username = (SELECT username FROM "DENRO_user" WHERE id = new.user_id),
+                action = new.action, details = new.details
+          WHERE rowid = new.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS "DENRO_user_fts_au"
+       AFTER UPDATE OF username ON "DENRO_user" BEGIN
+         UPDATE "DENRO_activitylog_fts" SET username = new.username
+          WHERE rowid IN (SELECT id FROM "DENRO_activitylog" WHERE user_id = new.id);
+       END""",
+    """INSERT INTO "DENRO_activitylog_fts"(rowid, username, action, details)
+       SELECT l.id, u.username, l.action, l.details FROM "DENRO_activitylog" l
+       LEFT JOIN "DENRO_user" u ON u.id = l.user_id""",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS "DENRO_user_fts_au"',
+    'DROP TRIGGER IF EXISTS "DENRO_activitylog_fts_au"',
+    'DROP TRIGGER IF EXISTS "DENRO_activitylog_fts_ad"',
+    'DROP TRIGGER IF EXISTS "DENRO_activitylog_fts_ai"',
+    'DROP TABLE IF EXISTS "DENRO_activitylog_fts"',
+]
+
+POSTGRES_FORWARD = [
+    """CREATE TABLE IF NOT EXISTS "DENRO_activitylog_search" (
+         log_id bigint PRIMARY KEY REFERENCES "DENRO_activitylog"(id) ON DELETE CASCADE,
+         document tsvector NOT NULL
+       )""",
+    """CREATE INDEX IF NOT EXISTS "DENRO_activitylog_search_gin"
+       ON "DENRO_activitylog_search" USING GIN (document)""",
+    """CREATE OR REPLACE FUNCTION denro_activitylog_document(log_id bigint) RETURNS tsvector AS $$
+         SELECT setweight(to_tsvector('simple', coalesce(u.username, '')), 'A')
+             || setweight(to_tsvector('simple', coalesce(l.action, '')), 'B')
+             || setweight(to_tsvector('simple', coalesce(l.details, '')), 'C')
+           FROM "DENRO_activitylog" l LEFT JOIN "DENRO_user" u ON u.id = l.user_id
+          WHERE l.id = log_id
+       $$ LANGUAGE sql STABLE""",
+    """CREATE OR REPLACE FUNCTION denro_activitylog_search_sync() RETURNS trigger AS $$
+       BEGIN
+         INSERT INTO "DENRO_activitylog_search"(log_id, document)
+         VALUES (NEW.id, denro_activitylog_document(NEW.id))
+         ON CONFLICT (log_id) DO UPDATE SET document = EXCLUDED.document;
+         RETURN NULL;
+       END $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER denro_activitylog_search_sync
+       AFTER INSERT OR UPDATE OF user_id, action, details ON "DENRO_activitylog"
+       FOR EACH ROW EXECUTE FUNCTION denro_activitylog_search_sync()""",
+    """CREATE OR REPLACE FUNCTION denro_user_search_sync() RETURNS trigger AS $$
+       BEGIN
+         UPDATE "DENRO_activitylog_search" s
+            SET document = denro_activitylog_document(s.log_id)
+          WHERE s.log_id IN (SELECT id FROM "DENRO_activitylog" WHERE user_id = NEW.id);
+         RETURN NULL;
+       END $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER denro_user_search_sync
+       AFTER UPDATE OF username ON "DENRO_user"
+       FOR EACH ROW WHEN (OLD.username IS DISTINCT FROM NEW.username)
+       EXECUTE FUNCTION denro_user_search_sync()""",
+    """INSERT INTO "DENRO_activitylog_search"(log_id, document)
+       SELECT id, denro_activitylog_document(id) FROM "DENRO_activitylog"
+       ON CONFLICT (log_id) DO NOTHING""",
+]
+
+POSTGRES_REVERSE = [
+    'DROP TRIGGER IF EXISTS denro_user_search_sync ON "DENRO_user"',
+    'DROP TRIGGER IF EXISTS denro_activitylog_search_sync ON "DENRO_activitylog"',
+    "DROP FUNCTION IF EXISTS denro_user_search_sync()",
+    "DROP FUNCTION IF EXISTS denro_activitylog_search_sync()",
+    'DROP TABLE IF EXISTS "DENRO_activitylog_search"',
+    "DROP FUNCTION IF EXISTS denro_activitylog_document(bigint)",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0015_activitylogrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            _run({"sqlite": SQLITE_REVERSE, "postgresql": POSTGRES_REVERSE}),
+        ),
+    ]
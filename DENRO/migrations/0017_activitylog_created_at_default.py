@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0016_activitylog_search_index'),
+    ]
+
+    # auto_now_add -> default=timezone.now is a Python-side change only. On
+    # SQLite a real AlterField would rebuild the table and drop the search
+    # triggers from 0016, so only the migration state is updated.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='activitylog',
+                    name='created_at',
+                    field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+                ),
+            ],
+        ),
+    ]
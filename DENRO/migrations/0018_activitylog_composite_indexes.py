@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0017_activitylog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='DENRO_activ_action_18ce2b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='DENRO_activ_user_id_557f94_idx',
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['action', 'created_at'], name='DENRO_activ_action_557749_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'action', 'created_at'], name='DENRO_activ_user_id_90edca_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+from DENRO.spatial import backfill_geohashes
+
+
+def fill_geohashes(apps, schema_editor):
+    for name in ("GeoTaggedImage", "LeasedPropertyProfile"):
+        backfill_geohashes(apps.get_model("DENRO", name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0019_notification_broadcasts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geotaggedimage',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='leasedpropertyprofile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0020_spatial_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leasedpropertyprofile',
+            name='protected_area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profiles', to='DENRO.protectedarea'),
+        ),
+        migrations.AddField(
+            model_name='protectedarea',
+            name='boundary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='protectedarea',
+            name='max_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='protectedarea',
+            name='max_lon',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='protectedarea',
+            name='min_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='protectedarea',
+            name='min_lon',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ManagementZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('boundary', models.JSONField()),
+                ('min_lon', models.FloatField()),
+                ('min_lat', models.FloatField()),
+                ('max_lon', models.FloatField()),
+                ('max_lat', models.FloatField()),
+                ('protected_area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zones', to='DENRO.protectedarea')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='leasedpropertyprofile',
+            name='management_zone',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profiles', to='DENRO.managementzone'),
+        ),
+        migrations.AddConstraint(
+            model_name='managementzone',
+            constraint=models.UniqueConstraint(fields=('protected_area', 'name'), name='unique_zone_per_protected_area'),
+        ),
+    ]
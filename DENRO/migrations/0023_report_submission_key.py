@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0022_geofences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enumeratorsreport',
+            name='submission_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='enumeratorsreport',
+            constraint=models.UniqueConstraint(condition=models.Q(('submission_key__isnull', False)), fields=('enumerator', 'submission_key'), name='unique_submission_per_enumerator'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0024_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geotaggedimage',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0025_image_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geotaggedimage',
+            name='exif_gps',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='geotaggedimage',
+            name='exif_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='geotaggedimage',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='geotaggedimage',
+            name='taken_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:05
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_watermark(apps, schema_editor):
+    # Every day up to the newest rollup row has been processed so far
+    last = apps.get_model("DENRO", "ActivityLogRollup").objects.aggregate(last=Max("day"))["last"]
+    if last is not None:
+        apps.get_model("DENRO", "RollupWatermark").objects.create(name="activity_logs", day=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0027_image_dhash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.RunPython(seed_watermark, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DENRO', '0028_rollup_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geotaggedimage',
+            name='hashed_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,10 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
 
 # User = get_user_model()
 
@@ -19,6 +22,8 @@ class ActivityAction(models.TextChoices):
     ERROR   = "ERROR", "Error"
     REPORT_CENRO = "REPORT_CENRO", "CENRO Report"
     REPORT_PENRO = "REPORT_PENRO", "PENRO Report"
+    GEOFENCE_ENTER = "GEOFENCE_ENTER", "Entered Area"
+    GEOFENCE_EXIT = "GEOFENCE_EXIT", "Left Area"
 
 class ActivityLog(models.Model):
     user        = models.ForeignKey(
@@ -30,14 +35,17 @@ class ActivityLog(models.Model):
     action      = models.CharField(max_length=16, choices=ActivityAction.choices)
     details     = models.TextField(blank=True, null=True)
     ip_address  = models.GenericIPAddressField(blank=True, null=True)
-    created_at  = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when a buffered row is finally written
+    created_at  = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["-created_at"]),
-            models.Index(fields=["action"]),
-            models.Index(fields=["user"]),
+            # Composite indexes for the listing filters (see DENRO/logquery.py);
+            # they also cover plain action / user lookups.
+            models.Index(fields=["action", "created_at"]),
+            models.Index(fields=["user", "action", "created_at"]),
         ]
 
     def __str__(self):
@@ -45,6 +53,40 @@ class ActivityLog(models.Model):
         return f"[{self.created_at:%Y-%m-%d %H:%M:%S}] {u} {self.action}"
 
 
+class ActivityLogRollup(models.Model):
+    # Per-day event counts for the activity-log metric panels, built by the
+    # `rollup_activity_logs` command for finished days. The user is kept in
+    # the key so "unique users" can still be answered from the rollups.
+    day         = models.DateField()
+    action      = models.CharField(max_length=16)
+    role        = models.CharField(max_length=20, blank=True, null=True)
+    user        = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="+",
+    )
+    count       = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["day", "action", "role"]),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.action} {self.role}: {self.count}"
+
+
+class RollupWatermark(models.Model):
+    # Last day a rollup has processed, days without any activity included
+    # (DENRO/rollups.py); the rollup rows alone can't tell an empty day
+    # from one that was never rolled up.
+    name = models.CharField(max_length=50, primary_key=True)
+    day = models.DateField()
+
+    def __str__(self):
+        return f"{self.name} through {self.day}"
+
 
 
 
@@ -77,15 +119,29 @@ class User(AbstractUser):
 
 
 class GeoTaggedImage(models.Model):
+    # Storage name of the photo; content-addressed by sha256 (DENRO/images.py)
     image = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64, blank=True, null=True, editable=False, db_index=True)
     qr_code = models.CharField(max_length=255, unique=True)
     latitude = models.DecimalField(max_digits=10, decimal_places=7)
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
     location = models.CharField(max_length=255)
+    # Spatial index key, kept in sync with latitude/longitude (DENRO/spatial.py)
+    geohash = models.CharField(max_length=12, blank=True, null=True, editable=False, db_index=True)
     captured_by = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="captured_images"
     )
     captured_at = models.DateTimeField(auto_now_add=True)
+    # From the photo's EXIF (DENRO/exif.py); exif_gps means latitude and
+    # longitude are the photo's own rather than the report's
+    taken_at = models.DateTimeField(blank=True, null=True)
+    orientation = models.PositiveSmallIntegerField(blank=True, null=True)
+    exif_gps = models.BooleanField(default=False)
+    exif_read = models.BooleanField(default=False)
+    # 64-bit perceptual hash in hex, "" if the photo couldn't be decoded
+    # (DENRO/duplicates.py)
+    dhash = models.CharField(max_length=16, blank=True, null=True, editable=False, db_index=True)
+    hashed_at = models.DateTimeField(blank=True, null=True, editable=False, db_index=True)
 
     def __str__(self):
         return f"Image {self.id} - {self.location}"
@@ -101,11 +157,40 @@ class EvaluatorsTrackRoute(models.Model):
 
 class ProtectedArea(models.Model):
     name = models.CharField(max_length=255)
+    # GeoJSON Polygon/MultiPolygon geometry (lon, lat) and its bounding box,
+    # imported with the import_protected_areas command (DENRO/boundaries.py)
+    boundary = models.JSONField(blank=True, null=True)
+    min_lon = models.FloatField(blank=True, null=True)
+    min_lat = models.FloatField(blank=True, null=True)
+    max_lon = models.FloatField(blank=True, null=True)
+    max_lat = models.FloatField(blank=True, null=True)
 
     def __str__(self):
         return self.name
 
 
+class ManagementZone(models.Model):
+    protected_area = models.ForeignKey(
+        ProtectedArea, on_delete=models.CASCADE, related_name="zones"
+    )
+    name = models.CharField(max_length=100)
+    boundary = models.JSONField()
+    min_lon = models.FloatField()
+    min_lat = models.FloatField()
+    max_lon = models.FloatField()
+    max_lat = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["protected_area", "name"], name="unique_zone_per_protected_area"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.protected_area.name} - {self.name}"
+
+
 class LeasedPropertyProfile(models.Model):
     report_date = models.DateField()
     proponent_name = models.CharField(max_length=255)
@@ -122,10 +207,21 @@ class LeasedPropertyProfile(models.Model):
     longitude = models.DecimalField(
         max_digits=10, decimal_places=7, blank=True, null=True
     )
+    # Spatial index key, kept in sync with latitude/longitude (DENRO/spatial.py)
+    geohash = models.CharField(max_length=12, blank=True, null=True, editable=False, db_index=True)
     area_covered = models.DecimalField(
         max_digits=10, decimal_places=2, blank=True, null=True
     )
     pa_management_zone = models.CharField(max_length=100, blank=True, null=True)
+    # Set from latitude/longitude against the imported boundaries
+    protected_area = models.ForeignKey(
+        ProtectedArea, on_delete=models.SET_NULL, blank=True, null=True,
+        related_name="profiles", editable=False,
+    )
+    management_zone = models.ForeignKey(
+        ManagementZone, on_delete=models.SET_NULL, blank=True, null=True,
+        related_name="profiles", editable=False,
+    )
     establishment_status = models.CharField(max_length=100, blank=True, null=True)
     easement = models.BooleanField(default=False)
 
@@ -243,16 +339,162 @@ class EnumeratorsReport(models.Model):
         default=StatusChoices.PENDING,
     )
     notes = models.TextField(blank=True, null=True)
+    # Client-chosen idempotency key; a replayed submission with the same key
+    # returns the original report (DENRO/reports.py)
+    submission_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["enumerator", "submission_key"],
+                condition=models.Q(submission_key__isnull=False),
+                name="unique_submission_per_enumerator",
+            ),
+        ]
 
     def __str__(self):
         return f"Report {self.id} - {self.report_date}"
 
 
 class Notification(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)  # kinsa nag-register
+    # Either a direct notification (user set, read state in is_read) or a
+    # broadcast to everyone with `role` (user empty, read state per user in
+    # NotificationReceipt). See DENRO/notifications.py.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)  # kinsa nag-register
+    role = models.CharField(max_length=20, choices=User.RoleChoices.choices, null=True, blank=True)
     message = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)  # para ma-mark read once nakita
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "is_read", "-created_at"]),
+            models.Index(fields=["role", "-created_at"]),
+        ]
+
+    def __str__(self):
+        target = self.user.username if self.user_id else f"all {self.role}"
+        return f"Notification for {target} - {self.message}"
+
+
+class NotificationReceipt(models.Model):
+    # One row per user who has read a broadcast Notification
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name="receipts")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "notification"], name="unique_notification_receipt"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} read {self.notification_id}"
+
+
+class LocationPing(models.Model):
+    # Location history from field devices. Replaces the free-text
+    # "Location updated: lat, lon" rows that used to go into ActivityLog.
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="location_pings"
+    )
+    latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    accuracy = models.FloatField(blank=True, null=True)  # metres, as reported by the device
+    captured_at = models.DateTimeField()  # device timestamp of the fix
+    received_at = models.DateTimeField(auto_now_add=True)
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-captured_at"]
+        indexes = [
+            models.Index(fields=["user", "captured_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} @ {self.latitude}, {self.longitude} ({self.captured_at:%Y-%m-%d %H:%M:%S})"
+
+
+class LastKnownLocation(models.Model):
+    # One row per user, kept current on every location write so the map
+    # views never have to scan ActivityLog for each user's latest ping.
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="last_location"
+    )
+    latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} @ {self.latitude}, {self.longitude}"
+
+
+class SiteAssignment(models.Model):
+    # A circular geofence around a site a field user is assigned to visit;
+    # entering and leaving it notifies whoever assigned it.
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="site_assignments"
+    )
+    name = models.CharField(max_length=255)
+    latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    radius_m = models.PositiveIntegerField(default=200)
+    assigned_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "is_active"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.user.username})"
+
+
+class UploadSession(models.Model):
+    # A resumable photo upload (DENRO/uploads.py). The bytes received so
+    # far are in a part file under settings.UPLOADS["DIR"]; finalizing
+    # stores the file and attaches it to a new GeoTaggedImage.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # Expected SHA-256 (hex) if the client sent one
+    sha256 = models.CharField(max_length=64, blank=True, null=True)
+    latitude = models.DecimalField(max_digits=10, decimal_places=7, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7, blank=True, null=True)
+    location = models.CharField(max_length=255, blank=True)
+    image = models.OneToOneField(
+        GeoTaggedImage, on_delete=models.SET_NULL, blank=True, null=True, related_name="upload"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received}/{self.size} bytes)"
+
+
+class StatCounter(models.Model):
+    # Exact dashboard counters, kept up to date by DENRO/signals.py when
+    # settings.DASHBOARD_STATS["USE_COUNTERS"] is on.
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
     def __str__(self):
-        return f"Notification for {self.user.username} - {self.message}"
+        return f"{self.name} = {self.value}"
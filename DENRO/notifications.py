@@ -0,0 +1,214 @@
+# DENRO/notifications.py
+from __future__ import annotations
+
+import time
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Notification, NotificationReceipt
+
+# Roles that receive "for the admins" broadcasts
+ADMIN_ROLES = ["ADMIN", "SUPER_ADMIN"]
+
+# Defaults for settings.NOTIFICATIONS. Unread counts are cached per user
+# for COUNT_TTL seconds (and invalidated on every change); the bell shows
+# the newest LIST_SIZE unread notifications. Long-polling clients of the
+# feed API are held for at most LONG_POLL_MAX_S, re-checking the cache
+# every LONG_POLL_INTERVAL_S; that needs the ASGI server. Under WSGI the
+# feed answers at once and clients poll every POLL_INTERVAL_S.
+NOTIFICATION_DEFAULTS = {
+    "COUNT_TTL": 600,
+    "LIST_SIZE": 10,
+    "LONG_POLL_MAX_S": 25,
+    "LONG_POLL_INTERVAL_S": 1.0,
+    "POLL_INTERVAL_S": 15,
+}
+
+UNREAD_COUNT_KEY = "notifications:unread:{}:{}"
+ROLE_VERSION_KEY = "notifications:role_version:{}"
+USER_VERSION_KEY = "notifications:user_version:{}"
+
+
+def get_notification_settings():
+    return {**NOTIFICATION_DEFAULTS, **getattr(settings, "NOTIFICATIONS", {})}
+
+
+# ----------------- Change tracking -----------------
+# Every user's notification state is summarised by two cache-held
+# versions: one for their role (changed by broadcasts) and one for the
+# user (changed by direct notifications and reads). Versions are set to
+# the current time in nanoseconds rather than incremented, so an evicted
+# key never comes back with a value a client has already seen.
+def _new_version() -> int:
+    return time.time_ns()
+
+
+def _version(key: str) -> int:
+    return cache.get_or_set(key, _new_version, timeout=None)
+
+
+def state_token(user) -> str:
+    """Changes whenever anything in `user`'s notifications may have changed."""
+    role_version = _version(ROLE_VERSION_KEY.format(user.role))
+    user_version = _version(USER_VERSION_KEY.format(user.pk))
+    return f"{role_version}.{user_version}"
+
+
+def _count_key(user) -> str:
+    return UNREAD_COUNT_KEY.format(user.pk, state_token(user))
+
+
+def _touch_users(user_ids):
+    keys = [USER_VERSION_KEY.format(pk) for pk in user_ids]
+    transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, _new_version()), timeout=None))
+
+
+def _touch_roles(roles):
+    keys = [ROLE_VERSION_KEY.format(role) for role in roles]
+    transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, _new_version()), timeout=None))
+
+
+# ----------------- Sending -----------------
+def notify_users(users: Iterable, message: str) -> List[Notification]:
+    """Direct notifications for the given User objects, inserted in one query."""
+    users = list(users)
+    notes = [Notification(user=u, message=message) for u in users]
+    with transaction.atomic():
+        notes = Notification.objects.bulk_create(notes)
+        _touch_users([u.pk for u in users])
+    return notes
+
+
+def broadcast(roles: Iterable[str], message: str) -> List[Notification]:
+    """
+    Notify everyone with one of `roles`. Stored once per role, however many
+    users hold it; each user's read state lives in NotificationReceipt.
+    Users only see broadcasts sent after they joined, and only while their
+    account is approved and not deactivated.
+    """
+    roles = list(roles)
+    notes = [Notification(role=role, message=message) for role in roles]
+    with transaction.atomic():
+        notes = Notification.objects.bulk_create(notes)
+        _touch_roles(roles)
+    return notes
+
+
+# ----------------- Reading -----------------
+def _visible(user) -> Q:
+    if not user.is_approved or user.is_deactivated:
+        # Role broadcasts only reach approved, active accounts
+        return Q(user=user)
+    return Q(user=user) | Q(
+        user__isnull=True, role=user.role, created_at__gte=user.date_joined
+    )
+
+
+def notifications_for(user):
+    """Every notification `user` can see, direct and broadcast, newest first."""
+    return Notification.objects.filter(_visible(user)).order_by("-created_at")
+
+
+def unread_notifications(user):
+    """Notifications `user` hasn't read yet, newest first."""
+    read_receipt = NotificationReceipt.objects.filter(notification=OuterRef("pk"), user=user)
+    return (
+        notifications_for(user)
+        .filter(Q(user=user, is_read=False) | Q(user__isnull=True))
+        .exclude(Q(user__isnull=True) & Exists(read_receipt))
+    )
+
+
+def unread_count(user) -> int:
+    """Number of unread notifications, from the per-user cache when warm."""
+    key = _count_key(user)
+    count = cache.get(key)
+    if count is None:
+        count = unread_notifications(user).count()
+        cache.set(key, count, get_notification_settings()["COUNT_TTL"])
+    return count
+
+
+def latest_unread(user, limit=None) -> List[Notification]:
+    """The newest unread notifications for the bell menu, with only the shown fields."""
+    limit = limit or get_notification_settings()["LIST_SIZE"]
+    return list(unread_notifications(user).only("id", "message", "created_at")[:limit])
+
+
+def notifications_since(user, since_id=None, since_time=None, limit=None) -> List[Notification]:
+    """
+    Notifications visible to `user` that are newer than `since_id` (or
+    created after `since_time`), oldest first, with `read` set on each.
+    """
+    limit = limit or get_notification_settings()["LIST_SIZE"]
+    qs = notifications_for(user)
+    if since_id is not None:
+        qs = qs.filter(id__gt=since_id)
+    elif since_time is not None:
+        qs = qs.filter(created_at__gt=since_time)
+    read_receipt = NotificationReceipt.objects.filter(notification=OuterRef("pk"), user=user)
+    notes = list(
+        qs.annotate(has_receipt=Exists(read_receipt))
+        .only("id", "user_id", "message", "created_at", "is_read")
+        .order_by("-id")[:limit]
+    )
+    for note in notes:
+        note.read = note.is_read if note.user_id else note.has_receipt
+    notes.reverse()
+    return notes
+
+
+def mark_all_read(user, up_to_id: int) -> int:
+    """
+    Mark every notification of `user` with id <= up_to_id read: one UPDATE
+    for direct notifications and one INSERT of receipts for broadcasts.
+    Returns the number of notifications newly marked read.
+    """
+    with transaction.atomic():
+        marked = Notification.objects.filter(
+            user=user, is_read=False, id__lte=up_to_id
+        ).update(is_read=True)
+        read_receipt = NotificationReceipt.objects.filter(notification=OuterRef("pk"), user=user)
+        broadcast_ids = list(
+            notifications_for(user).filter(user__isnull=True, id__lte=up_to_id)
+            .exclude(Exists(read_receipt)).values_list("id", flat=True)
+        )
+        if broadcast_ids:
+            # bulk_create returns every row it was given, including those a
+            # concurrent request inserted first; count what was added
+            receipts = NotificationReceipt.objects.filter(user=user, notification_id__in=broadcast_ids)
+            before = receipts.count()
+            NotificationReceipt.objects.bulk_create(
+                [NotificationReceipt(notification_id=pk, user=user) for pk in broadcast_ids],
+                ignore_conflicts=True,
+            )
+            marked += receipts.count() - before
+        if marked:
+            _touch_users([user.pk])
+    return marked
+
+
+def mark_read(user, notification: Notification) -> bool:
+    """Mark one notification read for `user`. False if they can't see it."""
+    if notification.user_id == user.pk:
+        if not notification.is_read:
+            Notification.objects.filter(pk=notification.pk).update(is_read=True)
+            _touch_users([user.pk])
+        return True
+    if notification.user_id is None and notification.role == user.role:
+        try:
+            with transaction.atomic():
+                _, created = NotificationReceipt.objects.get_or_create(
+                    notification=notification, user=user
+                )
+        except IntegrityError:
+            # A concurrent request wrote the same receipt
+            created = False
+        if created:
+            _touch_users([user.pk])
+        return True
+    return False
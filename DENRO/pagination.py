@@ -0,0 +1,137 @@
+# DENRO/pagination.py
+from __future__ import annotations
+
+import base64
+import json
+from typing import List, Optional
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Cursor that jumps to the oldest page
+LAST_PAGE = "last"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk, direction: str) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "i": pk, "d": direction})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(data["t"])
+        if created_at is None or data["d"] not in ("next", "prev"):
+            raise ValueError
+        return created_at, int(data["i"]), data["d"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor(token)
+
+
+def estimate_count(queryset, cap: int = 10000) -> Optional[int]:
+    """
+    Cheap row estimate for "about N results". Uses the planner estimate on
+    PostgreSQL; elsewhere counts at most `cap` rows (bounded work).
+    """
+    if connection.vendor == "postgresql":
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return queryset.order_by()[:cap].count()
+
+
+class CursorPage:
+    def __init__(self, object_list: List, has_next: bool, has_previous: bool,
+                 next_cursor: Optional[str], previous_cursor: Optional[str],
+                 estimated_count: Optional[int] = None, count_capped: bool = False):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_count = estimated_count
+        # True if the estimate stopped at the cap ("10000+")
+        self.count_capped = count_capped
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over (created_at, id), newest first. Each page is one
+    index range scan on created_at; there is no COUNT(*) and no OFFSET, so
+    deep pages cost the same as the first one. Page links carry opaque
+    cursor tokens instead of page numbers.
+    """
+
+    def __init__(self, queryset, per_page: int = 20, estimate_total: bool = False,
+                 count_cap: int = 10000):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.estimate_total = estimate_total
+        self.count_cap = count_cap
+
+    def get_page(self, cursor: Optional[str] = None) -> CursorPage:
+        """Page for `cursor`; an empty or invalid cursor gives the first page."""
+        qs = self.queryset
+        size = self.per_page
+
+        if cursor == LAST_PAGE:
+            rows = list(qs.order_by("created_at", "id")[:size])
+            rows.reverse()
+            has_next, has_previous = False, len(rows) > 0 and qs.filter(
+                self._newer(rows[0])
+            ).exists()
+            return self._page(rows, has_next, has_previous)
+
+        try:
+            created_at, pk, direction = decode_cursor(cursor) if cursor else (None, None, "next")
+        except InvalidCursor:
+            created_at, pk, direction = None, None, "next"
+
+        if direction == "prev":
+            newer = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            rows = list(qs.filter(newer).order_by("created_at", "id")[:size + 1])
+            has_previous = len(rows) > size
+            rows = rows[:size]
+            rows.reverse()
+            return self._page(rows, True, has_previous)
+
+        if created_at is not None:
+            older = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            qs = qs.filter(older)
+        rows = list(qs.order_by("-created_at", "-id")[:size + 1])
+        has_next = len(rows) > size
+        return self._page(rows[:size], has_next, created_at is not None)
+
+    @staticmethod
+    def _newer(row) -> Q:
+        return Q(created_at__gt=row.created_at) | Q(created_at=row.created_at, id__gt=row.pk)
+
+    def _page(self, rows, has_next, has_previous) -> CursorPage:
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].pk, "next")
+        if rows and has_previous:
+            previous_cursor = encode_cursor(rows[0].created_at, rows[0].pk, "prev")
+
+        estimated, capped = None, False
+        if self.estimate_total:
+            estimated = estimate_count(self.queryset, self.count_cap)
+            capped = connection.vendor != "postgresql" and estimated >= self.count_cap
+        return CursorPage(rows, has_next, has_previous, next_cursor, previous_cursor,
+                          estimated, capped)
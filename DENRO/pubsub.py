@@ -0,0 +1,142 @@
+# DENRO/pubsub.py
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Defaults for settings.PUBSUB. The in-process broker only reaches
+# subscribers in the same server process; use the Redis broker when
+# running several workers.
+PUBSUB_DEFAULTS = {
+    "BACKEND": "DENRO.pubsub.InProcessBroker",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "QUEUE_SIZE": 100,
+}
+
+
+def get_pubsub_settings() -> Dict:
+    return {**PUBSUB_DEFAULTS, **getattr(settings, "PUBSUB", {})}
+
+
+class Subscription:
+    """Messages for one subscriber, read from its own event loop."""
+
+    def __init__(self, size: int):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+    def put(self, message: Dict):
+        # Called on the subscriber's loop. A slow reader loses its oldest
+        # messages rather than growing without bound.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float) -> Optional[Dict]:
+        """Next message, or None if nothing arrives within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """Fan-out to subscribers living in this process (ASGI event loop)."""
+
+    def __init__(self, config: Dict):
+        self.size = config["QUEUE_SIZE"]
+        self.lock = threading.Lock()
+        self.channels: Dict[str, set] = {}
+
+    def publish(self, channel: str, message: Dict):
+        # Safe to call from sync code on any thread
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.put, message)
+            except RuntimeError:
+                # Subscriber's loop has closed; its unsubscribe is pending
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        sub = Subscription(self.size)
+        with self.lock:
+            self.channels.setdefault(channel, set()).add(sub)
+        try:
+            yield sub
+        finally:
+            with self.lock:
+                self.channels.get(channel, set()).discard(sub)
+
+
+class RedisBroker:
+    """Redis PUBLISH/SUBSCRIBE, shared by every worker process."""
+
+    def __init__(self, config: Dict):
+        import redis  # optional dependency, only needed for this backend
+
+        self.url = config["REDIS_URL"]
+        self.size = config["QUEUE_SIZE"]
+        self.client = redis.Redis.from_url(self.url)
+
+    def publish(self, channel: str, message: Dict):
+        self.client.publish(channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        sub = Subscription(self.size)
+
+        async def pump():
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    sub.put(json.loads(item["data"]))
+
+        task = asyncio.create_task(pump())
+        try:
+            yield sub
+        finally:
+            task.cancel()
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = get_pubsub_settings()
+                _broker = import_string(config["BACKEND"])(config)
+    return _broker
+
+
+def publish(channel: str, message: Dict):
+    """
+    Publish without ever failing the caller: live updates are best effort
+    and must not break the write that triggered them.
+    """
+    try:
+        get_broker().publish(channel, message)
+    except Exception:
+        logger.exception("Could not publish to %s", channel)
@@ -0,0 +1,410 @@
+# DENRO/reports.py
+from __future__ import annotations
+
+import logging
+import uuid
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+
+from .models import (
+    AttestationNotation, EnumeratorsReport, GeoTaggedImage, LeasedPropertyProfile,
+    PermitsDENREMB, PermitsLGU, ProtectedArea, TypeOfEstablishment,
+)
+from .boundaries import classify_profile
+from .exif import apply_exif
+from .images import StoredImage, schedule_derivatives, store_image
+from .spatial import geohash_for
+
+logger = logging.getLogger(__name__)
+
+# Longest idempotency key a client may send (EnumeratorsReport.submission_key)
+MAX_KEY_LENGTH = 64
+
+# Upper bound on reports in one bulk submission
+MAX_BATCH_REPORTS = 50
+
+
+class ReportError(ValueError):
+    """A submission that can't be stored; the message is safe to show the user."""
+
+
+# ----------------- Parsing -----------------
+# Submissions arrive as form posts (QueryDict) or JSON objects (dict); both
+# use the enumerator form's field names.
+def _get(data, key) -> Optional[str]:
+    value = data.get(key)
+    if isinstance(value, str):
+        value = value.strip()
+    return value if value not in (None, "") else None
+
+
+def _getlist(data, key) -> List[str]:
+    if hasattr(data, "getlist"):
+        return [v for v in data.getlist(key) if v]
+    value = data.get(key) or []
+    return [value] if isinstance(value, str) else [v for v in value if v]
+
+
+def _flag(data, key, true_value="on") -> bool:
+    value = data.get(key)
+    return value is True or value == true_value
+
+
+def _date(data, key):
+    value = _get(data, key)
+    if value is None:
+        return None
+    try:
+        parsed = parse_date(str(value))
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ReportError(f"Invalid date for {key}")
+    return parsed
+
+
+def _int(data, key) -> Optional[int]:
+    value = _get(data, key)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ReportError(f"Invalid number for {key}")
+
+
+def _decimal(data, key) -> Optional[Decimal]:
+    value = _get(data, key)
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ReportError(f"Invalid number for {key}")
+
+
+def parse_report(data) -> Dict:
+    """
+    Validate an enumerator report (form or JSON) into model field values,
+    before any write. Raises ReportError.
+    """
+    report_date = _date(data, "report_date")
+    if report_date is None:
+        raise ReportError("Report date is required")
+    if not _get(data, "proponent_name"):
+        raise ReportError("Proponent name is required")
+    latitude, longitude = _decimal(data, "latitude"), _decimal(data, "longitude")
+    if (latitude is None) != (longitude is None):
+        raise ReportError("Latitude and longitude must be given together")
+    if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ReportError("Invalid coordinates")
+
+    types = _getlist(data, "establishment_type")
+    if _get(data, "establishment_others"):
+        types.append(_get(data, "establishment_others"))
+
+    return {
+        "pa_name": _get(data, "protected_area"),
+        "profile": {
+            "report_date": report_date,
+            "proponent_name": _get(data, "proponent_name"),
+            "contact_no": _get(data, "contact_number"),
+            "location": _get(data, "location"),
+            "lot_status": _get(data, "lot_status"),
+            "land_classification_status": _get(data, "land_classification"),
+            "title_no": _int(data, "title_no"),
+            "lot_no": _int(data, "lot_no"),
+            "lot_owner": _get(data, "lot_owner"),
+            "latitude": latitude,
+            "longitude": longitude,
+            "area_covered": _decimal(data, "area"),
+            "pa_management_zone": _get(data, "management_zone"),
+            "establishment_status": _get(data, "establishment_status"),
+            "easement": _flag(data, "easement", "Yes"),
+        },
+        "establishment": {
+            "name": ", ".join(types),
+            "description": _get(data, "description"),
+        },
+        "lgu_permit": {
+            "mayors_permit": _flag(data, "mayors_permit"),
+            "mp_number": _int(data, "mayors_permit_number"),
+            "mpdi": _date(data, "mayors_permit_issued"),
+            "mped": _date(data, "mayors_permit_expiry"),
+            "business_permit": _flag(data, "business_permit"),
+            "bp_number": _int(data, "business_permit_number"),
+            "bpdi": _date(data, "business_permit_issued"),
+            "bped": _date(data, "business_permit_expiry"),
+            "building_permit": _flag(data, "building_permit"),
+            "bldg_number": _int(data, "building_permit_number"),
+            "bldgdi": _date(data, "building_permit_issued"),
+            "bldged": _date(data, "building_permit_expiry"),
+        },
+        "denr_emb": {
+            "pamb_resolution": _flag(data, "pamb"),
+            "pamb_resolution_no": _int(data, "pamb_number"),
+            "pamb_di": _date(data, "pamb_issued"),
+            "sapa": _flag(data, "sapa"),
+            "sapa_no": _int(data, "sapa_number"),
+            "sapa_di": _date(data, "sapa_issued"),
+            "pacbrma": _flag(data, "pacbrma"),
+            "pacbrma_no": _int(data, "pacbrma_number"),
+            "pacbrma_di": _date(data, "pacbrma_issued"),
+            "ecc": _flag(data, "ecc"),
+            "ecc_no": _int(data, "ecc_number"),
+            "ecc_di": _date(data, "ecc_issued"),
+            "discharge_permit": _flag(data, "discharge_permit"),
+            "dp_no": _int(data, "discharge_permit_number"),
+            "dp_di": _date(data, "discharge_permit_issued"),
+            "permit_to_operate": _flag(data, "permit_operate"),
+            "pto_no": _int(data, "operate_permit_number"),
+            "pto_di": _date(data, "operate_permit_issued"),
+            "emb_rp": _get(data, "other_emb"),
+        },
+        "attestation": {
+            "attested_by_name": _get(data, "pa_coordinator_signature"),
+            "attested_by_position": "PA Coordinator",
+            "noted_by_name": _get(data, "apas_signature"),
+            "noted_by_position": "APAS",
+        },
+    }
+
+
+def clean_key(value) -> Optional[str]:
+    """A client's idempotency key, or None. Raises ReportError if unusable."""
+    if value in (None, ""):
+        return None
+    value = str(value).strip()
+    if not value or len(value) > MAX_KEY_LENGTH:
+        raise ReportError(f"Idempotency key must be 1-{MAX_KEY_LENGTH} characters")
+    return value
+
+
+# ----------------- Writing -----------------
+class Submission(NamedTuple):
+    """A validated report waiting to be stored."""
+    fields: Dict  # from parse_report
+    photos: Sequence  # StoredImage (from store_image) or ids of finalized uploads
+    key: Optional[str] = None  # idempotency key
+
+
+class Outcome(NamedTuple):
+    report: Optional[EnumeratorsReport]
+    created: bool
+    error: Optional[str] = None
+
+
+def parse_submission(item) -> Submission:
+    """
+    A report from a JSON body: the form's fields, plus optional "photos"
+    (ids of the user's finalized uploads) and "idempotency_key". Raises
+    ReportError.
+    """
+    if not isinstance(item, dict):
+        raise ReportError("Each report must be an object")
+    photos = []
+    for photo in _getlist(item, "photos"):
+        if isinstance(photo, str) and photo.strip().isdigit():
+            photo = int(photo)
+        if not _is_upload(photo):
+            raise ReportError("Photos must be ids of finalized uploads")
+        photos.append(photo)
+    return Submission(parse_report(item), photos, clean_key(item.get("idempotency_key")))
+
+
+def _is_upload(photo) -> bool:
+    return isinstance(photo, int) and not isinstance(photo, bool)
+
+
+def _prepare(user, submission: Submission, uploaded: Dict[int, GeoTaggedImage]) -> Dict:
+    """
+    The rows of one submission, built but not saved. The profile's
+    geohash and classification are set here because bulk_create skips the
+    pre_save signals that normally do it. Photos given as ids refer to the
+    user's finalized uploads (see DENRO/uploads.py) and are linked as is;
+    anything but those and files saved by store_image is rejected.
+    """
+    fields = submission.fields
+    profile = LeasedPropertyProfile(**fields["profile"])
+    classify_profile(profile)
+    profile.geohash = geohash_for(profile)
+    if profile.protected_area_id is None and not fields["pa_name"]:
+        raise ReportError("Protected area is required")
+
+    images, cover = [], None
+    for photo in submission.photos:
+        if _is_upload(photo):
+            if photo not in uploaded:
+                raise ReportError(f"Unknown photo {photo}")
+            image = uploaded[photo]
+        elif isinstance(photo, StoredImage) and default_storage.exists(photo.name):
+            stored = photo
+            if profile.latitude is None and not stored.exif.has_gps:
+                raise ReportError("Photos need the report's coordinates")
+            image = GeoTaggedImage(
+                image=stored.name,
+                sha256=stored.sha256,
+                qr_code=str(uuid.uuid4()),
+                latitude=profile.latitude,
+                longitude=profile.longitude,
+                location=profile.location or "",
+                captured_by=user,
+            )
+            image.geohash = geohash_for(image)
+            apply_exif(image, stored.exif)
+            images.append(image)
+        else:
+            raise ReportError(f"Unknown photo {photo}")
+        cover = cover or image
+    return {
+        "key": submission.key,
+        "pa_name": fields["pa_name"],
+        "profile": profile,
+        "establishment": TypeOfEstablishment(**fields["establishment"]),
+        "lgu_permit": PermitsLGU(**fields["lgu_permit"]),
+        "denr_emb": PermitsDENREMB(**fields["denr_emb"]),
+        "attestation": AttestationNotation(**fields["attestation"]),
+        "images": images,  # new rows only
+        "cover": cover,
+    }
+
+
+def _protected_areas(names) -> Dict[str, ProtectedArea]:
+    """Protected areas by name (the oldest of any duplicates), creating missing ones."""
+    found = {}
+    for pa in ProtectedArea.objects.filter(name__in=names).order_by("-pk"):
+        found[pa.name] = pa
+    missing = [ProtectedArea(name=name) for name in names if name not in found]
+    for pa in ProtectedArea.objects.bulk_create(missing):
+        found[pa.name] = pa
+    return found
+
+
+def _discard(rows: List[Dict]):
+    """Delete the child rows of reports whose own insert failed."""
+    for field, model in (
+        ("profile", LeasedPropertyProfile), ("establishment", TypeOfEstablishment),
+        ("lgu_permit", PermitsLGU), ("denr_emb", PermitsDENREMB),
+        ("attestation", AttestationNotation),
+    ):
+        model.objects.filter(pk__in=[row[field].pk for row in rows]).delete()
+    GeoTaggedImage.objects.filter(pk__in=[i.pk for row in rows for i in row["images"]]).delete()
+
+
+def _existing(user, key: Optional[str]) -> Optional[EnumeratorsReport]:
+    if key is None:
+        return None
+    return EnumeratorsReport.objects.filter(enumerator=user, submission_key=key).first()
+
+
+def store_reports(user, submissions: Sequence[Submission]) -> List[Outcome]:
+    """
+    Store validated reports in one transaction and return an Outcome per
+    submission, in order. Child rows (profiles, permits, attestations,
+    photos) of all reports are inserted with one bulk insert per table;
+    each report row then gets its own savepoint, so a conflicting
+    idempotency key only affects that report. A key the user already
+    submitted (earlier, concurrently, or earlier in the same batch)
+    returns the original report with created=False.
+    """
+    keys = {s.key for s in submissions if s.key is not None}
+    known = {
+        report.submission_key: report
+        for report in EnumeratorsReport.objects.filter(enumerator=user, submission_key__in=keys)
+    } if keys else {}
+
+    ids = {photo for s in submissions for photo in s.photos if _is_upload(photo)}
+    uploaded = GeoTaggedImage.objects.filter(captured_by=user).in_bulk(ids) if ids else {}
+
+    outcomes: List[Optional[Outcome]] = [None] * len(submissions)
+    pending, first_with_key = [], {}
+    for i, submission in enumerate(submissions):
+        if submission.key in known:
+            outcomes[i] = Outcome(known[submission.key], False)
+        elif submission.key is not None and submission.key in first_with_key:
+            continue  # resolved from the first one below
+        else:
+            try:
+                pending.append((i, _prepare(user, submission, uploaded)))
+            except ReportError as e:
+                outcomes[i] = Outcome(None, False, str(e))
+            if submission.key is not None:
+                first_with_key[submission.key] = i
+
+    if pending:
+        rows = [row for _, row in pending]
+        with transaction.atomic():
+            areas = _protected_areas(
+                {row["pa_name"] for row in rows if row["profile"].protected_area_id is None}
+            )
+            for field, model in (
+                ("profile", LeasedPropertyProfile), ("establishment", TypeOfEstablishment),
+                ("lgu_permit", PermitsLGU), ("denr_emb", PermitsDENREMB),
+                ("attestation", AttestationNotation),
+            ):
+                model.objects.bulk_create([row[field] for row in rows])
+            images = GeoTaggedImage.objects.bulk_create([image for row in rows for image in row["images"]])
+            for name, digest in {(i.image, i.sha256) for i in images if i.sha256}:
+                schedule_derivatives(StoredImage(name, digest))
+
+            failed = []
+            for i, row in pending:
+                profile = row["profile"]
+                try:
+                    with transaction.atomic():
+                        report = EnumeratorsReport.objects.create(
+                            report_date=profile.report_date,
+                            # Prefer the protected area the coordinates fall in
+                            pa_id=profile.protected_area_id or areas[row["pa_name"]].pk,
+                            profile=profile,
+                            establishment=row["establishment"],
+                            lgu_permit=row["lgu_permit"],
+                            denr_emb=row["denr_emb"],
+                            attestation=row["attestation"],
+                            enumerator=user,
+                            informant=None,
+                            geo_tag_image=row["cover"],
+                            status=EnumeratorsReport.StatusChoices.PENDING,
+                            submission_key=row["key"],
+                        )
+                    outcomes[i] = Outcome(report, True)
+                except IntegrityError:
+                    failed.append(row)
+                    existing = _existing(user, row["key"])
+                    if existing is not None:
+                        outcomes[i] = Outcome(existing, False)
+                    else:
+                        logger.exception("Could not store report for user %s", user.pk)
+                        outcomes[i] = Outcome(None, False, "Report could not be stored")
+            if failed:
+                _discard(failed)
+
+    for i, submission in enumerate(submissions):
+        if outcomes[i] is None:
+            first = outcomes[first_with_key[submission.key]]
+            outcomes[i] = first._replace(created=False)
+    return outcomes
+
+
+def submit_report(user, fields: Dict, photos: Sequence = (), key: Optional[str] = None
+                  ) -> Tuple[EnumeratorsReport, bool]:
+    """
+    Store a parsed report (see parse_report) with its photos as one atomic
+    unit; uploaded files are saved to content-addressed storage first.
+    With an idempotency `key`, a replay of a submission the user already
+    made returns the original report instead; the unique (enumerator,
+    submission_key) constraint settles concurrent replays. Returns
+    (report, created); raises ReportError.
+    """
+    if _existing(user, key) is not None:
+        # Don't store the photos of a replay again
+        photos = ()
+    photos = [store_image(photo) if hasattr(photo, "chunks") else photo for photo in photos]
+    outcome = store_reports(user, [Submission(fields, photos, key)])[0]
+    if outcome.error:
+        raise ReportError(outcome.error)
+    return outcome.report, outcome.created
@@ -0,0 +1,275 @@
+# DENRO/rollups.py
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .activity import flush_activity_log, written_before
+from .models import ActivityLog, ActivityLogRollup, RollupWatermark
+
+ONE_DAY = timedelta(days=1)
+
+WATERMARK = "activity_logs"
+
+
+def day_start(day: date) -> datetime:
+    """Midnight at the start of `day` in the active timezone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rolled_up_through() -> Optional[date]:
+    """
+    Last day rollup_days() has processed (None if never): every day up to
+    it is covered by ActivityLogRollup, including days with no rows.
+    """
+    return RollupWatermark.objects.filter(name=WATERMARK).values_list("day", flat=True).first()
+
+
+# ----------------- Maintenance -----------------
+def rollup_days(first: Optional[date] = None, last: Optional[date] = None) -> int:
+    """
+    (Re)build the rollup rows for the days first..last (inclusive). Defaults
+    to every finished day after the current watermark, so calling this
+    regularly keeps the table incrementally up to date. A day is finished
+    once written_before() has passed its end, so events still buffered by
+    the web processes' log writers are counted. Today is never rolled up;
+    readers take it from the raw table, and archived days are skipped: their
+    rows have left ActivityLog, so rebuilding them would wipe their counts.
+    The watermark advances to `last` unless that would skip days before
+    `first` that were never processed. Returns the number of rollup rows
+    written.
+    """
+    from .archive import archived_through
+
+    # Events queued in this process, if it logs any, belong in the counts
+    flush_activity_log()
+    through = rolled_up_through()
+    if first is None:
+        first = through + ONE_DAY if through else None
+    archived = archived_through()
+    if archived is not None and (first is None or first <= archived):
+        first = archived + ONE_DAY
+    yesterday = timezone.localdate(written_before()) - ONE_DAY
+    last = min(last or yesterday, yesterday)
+
+    logs = ActivityLog.objects.filter(created_at__lt=day_start(last + ONE_DAY))
+    if first is not None:
+        if first > last:
+            return 0
+        logs = logs.filter(created_at__gte=day_start(first))
+
+    grouped = (
+        logs.annotate(day=TruncDate("created_at"))
+        .values("day", "action", "user_id", "user__role")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    rows = [
+        ActivityLogRollup(
+            day=row["day"], action=row["action"], role=row["user__role"],
+            user_id=row["user_id"], count=row["n"],
+        )
+        for row in grouped.iterator()
+    ]
+
+    with transaction.atomic():
+        stale = ActivityLogRollup.objects.filter(day__lte=last)
+        if first is not None:
+            stale = stale.filter(day__gte=first)
+        stale.delete()
+        ActivityLogRollup.objects.bulk_create(rows, batch_size=1000)
+        contiguous = first is None or (through is not None and first <= through + ONE_DAY)
+        if contiguous and (through is None or last > through):
+            RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={"day": last})
+    return len(rows)
+
+
+# ----------------- Reading -----------------
+def _split_range(start: Optional[datetime], end: Optional[datetime],
+                 through: Optional[date]):
+    """
+    Split the time range [start, end) (None = unbounded) into the whole days
+    that the rollups cover, and the leftover raw-table ranges. Returns
+    ((first_day, last_day) or None, [(start, end), ...]).
+    """
+    if through is None:
+        return None, [(start, end)]
+
+    first = None
+    if start is not None:
+        first = timezone.localdate(start)
+        if start != day_start(first):
+            first += ONE_DAY
+    last = through
+    if end is not None:
+        last = min(last, timezone.localdate(end) - ONE_DAY)
+    if first is not None and first > last:
+        return None, [(start, end)]
+
+    raw = []
+    if first is not None and start < day_start(first):
+        raw.append((start, day_start(first)))
+    after = day_start(last + ONE_DAY)
+    if end is None or end > after:
+        raw.append((after, end))
+    return (first, last), raw
+
+
+def _range_q(ranges: Sequence[Tuple[Optional[datetime], Optional[datetime]]]) -> Q:
+    q = Q(pk__in=[])
+    for start, end in ranges:
+        if start is None and end is None:
+            # Unbounded; OR-ing an empty Q() would be a no-op, not "all rows"
+            return Q()
+        part = Q()
+        if start is not None:
+            part &= Q(created_at__gte=start)
+        if end is not None:
+            part &= Q(created_at__lt=end)
+        q |= part
+    return q
+
+
+def _parse_day(value) -> Optional[date]:
+    if not value:
+        return None
+    return date.fromisoformat(value)
+
+
+def activity_metrics(logs_qs, q=None, role=None, action=None, dfrom=None, dto=None,
+                     scope_roles: Optional[List[str]] = None):
+    """
+    Metric cards and breakdowns for the activity-log pages. `logs_qs` is the
+    view's filtered queryset; the other arguments describe the same filters
+    so that finished days can be answered from ActivityLogRollup and only
+    the unrolled tail (today) is read from ActivityLog. Free-text searches
+    can't use the rollups and fall back to aggregating `logs_qs` directly.
+
+    Returns (metrics, breakdowns) where breakdowns has the keys
+    total_events, unique_users, errors and this_week.
+    """
+    try:
+        first_day, last_day = _parse_day(dfrom), _parse_day(dto)
+    except ValueError:
+        return raw_activity_metrics(logs_qs)
+    if q:
+        return raw_activity_metrics(logs_qs)
+
+    start = day_start(first_day) if first_day else None
+    end = day_start(last_day + ONE_DAY) if last_day else None
+    week_start = timezone.now() - timedelta(days=7)
+    days, raw_ranges = _split_range(start, end, rolled_up_through())
+
+    rollup_qs = ActivityLogRollup.objects.none()
+    raw_qs = ActivityLog.objects.none()
+    role_filter, action_filter = {}, {}
+    if scope_roles is not None:
+        role_filter["role__in"] = scope_roles
+    if role:
+        role_filter["role"] = role
+    if action:
+        action_filter["action"] = action
+
+    raw_q = _range_q(raw_ranges)
+    if days:
+        rollup_qs = ActivityLogRollup.objects.filter(**role_filter, **action_filter)
+        if days[0] is not None:
+            rollup_qs = rollup_qs.filter(day__gte=days[0])
+        rollup_qs = rollup_qs.filter(day__lte=days[1])
+
+        # Whole days of the past week come from the rollups; the partial
+        # day the week starts in still needs the raw table.
+        covered_start = day_start(days[0]) if days[0] else None
+        covered_end = day_start(days[1] + ONE_DAY)
+        week_first = timezone.localdate(week_start)
+        if week_start != day_start(week_first):
+            week_first += ONE_DAY
+        edge_start = max(week_start, covered_start) if covered_start else week_start
+        edge_end = min(day_start(week_first), covered_end)
+        week_edge_q = _range_q([(edge_start, edge_end)]) if edge_start < edge_end else Q(pk__in=[])
+    else:
+        week_first = None
+        week_edge_q = Q(pk__in=[])
+
+    # An empty raw_q means "every row" and must not be OR-ed away
+    raw_qs = ActivityLog.objects.filter(raw_q | week_edge_q if raw_q else Q()).filter(
+        **{f"user__{k}": v for k, v in role_filter.items()}, **action_filter
+    )
+
+    total, with_user, week = {}, {}, {}
+
+    def add(target, key, value):
+        if value:
+            target[key] = target.get(key, 0) + value
+
+    if days:
+        week_filter = Q(day__gte=week_first)
+        for row in rollup_qs.values("action").annotate(
+            total=Sum("count"),
+            with_user=Sum("count", filter=Q(user__isnull=False)),
+            week=Sum("count", filter=week_filter),
+        ).order_by():
+            add(total, row["action"], row["total"])
+            add(with_user, row["action"], row["with_user"])
+            add(week, row["action"], row["week"])
+
+    for row in raw_qs.values("action").annotate(
+        total=Count("id", filter=raw_q),
+        with_user=Count("id", filter=raw_q & Q(user__isnull=False)),
+        week=Count("id", filter=Q(created_at__gte=week_start)),
+    ).order_by():
+        add(total, row["action"], row["total"])
+        add(with_user, row["action"], row["with_user"])
+        add(week, row["action"], row["week"])
+
+    unique_users = (
+        rollup_qs.values("user_id").order_by().distinct()
+        .union(raw_qs.filter(raw_q).values("user_id").order_by().distinct())
+        .count()
+    )
+    errors_breakdown = dict(
+        logs_qs.filter(action="ERROR").values_list("details").annotate(c=Count("id")).order_by()
+    )
+
+    metrics = {
+        "total_events": sum(total.values()),
+        "unique_users": unique_users,
+        "errors": total.get("ERROR", 0),
+        "this_week": sum(week.values()),
+    }
+    breakdowns = {
+        "total_events": total,
+        "unique_users": with_user,
+        "errors": errors_breakdown,
+        "this_week": week,
+    }
+    return metrics, breakdowns
+
+
+def raw_activity_metrics(logs_qs):
+    """Same as activity_metrics(), aggregated straight from `logs_qs`."""
+    week_start = timezone.now() - timedelta(days=7)
+    metrics = {
+        "total_events": logs_qs.count(),
+        "unique_users": logs_qs.values("user_id").distinct().count(),
+        "errors": logs_qs.filter(action="ERROR").count(),
+        "this_week": logs_qs.filter(created_at__gte=week_start).count(),
+    }
+    breakdowns = {
+        "total_events": dict(logs_qs.values_list("action").annotate(c=Count("id")).order_by()),
+        "unique_users": dict(
+            logs_qs.filter(user__isnull=False).values_list("action").annotate(c=Count("id")).order_by()
+        ),
+        "errors": dict(
+            logs_qs.filter(action="ERROR").values_list("details").annotate(c=Count("id")).order_by()
+        ),
+        "this_week": dict(
+            logs_qs.filter(created_at__gte=week_start).values_list("action").annotate(c=Count("id")).order_by()
+        ),
+    }
+    return metrics, breakdowns
@@ -0,0 +1,146 @@
+# DENRO/search.py
+from __future__ import annotations
+
+import re
+from functools import reduce
+from operator import and_
+from typing import List
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Shadow tables created (and kept in sync by triggers) in migration 0016
+SQLITE_FTS_TABLE = "DENRO_activitylog_fts"
+POSTGRES_SEARCH_TABLE = "DENRO_activitylog_search"
+
+MAX_TERMS = 8
+
+
+def search_terms(query: str) -> List[str]:
+    """Split a search box value into lowercase word tokens."""
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+class LikeSearchBackend:
+    """
+    Fallback for databases without a full-text index: every term must
+    appear in the username, details or action (substring match).
+    """
+
+    def filter(self, queryset, terms):
+        return queryset.filter(reduce(and_, (
+            Q(user__username__icontains=t) | Q(details__icontains=t) | Q(action__icontains=t)
+            for t in terms
+        )))
+
+    def rank(self, queryset, terms):
+        return self.filter(queryset, terms)
+
+    def rebuild(self):
+        return None
+
+
+class SQLiteFTSSearchBackend:
+    """FTS5 shadow table keyed by ActivityLog.id; every term is a prefix match."""
+
+    def _match(self, terms):
+        return " ".join(f'"{t}"*' for t in terms)
+
+    def filter(self, queryset, terms):
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM "{SQLITE_FTS_TABLE}" WHERE "{SQLITE_FTS_TABLE}" MATCH %s',
+            [self._match(terms)],
+        ))
+
+    def rank(self, queryset, terms):
+        # bm25() is lower-is-better; negate it so search_rank sorts descending
+        return self.filter(queryset, terms).annotate(search_rank=RawSQL(
+            f'(SELECT -bm25("{SQLITE_FTS_TABLE}") FROM "{SQLITE_FTS_TABLE}" '
+            f'WHERE "{SQLITE_FTS_TABLE}".rowid = "DENRO_activitylog"."id" '
+            f'AND "{SQLITE_FTS_TABLE}" MATCH %s)',
+            [self._match(terms)],
+        )).order_by("-search_rank", "-created_at")
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{SQLITE_FTS_TABLE}"')
+            cursor.execute(
+                f'INSERT INTO "{SQLITE_FTS_TABLE}"(rowid, username, action, details) '
+                'SELECT l.id, u.username, l.action, l.details FROM "DENRO_activitylog" l '
+                'LEFT JOIN "DENRO_user" u ON u.id = l.user_id'
+            )
+
+
+class PostgresSearchBackend:
+    """tsvector shadow table with a GIN index; every term is a prefix match."""
+
+    def _tsquery(self, terms):
+        return " & ".join(f"{t}:*" for t in terms)
+
+    def filter(self, queryset, terms):
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT log_id FROM "{POSTGRES_SEARCH_TABLE}" '
+            "WHERE document @@ to_tsquery('simple', %s)",
+            [self._tsquery(terms)],
+        ))
+
+    def rank(self, queryset, terms):
+        return self.filter(queryset, terms).annotate(search_rank=RawSQL(
+            f"(SELECT ts_rank(document, to_tsquery('simple', %s)) "
+            f'FROM "{POSTGRES_SEARCH_TABLE}" WHERE log_id = "DENRO_activitylog"."id")',
+            [self._tsquery(terms)],
+        )).order_by("-search_rank", "-created_at")
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE "{POSTGRES_SEARCH_TABLE}"')
+            cursor.execute(
+                f'INSERT INTO "{POSTGRES_SEARCH_TABLE}"(log_id, document) '
+                'SELECT id, denro_activitylog_document(id) FROM "DENRO_activitylog"'
+            )
+
+
+def _shadow_table_exists(name: str) -> bool:
+    return name in connection.introspection.table_names(include_views=False)
+
+
+_backends = {}
+
+
+def get_search_backend():
+    """
+    Search backend for ActivityLog. settings.ACTIVITY_LOG_SEARCH_BACKEND
+    (a dotted path) overrides the default, which is picked from the
+    database: FTS5 on SQLite, tsvector/GIN on PostgreSQL, LIKE otherwise.
+    """
+    key = (connection.alias, str(connection.settings_dict.get("NAME")))
+    if key in _backends:
+        return _backends[key]
+
+    path = getattr(settings, "ACTIVITY_LOG_SEARCH_BACKEND", None)
+    if path:
+        backend = import_string(path)()
+    elif connection.vendor == "sqlite" and _shadow_table_exists(SQLITE_FTS_TABLE):
+        backend = SQLiteFTSSearchBackend()
+    elif connection.vendor == "postgresql" and _shadow_table_exists(POSTGRES_SEARCH_TABLE):
+        backend = PostgresSearchBackend()
+    else:
+        backend = LikeSearchBackend()
+    _backends[key] = backend
+    return backend
+
+
+def search_logs(queryset, query, ranked: bool = False):
+    """
+    Filter an ActivityLog queryset by a search box value (the `q`
+    parameter). With `ranked`, results are annotated with `search_rank` and
+    ordered best match first; otherwise the queryset's ordering is kept.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    backend = get_search_backend()
+    return backend.rank(queryset, terms) if ranked else backend.filter(queryset, terms)
@@ -0,0 +1,65 @@
+# DENRO/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .boundaries import boundaries_changed, classify_profile
+from .geofence import sites_changed
+from .models import (
+    EnumeratorsReport, GeoTaggedImage, LeasedPropertyProfile, ManagementZone,
+    ProtectedArea, SiteAssignment, User,
+)
+from .spatial import geohash_for
+from .stats import (
+    bucket_fields, count_saved_row, get_stats_settings, invalidate_dashboard_stats,
+    rebuild_counters,
+)
+
+
+# ----------------- Dashboard stats -----------------
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=EnumeratorsReport)
+def stats_row_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not (set(update_fields) & bucket_fields(sender)):
+        # e.g. the last_login update on every login
+        return
+    invalidate_dashboard_stats()
+
+    if get_stats_settings()["USE_COUNTERS"]:
+        count_saved_row(instance, created)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=EnumeratorsReport)
+def stats_row_deleted(sender, instance, **kwargs):
+    invalidate_dashboard_stats()
+
+    if get_stats_settings()["USE_COUNTERS"]:
+        rebuild_counters(sender)
+
+
+# ----------------- Spatial index -----------------
+@receiver(pre_save, sender=LeasedPropertyProfile)
+@receiver(pre_save, sender=GeoTaggedImage)
+def set_geohash(sender, instance, **kwargs):
+    instance.geohash = geohash_for(instance)
+
+
+# ----------------- Protected-area boundaries -----------------
+@receiver(pre_save, sender=LeasedPropertyProfile)
+def set_protected_area(sender, instance, **kwargs):
+    classify_profile(instance)
+
+
+@receiver(post_save, sender=ProtectedArea)
+@receiver(post_save, sender=ManagementZone)
+@receiver(post_delete, sender=ProtectedArea)
+@receiver(post_delete, sender=ManagementZone)
+def boundary_saved(sender, **kwargs):
+    boundaries_changed()
+
+
+# ----------------- Geofences -----------------
+@receiver(post_save, sender=SiteAssignment)
+@receiver(post_delete, sender=SiteAssignment)
+def site_assignment_saved(sender, **kwargs):
+    sites_changed()
@@ -0,0 +1,250 @@
+# DENRO/spatial.py
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+
+from .locations import EARTH_RADIUS_M, haversine_m
+
+try:
+    import numpy as np
+except ImportError:  # optional: distances fall back to a Python loop
+    np = None
+
+# Stored geohash length: 9 characters is a cell of about 5 m x 5 m
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(GEOHASH_ALPHABET)}
+
+# Defaults for settings.SPATIAL_INDEX. A bbox is covered with at most
+# MAX_COVER_CELLS geohash cells (of the finest precision that fits), which
+# become that many index range scans at most.
+SPATIAL_DEFAULTS = {
+    "MAX_COVER_CELLS": 16,
+}
+
+BBox = Tuple[float, float, float, float]  # west, south, east, north
+
+
+def get_spatial_settings() -> Dict:
+    return {**SPATIAL_DEFAULTS, **getattr(settings, "SPATIAL_INDEX", {})}
+
+
+# ----------------- Geohash -----------------
+def _bits(precision: int) -> Tuple[int, int]:
+    """(longitude bits, latitude bits) of a geohash of `precision` chars."""
+    total = 5 * precision
+    return (total + 1) // 2, total // 2
+
+
+def cell_degrees(precision: int) -> Tuple[float, float]:
+    """(width, height) in degrees of a geohash cell."""
+    lon_bits, lat_bits = _bits(precision)
+    return 360.0 / 2 ** lon_bits, 180.0 / 2 ** lat_bits
+
+
+def _cell_index(lat: float, lon: float, precision: int) -> Tuple[int, int]:
+    lon_bits, lat_bits = _bits(precision)
+    x = min(int((lon + 180.0) / 360.0 * 2 ** lon_bits), 2 ** lon_bits - 1)
+    y = min(int((lat + 90.0) / 180.0 * 2 ** lat_bits), 2 ** lat_bits - 1)
+    return x, y
+
+
+def _interleave(x: int, y: int, precision: int) -> int:
+    # Geohash bits alternate longitude, latitude, starting with longitude
+    lon_bits, lat_bits = _bits(precision)
+    value = 0
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (x >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (y >> (lat_bits - 1 - i // 2)) & 1
+        value = (value << 1) | bit
+    return value
+
+
+def _to_hash(value: int, precision: int) -> str:
+    chars = []
+    for _ in range(precision):
+        chars.append(GEOHASH_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def geohash_encode(lat, lon, precision: int = GEOHASH_PRECISION) -> str:
+    lat, lon = float(lat), float(lon)
+    x, y = _cell_index(lat, lon, precision)
+    return _to_hash(_interleave(x, y, precision), precision)
+
+
+def geohash_bounds(geohash: str) -> BBox:
+    """(west, south, east, north) of a geohash cell."""
+    value = 0
+    for c in geohash:
+        value = (value << 5) | _DECODE[c]
+    precision = len(geohash)
+    lon_bits, lat_bits = _bits(precision)
+    x = y = 0
+    for i in range(5 * precision):
+        bit = (value >> (5 * precision - 1 - i)) & 1
+        if i % 2 == 0:
+            x = (x << 1) | bit
+        else:
+            y = (y << 1) | bit
+    width, height = cell_degrees(precision)
+    west, south = x * width - 180.0, y * height - 90.0
+    return west, south, west + width, south + height
+
+
+def cover_ranges(bbox: BBox, max_cells: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    Geohash ranges [low, high) that together contain every point in
+    `bbox`: the bbox is covered with cells of the finest precision that
+    needs at most `max_cells` cells, and cells that are adjacent in
+    geohash order are merged into one range.
+    """
+    max_cells = max_cells or get_spatial_settings()["MAX_COVER_CELLS"]
+    west, south, east, north = bbox
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        x0, y0 = _cell_index(south, west, precision)
+        x1, y1 = _cell_index(north, east, precision)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= max_cells:
+            break
+    else:
+        return [("", "~")]
+
+    values = sorted(
+        _interleave(x, y, precision)
+        for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)
+    )
+    ranges, start, end = [], values[0], values[0]
+    for value in values[1:]:
+        if value != end + 1:
+            ranges.append((start, end))
+            start = value
+        end = value
+    ranges.append((start, end))
+
+    last = 32 ** precision - 1
+    return [
+        (_to_hash(lo, precision), _to_hash(hi + 1, precision) if hi < last else "~")
+        for lo, hi in ranges
+    ]
+
+
+def geohash_for(instance) -> Optional[str]:
+    """Geohash of a row's latitude/longitude, or None if it has no position."""
+    if instance.latitude is None or instance.longitude is None:
+        return None
+    return geohash_encode(instance.latitude, instance.longitude)
+
+
+def backfill_geohashes(model, batch_size: int = 1000, everything: bool = False) -> int:
+    """
+    Set geohash on rows of `model` that lack one (every row with a position
+    if `everything`), batch by batch. Returns the number of rows updated.
+    """
+    qs = model.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    if not everything:
+        qs = qs.filter(geohash__isnull=True)
+    qs = qs.only("pk", "latitude", "longitude", "geohash").order_by("pk")
+
+    updated, last_pk = 0, None
+    while True:
+        batch = list((qs.filter(pk__gt=last_pk) if last_pk is not None else qs)[:batch_size])
+        if not batch:
+            return updated
+        for row in batch:
+            row.geohash = geohash_for(row)
+        model.objects.bulk_update(batch, ["geohash"])
+        updated += len(batch)
+        last_pk = batch[-1].pk
+
+
+# ----------------- Distances -----------------
+def haversine_many(lat: float, lon: float, lats: Sequence, lons: Sequence) -> List[float]:
+    """Distances in metres from (lat, lon) to every point, vectorised with NumPy if installed."""
+    if np is None:
+        return [haversine_m(lat, lon, float(a), float(b)) for a, b in zip(lats, lons)]
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    lon2 = np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return (2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+
+
+def radius_bbox(lat: float, lon: float, radius_m: float) -> BBox:
+    """Smallest lat/lon box containing the circle (clamped at the poles)."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = math.cos(math.radians(lat))
+    if lat + dlat >= 90 or lat - dlat <= -90 or cos_lat < 1e-9:
+        return (-180.0, max(lat - dlat, -90.0), 180.0, min(lat + dlat, 90.0))
+    dlon = min(math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)), 180.0)
+    return (max(lon - dlon, -180.0), lat - dlat, min(lon + dlon, 180.0), lat + dlat)
+
+
+# ----------------- Queries -----------------
+# These work on any queryset of a model with latitude, longitude and
+# geohash fields (LeasedPropertyProfile, GeoTaggedImage). Rows whose
+# geohash hasn't been filled yet (see backfill_geohashes) are not found.
+def in_bbox(qs, bbox: BBox):
+    """Rows inside `bbox`: pruned by geohash index ranges, then by exact lat/lon."""
+    west, south, east, north = bbox
+    cover = Q()
+    for low, high in cover_ranges(bbox):
+        cover |= Q(geohash__gte=low, geohash__lt=high)
+    return qs.filter(cover).filter(
+        latitude__gte=south, latitude__lte=north,
+        longitude__gte=west, longitude__lte=east,
+    )
+
+
+def _distances(qs, lat: float, lon: float, radius_m: float) -> List[Tuple[float, int]]:
+    candidates = list(in_bbox(qs, radius_bbox(lat, lon, radius_m)).values_list(
+        "pk", "latitude", "longitude"
+    ))
+    if not candidates:
+        return []
+    pks, lats, lons = zip(*candidates)
+    return sorted(
+        (d, pk) for d, pk in zip(haversine_many(lat, lon, lats, lons), pks) if d <= radius_m
+    )
+
+
+def _with_distances(qs, matches: List[Tuple[float, int]]) -> List:
+    rows = qs.in_bulk([pk for _, pk in matches])
+    result = []
+    for distance, pk in matches:
+        row = rows[pk]
+        row.distance_m = distance
+        result.append(row)
+    return result
+
+
+def within_radius(qs, lat: float, lon: float, radius_m: float,
+                  limit: Optional[int] = None) -> List:
+    """
+    Rows within `radius_m` metres of (lat, lon), nearest first (the first
+    `limit` of them if given), each with distance_m set.
+    """
+    return _with_distances(qs, _distances(qs, float(lat), float(lon), radius_m)[:limit])
+
+
+def nearest(qs, lat: float, lon: float, k: int = 10,
+            max_radius_m: float = math.pi * EARTH_RADIUS_M) -> List:
+    """
+    The `k` rows nearest to (lat, lon), nearest first, each with
+    distance_m set. Searches a circle that doubles until it holds k rows;
+    every row inside a searched circle has been seen, so the result is exact.
+    """
+    lat, lon = float(lat), float(lon)
+    width, _ = cell_degrees(GEOHASH_PRECISION - 2)
+    radius = width * 111_320
+    while True:
+        matches = _distances(qs, lat, lon, radius)
+        if len(matches) >= k or radius >= max_radius_m:
+            return _with_distances(qs, matches[:k])
+        radius = min(radius * 2, max_radius_m)
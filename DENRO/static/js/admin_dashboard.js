@@ -74,5 +74,79 @@ document.addEventListener("DOMContentLoaded", function() {
         notifDropdown.style.display = "none";
       }
     });
+    pollNotifications(notifBtn, notifDropdown);
   }
 });
+
+// Long-poll /api/notifications/ and keep the bell up to date without a reload.
+// The first request only learns the newest id; later ones ask for anything
+// newer and get an empty 304 while nothing has changed.
+function pollNotifications(notifBtn, notifDropdown) {
+  let lastId = null;
+  let etag = null;
+  const list = notifDropdown.querySelector("ul");
+  const csrf = document.querySelector("[name=csrfmiddlewaretoken]");
+
+  function setBadge(count) {
+    let badge = notifBtn.querySelector(".badge");
+    if (count > 0) {
+      if (!badge) {
+        badge = document.createElement("span");
+        badge.className = "badge";
+        notifBtn.appendChild(badge);
+      }
+      badge.textContent = count;
+    } else if (badge) {
+      badge.remove();
+    }
+  }
+
+  function addItem(note) {
+    if (!list || note.read) return;
+    const empty = Array.from(list.children).find(li => !li.querySelector("form"));
+    if (empty) empty.remove();
+    const li = document.createElement("li");
+    li.appendChild(document.createTextNode(note.message));
+    li.appendChild(document.createElement("br"));
+    const time = document.createElement("small");
+    time.textContent = new Date(note.created_at).toLocaleString();
+    li.appendChild(time);
+    if (csrf) {
+      const form = document.createElement("form");
+      form.method = "post";
+      form.action = `/notification/${note.id}/read/`;
+      form.innerHTML = `<input type="hidden" name="csrfmiddlewaretoken" value="${csrf.value}">` +
+        '<button type="submit" class="mark-btn">Mark as read</button>';
+      li.appendChild(form);
+    }
+    list.insertBefore(li, list.firstChild);
+  }
+
+  function poll() {
+    const params = lastId === null ? "" : `?since=${lastId}&wait=25`;
+    let retryAfter = 0;
+    fetch(`/api/notifications/${params}`, {
+      headers: etag ? { "If-None-Match": etag } : {},
+      credentials: "same-origin",
+    })
+      .then(response => {
+        // Set when the server can't long-poll: ask again after a pause
+        retryAfter = Number(response.headers.get("Retry-After")) || 0;
+        if (response.status === 304) return null;
+        if (!response.ok) throw new Error(response.status);
+        etag = response.headers.get("ETag");
+        return response.json();
+      })
+      .then(data => {
+        if (data) {
+          if (lastId !== null) data.notifications.forEach(addItem);
+          lastId = data.last_id || 0;
+          setBadge(data.unread_count);
+        }
+        setTimeout(poll, retryAfter * 1000);
+      })
+      .catch(() => setTimeout(poll, 30000));
+  }
+
+  poll();
+}
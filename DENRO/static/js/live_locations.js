@@ -0,0 +1,39 @@
+// Keep a Leaflet map's user markers in sync with /api/locations/stream/.
+// `markers` maps user id -> L.marker for the markers already on the map;
+// users seen for the first time get a new marker, or are passed to
+// `onUnknown` if given (e.g. to reload clustered markers). `roles`
+// (optional, e.g. "CENRO") narrows the stream. EventSource reconnects on
+// its own when the server ends a stream.
+function followLocations(map, markers, roles, onUnknown) {
+  if (!window.EventSource) return null;
+  let url = "/api/locations/stream/";
+  if (roles) url += "?roles=" + encodeURIComponent(roles);
+
+  function popup(loc) {
+    const div = document.createElement("div");
+    const name = document.createElement("b");
+    name.textContent = loc.username;
+    div.appendChild(name);
+    div.appendChild(document.createElement("br"));
+    div.appendChild(document.createTextNode("Role: " + loc.role));
+    div.appendChild(document.createElement("br"));
+    div.appendChild(document.createTextNode("Last Update: " + new Date(loc.last_update).toLocaleString()));
+    return div;
+  }
+
+  const source = new EventSource(url);
+  source.addEventListener("location", function (e) {
+    const loc = JSON.parse(e.data);
+    let marker = markers[loc.id];
+    if (marker) {
+      marker.setLatLng([loc.lat, loc.lon]);
+    } else if (onUnknown) {
+      onUnknown(loc);
+      return;
+    } else {
+      marker = markers[loc.id] = L.marker([loc.lat, loc.lon]).addTo(map);
+    }
+    marker.bindPopup(popup(loc));
+  });
+  return source;
+}
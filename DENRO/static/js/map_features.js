@@ -0,0 +1,88 @@
+// Load map markers from /api/map/features/ for the visible area only, and
+// reload them whenever the map is panned or zoomed. The server clusters
+// points per zoom level; a cluster is drawn as a count bubble that zooms
+// in when clicked. Returns {markers, refresh}: `markers` maps staff user
+// id -> marker for staff shown individually (for followLocations()).
+function showMapFeatures(map, layers, roles) {
+  const group = L.layerGroup().addTo(map);
+  const markers = {};
+  let controller = null;
+  let timer = null;
+
+  function text(parent, value) {
+    parent.appendChild(document.createTextNode(value));
+    parent.appendChild(document.createElement("br"));
+  }
+
+  function popup(p) {
+    const div = document.createElement("div");
+    const title = document.createElement("b");
+    div.appendChild(title);
+    div.appendChild(document.createElement("br"));
+    if (p.layer === "staff") {
+      title.textContent = p.username;
+      text(div, "Role: " + p.role);
+      text(div, "Last Update: " + new Date(p.last_update).toLocaleString());
+    } else if (p.layer === "reports") {
+      title.textContent = p.name;
+      if (p.location) text(div, p.location);
+      text(div, "Report date: " + p.report_date);
+    } else {
+      title.textContent = p.location;
+      text(div, "Captured: " + new Date(p.captured_at).toLocaleString());
+    }
+    return div;
+  }
+
+  function clusterIcon(count) {
+    const size = count < 10 ? 30 : count < 100 ? 36 : 44;
+    return L.divIcon({
+      className: "map-cluster",
+      html: `<div style="width:${size}px;height:${size}px;line-height:${size}px;border-radius:50%;` +
+        `background:rgba(32,201,151,0.8);color:#fff;text-align:center;font-weight:bold;">${count}</div>`,
+      iconSize: [size, size]
+    });
+  }
+
+  function draw(data) {
+    group.clearLayers();
+    Object.keys(markers).forEach(id => delete markers[id]);
+    data.features.forEach(function (f) {
+      const [lon, lat] = f.geometry.coordinates;
+      const p = f.properties;
+      if (p.cluster) {
+        L.marker([lat, lon], {icon: clusterIcon(p.count)}).addTo(group).on("click", function () {
+          map.setView([lat, lon], Math.min(map.getZoom() + 2, map.getMaxZoom()));
+        });
+        return;
+      }
+      const marker = L.marker([lat, lon]).addTo(group).bindPopup(popup(p));
+      if (p.layer === "staff") markers[p.id] = marker;
+    });
+  }
+
+  function refresh() {
+    if (controller) controller.abort();
+    controller = new AbortController();
+    const params = new URLSearchParams({
+      layers: layers,
+      bbox: map.getBounds().toBBoxString(),
+      zoom: map.getZoom()
+    });
+    if (roles) params.set("roles", roles);
+    fetch("/api/map/features/?" + params, {signal: controller.signal, credentials: "same-origin"})
+      .then(response => response.ok ? response.json() : null)
+      .then(data => { if (data) draw(data); })
+      .catch(function () {});
+  }
+
+  // Coalesce bursts (live updates, quick pans) into one request
+  function scheduleRefresh() {
+    clearTimeout(timer);
+    timer = setTimeout(refresh, 300);
+  }
+
+  map.on("moveend", scheduleRefresh);
+  refresh();
+  return {markers: markers, refresh: scheduleRefresh};
+}
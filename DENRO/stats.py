@@ -0,0 +1,184 @@
+# DENRO/stats.py
+from __future__ import annotations
+
+from typing import Dict, Optional, Set
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import EnumeratorsReport, StatCounter, User
+
+DASHBOARD_STATS_KEY = "dashboard_stats"
+
+STATS_DEFAULTS = {
+    "CACHE_TTL": 30,  # seconds
+    "USE_COUNTERS": False,
+}
+
+# Each dashboard number is a plain equality filter, so the same definition
+# drives both the SQL aggregate and the in-Python counter updates.
+USER_BUCKETS = {
+    "admins": {"role": "ADMIN", "is_approved": True, "is_deactivated": False},
+    "penros": {"role": "PENRO", "is_approved": True, "is_deactivated": False},
+    "cenros": {"role": "CENRO", "is_approved": True, "is_deactivated": False},
+    "evaluators": {"role": "EVALUATOR", "is_approved": True, "is_deactivated": False},
+    "approved_users": {"is_approved": True, "is_deactivated": False},
+    "pending_users": {"is_approved": False, "is_rejected": False, "is_deactivated": False},
+    "rejected_users": {"is_rejected": True},
+    "deactivated_users": {"is_deactivated": True},
+}
+
+REPORT_BUCKETS = {
+    "pending_reports": {"status": "PENDING"},
+    "accepted_reports": {"status": "ACCEPTED"},
+    "declined_reports": {"status": "DECLINED"},
+}
+
+BUCKETS_BY_MODEL = {
+    User: USER_BUCKETS,
+    EnumeratorsReport: REPORT_BUCKETS,
+}
+
+
+def get_stats_settings() -> Dict:
+    return {**STATS_DEFAULTS, **getattr(settings, "DASHBOARD_STATS", {})}
+
+
+def bucket_fields(model) -> Set[str]:
+    """Model fields that decide which dashboard numbers a row counts towards."""
+    return {field for lookups in BUCKETS_BY_MODEL[model].values() for field in lookups}
+
+
+def _aggregate(model) -> Dict[str, int]:
+    buckets = BUCKETS_BY_MODEL[model]
+    return model.objects.aggregate(
+        **{name: Count("pk", filter=Q(**lookups)) for name, lookups in buckets.items()}
+    )
+
+
+def compute_dashboard_stats() -> Dict[str, int]:
+    """Recompute every dashboard number: one aggregate query per table."""
+    stats = {}
+    for model in BUCKETS_BY_MODEL:
+        stats.update(_aggregate(model))
+    return stats
+
+
+def get_dashboard_stats() -> Dict[str, int]:
+    """
+    Dashboard numbers for the admin/PENRO/CENRO/evaluator dashboards.
+    Served from StatCounter rows if counters are enabled, otherwise from a
+    short-lived cache entry that the model signals invalidate.
+    """
+    config = get_stats_settings()
+    if config["USE_COUNTERS"]:
+        counters = dict(StatCounter.objects.values_list("name", "value"))
+        names = [name for buckets in BUCKETS_BY_MODEL.values() for name in buckets]
+        if all(name in counters for name in names):
+            return {name: counters[name] for name in names}
+        return reconcile_counters()[0]
+
+    stats = cache.get(DASHBOARD_STATS_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_STATS_KEY, stats, config["CACHE_TTL"])
+    return stats
+
+
+def invalidate_dashboard_stats():
+    # Drop the cached numbers once the current transaction commits, so a
+    # concurrent request can't re-cache the pre-commit state.
+    transaction.on_commit(lambda: cache.delete(DASHBOARD_STATS_KEY))
+
+
+# ----------------- Exact counters -----------------
+def buckets_for(instance) -> Optional[Set[str]]:
+    """
+    Names of the dashboard numbers this row counts towards, or None if a
+    deciding field was not loaded (deferred) and membership is unknown.
+    """
+    buckets = BUCKETS_BY_MODEL[type(instance)]
+    values = instance.__dict__
+    if any(field not in values for field in bucket_fields(type(instance))):
+        return None
+    return {
+        name for name, lookups in buckets.items()
+        if all(values[field] == value for field, value in lookups.items())
+    }
+
+
+def apply_counter_delta(old: Set[str], new: Set[str]):
+    """Move one row from the `old` buckets to the `new` buckets."""
+    with transaction.atomic():
+        for name in new - old:
+            _bump(name, 1)
+        for name in old - new:
+            _bump(name, -1)
+
+
+def _bump(name: str, delta: int):
+    # A missing row means the counters were never initialised; the next
+    # read reconciles them.
+    StatCounter.objects.filter(name=name).update(value=F("value") + delta)
+
+
+def count_saved_row(instance, created: bool):
+    """
+    Update the counters after `instance` was saved. A new row is added to
+    its buckets when that happens in the insert's own transaction. A
+    changed row is recounted from the database instead: what it counted
+    towards before can't be known from memory, since another request may
+    have changed it since it was loaded.
+    """
+    new = buckets_for(instance) if created else None
+    if new is not None and transaction.get_connection().in_atomic_block:
+        apply_counter_delta(set(), new)
+    else:
+        rebuild_counters(type(instance))
+
+
+def rebuild_counters(model):
+    """
+    Recount `model`'s dashboard numbers from the database. Also for code
+    that changes rows with update() or bulk_create(), which send no
+    signals. The counter rows are locked before counting, so of concurrent
+    rebuilds the last one sees every committed change.
+    """
+    names = list(BUCKETS_BY_MODEL[model])
+    with transaction.atomic():
+        locked = StatCounter.objects.select_for_update().filter(name__in=names).values_list("name", flat=True)
+        if len(set(locked)) < len(names):
+            # Never initialised; the next read reconciles them
+            return
+        stats = _aggregate(model)
+        StatCounter.objects.bulk_update(
+            [StatCounter(name=name, value=stats[name]) for name in names], ["value"]
+        )
+
+
+def reconcile_counters(dry_run: bool = False):
+    """
+    Recompute the counters from scratch and overwrite the StatCounter rows.
+    Returns (stats, drift) where drift maps name -> (stored, actual) for
+    every counter that was missing or wrong.
+    """
+    with transaction.atomic():
+        stats = compute_dashboard_stats()
+        stored = dict(StatCounter.objects.select_for_update().values_list("name", "value"))
+        drift = {
+            name: (stored.get(name), value)
+            for name, value in stats.items()
+            if stored.get(name) != value
+        }
+        if drift and not dry_run:
+            StatCounter.objects.bulk_create(
+                [StatCounter(name=name, value=stats[name]) for name in drift],
+                update_conflicts=True,
+                unique_fields=["name"],
+                update_fields=["value"],
+            )
+    if drift and not dry_run:
+        invalidate_dashboard_stats()
+    return stats, drift
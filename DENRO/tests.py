@@ -1,2 +1,741 @@
+import hashlib
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from .archive import archive_logs, archived_page
+from .boundaries import (
+    UNCLASSIFIED, BoundaryIndex, Classification, Shape, classification_fields,
+)
+from .duplicates import flag_duplicates, similar_photos
+from .geofence import STATE_KEY, check_geofences
+from .notifications import (
+    broadcast, mark_all_read, mark_read, notifications_for, notify_users, unread_count,
+)
+from .logquery import LOG_SCOPES, filter_logs
+from .locations import LOCATION_ACTION, get_user_locations, record_location, record_locations
+from .models import (
+    ActivityLog, ActivityLogRollup, EnumeratorsReport, GeoTaggedImage, LastKnownLocation, LocationPing,
+    Notification, SiteAssignment, UploadSession, User,
+)
+from .pagination import LAST_PAGE, CursorPaginator
+from .rollups import ONE_DAY, activity_metrics, day_start, raw_activity_metrics, rolled_up_through, rollup_days
+from .uploads import UploadError, finalize_upload, part_path, write_chunk
+
+FILTER = {
+    "ENABLED": True,
+    "MIN_DISTANCE_M": 25,
+    "MIN_INTERVAL_S": 30,
+    "STATIONARY_INTERVAL_S": 600,
+    "MAX_ACCURACY_M": 200,
+}
+
+REPORT = {
+    "report_date": "2026-10-01",
+    "protected_area": "Mt. Test Natural Park",
+    "proponent_name": "Juan dela Cruz",
+    "latitude": "14.5",
+    "longitude": "121.0",
+}
+
+
+def jpeg_bytes(color=(40, 120, 200), size=(64, 48)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, "JPEG")
+    return out.getvalue()
+
+
+class MediaTestCase(TestCase):
+    """Keeps stored photos and upload part files in a throwaway directory."""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        media = override_settings(
+            MEDIA_ROOT=f"{root}/media",
+            UPLOADS={"DIR": f"{root}/partial"},
+            IMAGES={"ASYNC": False},
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+def token_client(user):
+    token = Token.objects.create(user=user)
+    return Client(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+
+# ----------------- Locations -----------------
+class LastKnownLocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("enumerator", password="pw", role="CENRO", is_approved=True)
+        self.now = timezone.now().replace(microsecond=0)
+
+    def test_each_write_keeps_last_location_current(self):
+        record_location(self.user, 14.5, 121.0, captured_at=self.now - timedelta(minutes=20))
+        record_location(self.user, 14.6, 121.1, captured_at=self.now)
+
+        location = LastKnownLocation.objects.get(user=self.user)
+        self.assertEqual((float(location.latitude), float(location.longitude)), (14.6, 121.1))
+        self.assertEqual(location.updated_at, self.now)
+
+    def test_user_locations_are_read_in_one_query(self):
+        for i in range(3):
+            user = User.objects.create_user(f"field{i}", password="pw", role="CENRO", is_approved=True)
+            record_location(user, 14.5 + i, 121.0, captured_at=self.now)
+
+        with self.assertNumQueries(1):
+            locations = get_user_locations(User.objects.filter(role="CENRO"))
+
+        self.assertEqual([loc["username"] for loc in locations], ["field0", "field1", "field2"])
+        self.assertEqual(locations[2]["lat"], 16.5)
+
+    def test_backfill_takes_the_newest_ping_or_legacy_log(self):
+        legacy = User.objects.create_user("legacy", password="pw", role="CENRO", is_approved=True)
+        LocationPing.objects.create(user=self.user, latitude=14.5, longitude=121.0, captured_at=self.now)
+        ActivityLog.objects.create(
+            user=self.user, action=LOCATION_ACTION, details="Location updated: 10.0, 120.0",
+            created_at=self.now - timedelta(days=1),
+        )
+        ActivityLog.objects.create(
+            user=legacy, action=LOCATION_ACTION, details="Location updated: 10.0, 120.0", created_at=self.now,
+        )
+
+        call_command("backfill_last_locations", stdout=io.StringIO())
+
+        locations = {loc.user_id: loc for loc in LastKnownLocation.objects.all()}
+        self.assertEqual(float(locations[self.user.pk].latitude), 14.5)
+        self.assertEqual(float(locations[legacy.pk].latitude), 10.0)
+
+
+class LocationPingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("enumerator", password="pw", role="CENRO", is_approved=True)
+        self.client.force_login(self.user)
+
+    def post(self, body):
+        return self.client.post("/api/update-location/", json.dumps(body), content_type="application/json")
+
+    def test_fix_is_stored_as_a_ping(self):
+        response = self.post({"latitude": "14.5", "longitude": "121.0", "accuracy": "12"})
+
+        self.assertEqual(response.status_code, 200)
+        ping = LocationPing.objects.get(user=self.user)
+        self.assertEqual((float(ping.latitude), float(ping.longitude), ping.accuracy), (14.5, 121.0, 12.0))
+        self.assertFalse(ActivityLog.objects.filter(action=LOCATION_ACTION).exists())
+
+    def test_non_object_body_is_rejected(self):
+        for body in ([14.5, 121.0], "14.5,121.0", None):
+            self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(LocationPing.objects.exists())
+
+
+@override_settings(LOCATION_FILTER=FILTER)
+class LocationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("enumerator", password="pw", role="CENRO", is_approved=True)
+        self.now = timezone.now().replace(microsecond=0)
+
+    def fix(self, minutes_ago, lat=14.5, lon=121.0):
+        return {"latitude": lat, "longitude": lon, "timestamp": (self.now - timedelta(minutes=minutes_ago)).isoformat()}
+
+
+class LocationBatchTests(LocationTestCase):
+    def test_replayed_buffer_older_than_position_is_stored(self):
+        record_location(self.user, 14.6, 121.1, captured_at=self.now)
+        fixes = [self.fix(30 - i, lat=14.5 + i * 0.001) for i in range(10)]
+
+        results = record_locations(self.user, fixes)
+
+        self.assertEqual([r["status"] for r in results], ["ok"] * 10)
+        self.assertEqual(LocationPing.objects.count(), 11)
+        # The newer live position stays current
+        location = LastKnownLocation.objects.get(user=self.user)
+        self.assertEqual(location.updated_at, self.now)
+        self.assertEqual(float(location.latitude), 14.6)
+
+    def test_batch_endpoint_reports_each_fix(self):
+        client = Client()
+        client.force_login(self.user)
+        body = {"fixes": [self.fix(20), {"latitude": "north"}, self.fix(19, lat=14.5000001)]}
+
+        response = client.post("/api/update-location/batch/", json.dumps(body), content_type="application/json")
+
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((data["accepted"], data["dropped"], data["rejected"]), (1, 1, 1))
+        self.assertEqual(data["results"][1], {"index": 1, "status": "error", "message": "Invalid coordinates"})
+
+
+class LocationFilterTests(LocationTestCase):
+    def test_drops_fix_too_soon_after_previous(self):
+        record_location(self.user, 14.5, 121.0, captured_at=self.now)
+        ping = record_location(self.user, 14.51, 121.0, captured_at=self.now + timedelta(seconds=5))
+        self.assertIsNone(ping)
+        self.assertEqual(LocationPing.objects.count(), 1)
+
+    def test_drops_inaccurate_fix(self):
+        self.assertIsNone(record_location(self.user, 14.5, 121.0, accuracy=500, captured_at=self.now))
+
+    def test_stationary_user_gets_heartbeat_points(self):
+        record_location(self.user, 14.5, 121.0, captured_at=self.now)
+        self.assertIsNone(record_location(self.user, 14.5, 121.0, captured_at=self.now + timedelta(minutes=2)))
+        self.assertIsNotNone(record_location(self.user, 14.5, 121.0, captured_at=self.now + timedelta(minutes=11)))
+
+    def test_replaying_a_batch_again_drops_duplicates(self):
+        fixes = [self.fix(30 - i, lat=14.5 + i * 0.001) for i in range(5)]
+        record_locations(self.user, fixes)
+
+        results = record_locations(self.user, fixes)
+
+        self.assertEqual({r.get("reason") for r in results}, {"duplicate"})
+        self.assertEqual(LocationPing.objects.count(), 5)
+
+    def test_batch_fix_is_filtered_against_stored_neighbour(self):
+        record_locations(self.user, [self.fix(30), self.fix(20, lat=14.51)])
+
+        # 10 s after the stored 30-minutes-ago fix
+        late = self.fix(30, lat=14.6)
+        late["timestamp"] = (self.now - timedelta(minutes=30) + timedelta(seconds=10)).isoformat()
+        results = record_locations(self.user, [late, self.fix(10, lat=14.52)])
+
+        self.assertEqual(results[0], {"index": 0, "status": "dropped", "reason": "too_soon"})
+        self.assertEqual(results[1]["status"], "ok")
+
+
+
+# ----------------- Geofences -----------------
+class GeofenceTests(LocationTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.assigner = User.objects.create_user("assigner", password="pw", role="CENRO", is_approved=True)
+        self.site = SiteAssignment.objects.create(
+            user=self.user, name="Site A", latitude=14.5, longitude=121.0, radius_m=200,
+            assigned_by=self.assigner,
+        )
+
+    def test_first_fix_records_state_without_events(self):
+        self.assertEqual(check_geofences(self.user, [(14.5, 121.0)]), [])
+        self.assertEqual(cache.get(STATE_KEY.format(self.user.pk)), {f"site:{self.site.pk}"})
+
+    def test_entering_and_leaving_a_site_notifies_the_assigner(self):
+        check_geofences(self.user, [(14.6, 121.0)])
+
+        events = check_geofences(self.user, [(14.5, 121.0), (14.5005, 121.0), (14.6, 121.0)])
+
+        self.assertEqual([(event, fence.name) for event, fence in events], [("enter", "Site A"), ("exit", "Site A")])
+        self.assertEqual(Notification.objects.filter(user=self.assigner).count(), 2)
+
+    def test_other_users_sites_do_not_apply(self):
+        other = User.objects.create_user("other", password="pw", role="CENRO", is_approved=True)
+        check_geofences(other, [(14.6, 121.0)])
+        self.assertEqual(check_geofences(other, [(14.5, 121.0)]), [])
+
+    def test_replayed_fixes_older_than_the_position_are_not_evaluated(self):
+        record_location(self.user, 14.5, 121.0, captured_at=self.now)
+
+        # A replayed buffer from outside the site, plus the next live fix
+        record_locations(self.user, [self.fix(30, lat=14.6), self.fix(20, lat=14.7), self.fix(-1, lat=14.5005)])
+
+        self.assertEqual(cache.get(STATE_KEY.format(self.user.pk)), {f"site:{self.site.pk}"})
+        self.assertFalse(Notification.objects.exists())
+
+
+
+
+# ----------------- Protected-area boundaries -----------------
+def square(x0, y0, x1, y1):
+    return [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+
+
+class BoundaryClassificationTests(SimpleTestCase):
+    def setUp(self):
+        # Area 1 is 121.0-121.1 x 14.0-14.1 with a hole in its south-west
+        # corner; its zone 10 covers the north-east quarter
+        self.index = BoundaryIndex([
+            Shape("area", 1, 1, "Park", (121.0, 14.0, 121.1, 14.1),
+                  [[square(121.0, 14.0, 121.1, 14.1), square(121.01, 14.01, 121.03, 14.03)]]),
+            Shape("zone", 10, 1, "Strict", (121.05, 14.05, 121.1, 14.1),
+                  [[square(121.05, 14.05, 121.1, 14.1)]]),
+        ], cell=0.02)
+
+    def test_points_are_classified_into_zone_then_area(self):
+        lats, lons = [14.07, 14.04, 14.02, 14.2], [121.07, 121.04, 121.02, 121.07]
+
+        self.assertEqual(self.index.classify_many(lats, lons), [
+            Classification(1, 10, "Strict"),
+            Classification(1, None, None),
+            UNCLASSIFIED,  # in the hole
+            UNCLASSIFIED,
+        ])
+
+    def test_batch_matches_single_point_classification(self):
+        lats = [13.995 + i * 0.00713 for i in range(17)]
+        lons = [120.995 + j * 0.00677 for j in range(17)]
+        points = [(lat, lon) for lat in lats for lon in lons]
+
+        self.assertEqual(
+            self.index.classify_many([p[0] for p in points], [p[1] for p in points]),
+            [self.index.classify(lat, lon) for lat, lon in points],
+        )
+
+    def test_zone_name_from_an_earlier_classification_is_not_kept(self):
+        self.assertEqual(classification_fields(UNCLASSIFIED, "Strict", 10)["pa_management_zone"], None)
+        self.assertEqual(classification_fields(UNCLASSIFIED, "Typed by hand")["pa_management_zone"], "Typed by hand")
+
+
+# ----------------- Notifications -----------------
+class MarkAllReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user("cenro", password="pw", role="CENRO", is_approved=True)
+        self.user.date_joined = timezone.now() - timedelta(days=1)
+        self.user.save(update_fields=["date_joined"])
+
+    def test_counts_only_newly_read_notifications(self):
+        direct = notify_users([self.user], "direct") + notify_users([self.user], "read already")
+        mark_read(self.user, direct[1])
+        shared = broadcast(["CENRO"], "one") + broadcast(["CENRO"], "two")
+        mark_read(self.user, shared[0])
+        broadcast(["PENRO"], "not visible")
+
+        self.assertEqual(unread_count(self.user), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_all_read(self.user, shared[-1].pk), 2)
+        self.assertEqual(unread_count(self.user), 0)
+        self.assertEqual(mark_all_read(self.user, shared[-1].pk), 0)
+
+    def test_newer_notifications_stay_unread(self):
+        first = broadcast(["CENRO"], "seen")[0]
+        notify_users([self.user], "after the cut-off")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_all_read(self.user, first.pk), 1)
+        self.assertEqual(unread_count(self.user), 1)
+
+
+
+class BroadcastTests(TestCase):
+    def test_only_approved_active_accounts_see_role_broadcasts(self):
+        joined = timezone.now() - timedelta(days=1)
+        users = {
+            name: User.objects.create_user(name, password="pw", role="CENRO", date_joined=joined, **flags)
+            for name, flags in [
+                ("approved", {"is_approved": True}),
+                ("pending", {}),
+                ("deactivated", {"is_approved": True, "is_deactivated": True}),
+            ]
+        }
+
+        broadcast(["CENRO"], "New report")
+
+        seen = {name: notifications_for(user).exists() for name, user in users.items()}
+        self.assertEqual(seen, {"approved": True, "pending": False, "deactivated": False})
+
+
+# ----------------- Pagination -----------------
+class CursorPaginatorTests(TestCase):
+    def setUp(self):
+        start = timezone.now() - timedelta(days=1)
+        # Pairs share a timestamp, so ties are broken by id
+        ActivityLog.objects.bulk_create([
+            ActivityLog(action="LOGIN", details=str(i), created_at=start + timedelta(minutes=i // 2))
+            for i in range(23)
+        ])
+        self.newest_first = list(ActivityLog.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.paginator = CursorPaginator(ActivityLog.objects.all(), per_page=5)
+
+    def ids(self, page):
+        return [row.pk for row in page]
+
+    def test_pages_forward_cover_every_row_once(self):
+        seen, page = [], self.paginator.get_page()
+        self.assertFalse(page.has_previous)
+        while True:
+            seen += self.ids(page)
+            if not page.has_next:
+                break
+            page = self.paginator.get_page(page.next_cursor)
+        self.assertEqual(seen, self.newest_first)
+
+    def test_previous_cursor_returns_the_page_before(self):
+        first = self.paginator.get_page()
+        second = self.paginator.get_page(first.next_cursor)
+        third = self.paginator.get_page(second.next_cursor)
+
+        back = self.paginator.get_page(third.previous_cursor)
+
+        self.assertEqual(self.ids(back), self.ids(second))
+        self.assertTrue(back.has_next)
+        self.assertTrue(back.has_previous)
+
+    def test_last_page_holds_the_oldest_rows(self):
+        page = self.paginator.get_page(LAST_PAGE)
+        self.assertEqual(self.ids(page), self.newest_first[-5:])
+        self.assertFalse(page.has_next)
+        self.assertTrue(page.has_previous)
+
+    def test_invalid_cursor_gives_first_page(self):
+        self.assertEqual(self.ids(self.paginator.get_page("not-a-cursor")), self.newest_first[:5])
+
+
+# ----------------- Report submission -----------------
+class ReportFormTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("cenro", password="pw", role="CENRO", is_approved=True)
+        self.client.force_login(self.user)
+
+    def post(self, photo, **extra):
+        data = dict(REPORT, photos=[SimpleUploadedFile("site.jpg", photo, "image/jpeg")], **extra)
+        return self.client.post("/cenro/submit-report/", data)
+
+    def test_retried_form_post_stores_one_report(self):
+        self.post(jpeg_bytes(), idempotency_key="form-1")
+        self.post(jpeg_bytes(), idempotency_key="form-1")
+
+        self.assertEqual(EnumeratorsReport.objects.count(), 1)
+        self.assertEqual(GeoTaggedImage.objects.count(), 1)
+
+    def test_keys_are_scoped_to_the_enumerator(self):
+        self.post(jpeg_bytes(), idempotency_key="shared")
+        other = User.objects.create_user("other", password="pw", role="CENRO", is_approved=True)
+        self.client.force_login(other)
+        self.post(jpeg_bytes(), idempotency_key="shared")
+
+        self.assertEqual(
+            sorted(EnumeratorsReport.objects.values_list("enumerator__username", flat=True)), ["cenro", "other"]
+        )
+
+
+class ReportSubmissionTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("cenro", password="pw", role="CENRO", is_approved=True)
+        self.client = token_client(self.user)
+
+    def submit(self, *reports):
+        response = self.client.post(
+            "/api/reports/batch/", json.dumps({"reports": list(reports)}), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_resubmitting_a_key_returns_the_original_report(self):
+        first = self.submit(dict(REPORT, idempotency_key="device-1"))
+        again = self.submit(dict(REPORT, idempotency_key="device-1"))
+
+        self.assertEqual(first[0]["status"], "created")
+        self.assertEqual(again[0], {"status": "duplicate", "id": first[0]["id"]})
+        self.assertEqual(EnumeratorsReport.objects.count(), 1)
+
+    def test_repeated_key_within_a_batch_stores_one_report(self):
+        results = self.submit(dict(REPORT, idempotency_key="k"), dict(REPORT, idempotency_key="k"))
+
+        self.assertEqual([r["status"] for r in results], ["created", "duplicate"])
+        self.assertEqual(results[0]["id"], results[1]["id"])
+        self.assertEqual(EnumeratorsReport.objects.count(), 1)
+
+    def test_invalid_report_does_not_block_the_others(self):
+        results = self.submit(dict(REPORT, report_date="yesterday"), dict(REPORT, idempotency_key="ok"))
+
+        self.assertEqual(results[0]["status"], "error")
+        self.assertEqual(results[1]["status"], "created")
+
+    def test_photos_must_be_the_users_uploads(self):
+        other = User.objects.create_user("other", password="pw", role="CENRO", is_approved=True)
+        foreign = GeoTaggedImage.objects.create(
+            image="images/aa/foreign.jpg", qr_code="foreign", latitude=14.5, longitude=121.0,
+            location="", captured_by=other,
+        )
+
+        results = self.submit(
+            dict(REPORT, photos=["../../CAPSTONE_DENRO/settings.py"]),
+            dict(REPORT, photos=[foreign.pk]),
+        )
+
+        self.assertEqual([r["status"] for r in results], ["error", "error"])
+        self.assertEqual(EnumeratorsReport.objects.count(), 0)
+        self.assertEqual(GeoTaggedImage.objects.count(), 1)
+
+
+# ----------------- Chunked uploads -----------------
+class ChunkedUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("evaluator", password="pw", role="EVALUATOR", is_approved=True)
+        self.client = token_client(self.user)
+        self.data = jpeg_bytes()
+
+    def start(self, **extra):
+        body = {"filename": "site.jpg", "size": len(self.data), "latitude": "14.5", "longitude": "121.0", **extra}
+        response = self.client.post("/api/uploads/", json.dumps(body), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()["url"]
+
+    def put(self, url, start, end):
+        return self.client.put(
+            url, self.data[start:end], content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end - 1}/{len(self.data)}",
+        )
+
+    def test_upload_resumes_from_stored_offset(self):
+        url = self.start(sha256=hashlib.sha256(self.data).hexdigest())
+        half = len(self.data) // 2
+        self.assertEqual(self.put(url, 0, half).json()["offset"], half)
+
+        # A replayed chunk is refused with the offset to resume from
+        replay = self.put(url, 0, half)
+        self.assertEqual(replay.status_code, 409)
+        self.assertEqual(replay.json()["offset"], half)
+        self.assertEqual(self.client.get(url).json()["offset"], half)
+
+        self.assertTrue(self.put(url, half, len(self.data)).json()["complete"])
+        finalized = self.client.post(url + "finalize/")
+        self.assertEqual(finalized.status_code, 200)
+
+        image = GeoTaggedImage.objects.get(pk=finalized.json()["image_id"])
+        self.assertEqual(image.sha256, hashlib.sha256(self.data).hexdigest())
+        # Finalizing again returns the same image
+        self.assertEqual(self.client.post(url + "finalize/").json()["image_id"], image.pk)
+
+    def test_checksum_mismatch_restarts_the_upload(self):
+        url = self.start(sha256="0" * 64)
+        self.put(url, 0, len(self.data))
+
+        response = self.client.post(url + "finalize/")
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["offset"], 0)
+        self.assertFalse(GeoTaggedImage.objects.exists())
+
+    def test_finalizing_incomplete_upload_is_refused(self):
+        url = self.start()
+        self.put(url, 0, 10)
+        response = self.client.post(url + "finalize/")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 10)
+
+    def test_losing_concurrent_write_leaves_the_file_alone(self):
+        session_id = self.start().rstrip("/").rsplit("/", 1)[1]
+        winner = UploadSession.objects.get(pk=session_id)
+        loser = UploadSession.objects.get(pk=session_id)  # loaded before the winner wrote
+
+        write_chunk(winner, io.BytesIO(self.data[:10]), 0, 10)
+        with self.assertRaises(UploadError) as raised:
+            write_chunk(loser, io.BytesIO(b"x" * 10), 0, 10)
+
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(part_path(winner).read_bytes(), self.data[:10])
+
+    def test_concurrent_finalize_returns_the_first_image(self):
+        session_id = self.start().rstrip("/").rsplit("/", 1)[1]
+        write_chunk(UploadSession.objects.get(pk=session_id), io.BytesIO(self.data), 0, len(self.data))
+        winner = UploadSession.objects.get(pk=session_id)
+        loser = UploadSession.objects.get(pk=session_id)  # loaded before the winner finished
+
+        image = finalize_upload(winner)
+
+        self.assertEqual(finalize_upload(loser).pk, image.pk)
+        self.assertEqual(GeoTaggedImage.objects.count(), 1)
+
+    def test_non_numeric_content_length_is_refused(self):
+        url = self.start()
+        response = self.client.put(
+            url, self.data[:10], content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes 0-9/{len(self.data)}", CONTENT_LENGTH="ten",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+# ----------------- Duplicate photos -----------------
+class DuplicatePhotoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user("cenro", password="pw", role="CENRO", is_approved=True)
+        # b is 3 bits from a; c is nothing like either
+        self.a, self.b, self.c, self.blank = [
+            GeoTaggedImage.objects.create(
+                image=f"images/{name}.jpg", qr_code=name, latitude=14.5, longitude=121.0, location="",
+                captured_by=self.user, dhash=value, hashed_at=timezone.now(),
+            )
+            for name, value in [("a", "0" * 16), ("b", "0" * 15 + "7"), ("c", "f" * 16), ("blank", "")]
+        ]
+        self.api = token_client(self.user)
+
+    def report(self, image):
+        result = self.api.post(
+            "/api/reports/batch/", json.dumps({"reports": [REPORT]}), content_type="application/json"
+        ).json()["results"][0]
+        EnumeratorsReport.objects.filter(pk=result["id"]).update(geo_tag_image=image)
+        return result["id"]
+
+    def test_similar_photos_are_found_within_the_distance(self):
+        self.assertEqual(similar_photos(self.a), [(3, self.b.pk)])
+        self.assertEqual(similar_photos(self.a, max_distance=2), [])
+        self.assertEqual(similar_photos(self.blank), [])
+
+    def test_reports_are_flagged_with_one_index_refresh(self):
+        ids = [self.report(image) for image in (self.a, self.b, self.c)]
+        reports = list(EnumeratorsReport.objects.filter(pk__in=ids).select_related("geo_tag_image").order_by("pk"))
+        similar_photos(self.a)  # load the index
+
+        # One refresh of the index, one lookup of the matching reports
+        with self.assertNumQueries(2):
+            flagged = flag_duplicates(reports)
+
+        self.assertEqual([r.similar_reports for r in flagged], [[(ids[1], 3)], [(ids[0], 3)], []])
+
+
+# ----------------- Activity log rollups -----------------
+class ActivityRollupTests(TestCase):
+    def setUp(self):
+        cenro = User.objects.create_user("cenro", password="pw", role="CENRO", is_approved=True)
+        penro = User.objects.create_user("penro", password="pw", role="PENRO", is_approved=True)
+        now = timezone.now()
+        self.today = timezone.localdate()
+        ActivityLog.objects.bulk_create([
+            ActivityLog(user=user, action=action, details="x", created_at=now - timedelta(days=days, hours=3))
+            for days in range(12)
+            for user, action in [(cenro, "LOGIN"), (cenro, "ERROR"), (penro, "LOGIN"), (None, "ERROR")][:days % 4 + 1]
+        ])
+
+    def test_rollup_covers_finished_days_and_advances_the_watermark(self):
+        rollup_days()
+
+        self.assertEqual(rolled_up_through(), self.today - ONE_DAY)
+        finished = ActivityLog.objects.filter(created_at__lt=day_start(self.today)).count()
+        self.assertEqual(sum(ActivityLogRollup.objects.values_list("count", flat=True)), finished)
+        # Nothing new to add on the next run
+        self.assertEqual(rollup_days(), 0)
+
+    @override_settings(ACTIVITY_LOG_WRITER={"ASYNC": True, "FLUSH_INTERVAL_S": 2 * 86400})
+    def test_days_other_writers_may_still_buffer_are_left_open(self):
+        rollup_days()
+        self.assertLess(rolled_up_through(), self.today - timedelta(days=2))
+
+    def test_metrics_from_rollups_match_the_raw_table(self):
+        rollup_days()
+        dfrom, dto = self.today - timedelta(days=9), self.today - timedelta(days=2)
+        logs = ActivityLog.objects.all()
+        cases = [
+            ({}, logs),
+            ({"role": "CENRO"}, logs.filter(user__role="CENRO")),
+            ({"action": "ERROR"}, logs.filter(action="ERROR")),
+            (
+                {"dfrom": dfrom.isoformat(), "dto": dto.isoformat()},
+                logs.filter(created_at__gte=day_start(dfrom), created_at__lt=day_start(dto + ONE_DAY)),
+            ),
+        ]
+        for filters, expected in cases:
+            with self.subTest(**filters):
+                metrics, breakdowns = activity_metrics(expected, **filters)
+                raw_metrics, raw_breakdowns = raw_activity_metrics(expected)
+                self.assertEqual(metrics, raw_metrics)
+                self.assertEqual(breakdowns["total_events"], raw_breakdowns["total_events"])
+                self.assertEqual(breakdowns["this_week"], raw_breakdowns["this_week"])
+
+    def test_rebuild_skips_archived_days(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        with override_settings(ACTIVITY_LOG_ARCHIVE={"DIR": root, "RETENTION_DAYS": 5}):
+            rollup_days()
+            counted = sum(ActivityLogRollup.objects.values_list("count", flat=True))
+            archive_logs()
+
+            rollup_days(first=self.today - timedelta(days=30))
+
+            self.assertEqual(sum(ActivityLogRollup.objects.values_list("count", flat=True)), counted)
+            with self.assertRaises(CommandError):
+                call_command("rollup_activity_logs", rebuild_from=(self.today - timedelta(days=30)).isoformat())
+
+
+# ----------------- Activity log archive -----------------
+class ActivityArchiveTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        archive = override_settings(ACTIVITY_LOG_ARCHIVE={"DIR": root, "RETENTION_DAYS": 5})
+        archive.enable()
+        self.addCleanup(archive.disable)
+        self.user = User.objects.create_user("cenro", password="pw", role="CENRO", is_approved=True)
+        other = User.objects.create_user("other", password="pw", role="CENRO", is_approved=True)
+        now = timezone.now()
+        ActivityLog.objects.bulk_create([
+            ActivityLog(user=user, action="LOGIN", details=f"day {days}", created_at=now - timedelta(days=days, hours=1))
+            for days in range(10)
+            for user in (self.user, other)
+        ])
+        self.cutoff = now - timedelta(days=5)
+
+    def test_archives_rolled_up_rows_past_retention(self):
+        old = set(ActivityLog.objects.filter(created_at__lt=self.cutoff).values_list("id", flat=True))
+        rollup_days()
+
+        archived, files = archive_logs(chunk_size=3)
+
+        self.assertEqual((archived, files), (len(old), 5))
+        self.assertFalse(ActivityLog.objects.filter(pk__in=old).exists())
+        self.assertEqual(ActivityLog.objects.count(), 10)
+
+    def test_rows_not_yet_rolled_up_are_kept(self):
+        self.assertEqual(archive_logs(), (0, 0))
+
+    def test_archived_page_walks_one_users_history(self):
+        expected = list(
+            ActivityLog.objects.filter(user=self.user, created_at__lt=self.cutoff)
+            .order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        rollup_days()
+        archive_logs()
+
+        seen, page = [], archived_page(self.user, per_page=2)
+        while True:
+            seen += [log.pk for log in page]
+            if not page.has_next:
+                break
+            page = archived_page(self.user, page.next_cursor, per_page=2)
+
+        self.assertEqual(seen, expected)
+
+    def test_dry_run_writes_nothing(self):
+        call_command("archive_activity_logs", dry_run=True, stdout=io.StringIO())
+
+        self.assertIsNone(rolled_up_through())
+        self.assertFalse(ActivityLogRollup.objects.exists())
+        self.assertEqual(ActivityLog.objects.count(), 20)
+
+
+# ----------------- Activity log queries -----------------
+class LogQueryPlanTests(TestCase):
+    def composite_index(self, plan):
+        names = [index.name for index in ActivityLog._meta.indexes if len(index.fields) > 1]
+        return next((name for name in names if name in plan), None)
+
+    def plan(self, filters, roles=None):
+        return filter_logs(filters, roles=roles).order_by("-created_at", "-id")[:21].explain()
+
+    def test_filtered_listings_use_a_composite_index(self):
+        week_ago = (timezone.localdate() - timedelta(days=7)).isoformat()
+        for scope, roles in LOG_SCOPES.items():
+            for filters in ({"action": "LOGIN"}, {"action": "LOGIN", "dfrom": week_ago}):
+                with self.subTest(scope=scope, **filters):
+                    self.assertIsNotNone(self.composite_index(self.plan(filters, roles)))
+
+    def test_no_listing_query_scans_the_table(self):
+        call_command("explain_log_queries", stdout=io.StringIO())
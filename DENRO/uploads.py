@@ -0,0 +1,311 @@
+# DENRO/uploads.py
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .exif import apply_exif, read_exif
+from .images import schedule_derivatives, store_image
+from .models import GeoTaggedImage, UploadSession
+
+# Defaults for settings.UPLOADS. Chunks are streamed to a spool file under
+# DIR, BLOCK_BYTES at a time, and then appended to the upload's part file,
+# so neither a chunk nor the file is ever held in memory. Unfinished
+# sessions untouched for EXPIRE_HOURS are removed by the purge_uploads
+# command.
+UPLOAD_DEFAULTS = {
+    "DIR": None,  # default: <BASE_DIR>/uploads/partial
+    "MAX_BYTES": 25 * 1024 * 1024,
+    "MAX_CHUNK_BYTES": 4 * 1024 * 1024,
+    "BLOCK_BYTES": 64 * 1024,
+    "EXPIRE_HOURS": 48,
+}
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".heic", ".webp"}
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+# Running SHA-256 of recent sessions, so finalizing doesn't have to read
+# the file back. Only a cache: after a restart, or when chunks of one
+# upload reach different workers, the file is hashed from disk instead.
+MAX_HASHERS = 256
+_hashers: "OrderedDict[str, Tuple[int, object]]" = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """A rejected upload request; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def get_upload_settings() -> Dict:
+    config = {**UPLOAD_DEFAULTS, **getattr(settings, "UPLOADS", {})}
+    if config["DIR"] is None:
+        config["DIR"] = Path(settings.BASE_DIR) / "uploads" / "partial"
+    return config
+
+
+def part_path(session: UploadSession) -> Path:
+    return Path(get_upload_settings()["DIR"]) / f"{session.pk}.part"
+
+
+def _remove_files(session: UploadSession):
+    path = part_path(session)
+    path.unlink(missing_ok=True)
+    # Spools left behind by a worker that died mid-chunk
+    for spool in path.parent.glob(f"{session.pk}.*.chunk"):
+        spool.unlink(missing_ok=True)
+
+
+def _coordinate(value, limit: int, name: str) -> Optional[Decimal]:
+    if value in (None, ""):
+        return None
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise UploadError(f"Invalid {name}")
+    if not -limit <= value <= limit:
+        raise UploadError(f"Invalid {name}")
+    return value
+
+
+# ----------------- Sessions -----------------
+def create_upload(user, filename, size, sha256=None, latitude=None, longitude=None,
+                  location="") -> UploadSession:
+    """Open an upload of `size` bytes and its empty part file."""
+    config = get_upload_settings()
+    filename = get_valid_filename(os.path.basename(str(filename or "")))
+    if os.path.splitext(filename)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise UploadError("Unsupported file type")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("size is required")
+    if not 0 < size <= config["MAX_BYTES"]:
+        raise UploadError(f"size must be between 1 and {config['MAX_BYTES']} bytes", status=413)
+    if sha256 is not None and not re.fullmatch(r"[0-9a-fA-F]{64}", str(sha256)):
+        raise UploadError("sha256 must be 64 hex digits")
+
+    session = UploadSession.objects.create(
+        user=user,
+        filename=filename,
+        size=size,
+        sha256=sha256.lower() if sha256 else None,
+        latitude=_coordinate(latitude, 90, "latitude"),
+        longitude=_coordinate(longitude, 180, "longitude"),
+        location=str(location or "")[:255],
+    )
+    path = part_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return session
+
+
+def parse_content_range(value: Optional[str], size: int) -> Tuple[int, int]:
+    """(start, end exclusive) of a "bytes <first>-<last>/<total>" header."""
+    match = CONTENT_RANGE.match(value or "")
+    if not match:
+        raise UploadError("Content-Range must be 'bytes <first>-<last>/<total>'")
+    first, last, total = (int(v) for v in match.groups())
+    if total != size or first > last or last >= size:
+        raise UploadError("Content-Range does not fit the upload", status=416)
+    return first, last + 1
+
+
+def write_chunk(session: UploadSession, stream, start: int, end: int) -> int:
+    """
+    Append bytes [start, end) read from `stream` to the part file and return
+    the new offset. `start` must be the current offset (409 otherwise, so
+    the client re-queries it). If the connection drops mid-chunk, what did
+    arrive is kept and the client resumes from there.
+
+    The chunk is spooled to its own file first; only then is the session
+    locked, its offset checked again and the spool appended, so of
+    concurrent requests for the same range exactly one touches the part
+    file, and none holds the lock while the client is still sending.
+    """
+    config = get_upload_settings()
+    if session.image_id is not None:
+        raise UploadError("Upload already finalized", status=409)
+    if start != session.received:
+        raise UploadError("Offset mismatch", status=409)
+    if end - start > config["MAX_CHUNK_BYTES"]:
+        raise UploadError(f"Chunks are limited to {config['MAX_CHUNK_BYTES']} bytes", status=413)
+
+    path = part_path(session)
+    spool = path.with_name(f"{session.pk}.{uuid.uuid4().hex}.chunk")
+    key = str(session.pk)
+    try:
+        length = 0
+        with open(spool, "wb") as fh:
+            while length < end - start:
+                block = stream.read(min(config["BLOCK_BYTES"], end - start - length))
+                if not block:
+                    break
+                fh.write(block)
+                length += len(block)
+
+        with transaction.atomic():
+            # Lock the session. A conditional UPDATE rather than
+            # select_for_update, which SQLite ignores: the write takes its
+            # database lock too.
+            if not UploadSession.objects.filter(pk=session.pk, received=start, image__isnull=True).update(
+                updated_at=timezone.now()
+            ):
+                raise UploadError("Offset mismatch", status=409)
+            with _hashers_lock:
+                state = _hashers.pop(key, None)
+            hasher = state[1] if state is not None and state[0] == start else None
+            if hasher is None and start == 0:
+                hasher = hashlib.sha256()
+
+            with open(path, "r+b") as fh, open(spool, "rb") as chunk:
+                fh.seek(start)
+                fh.truncate()  # drop bytes of an earlier, unrecorded attempt
+                for block in iter(lambda: chunk.read(config["BLOCK_BYTES"]), b""):
+                    fh.write(block)
+                    if hasher is not None:
+                        hasher.update(block)
+            offset = start + length
+            UploadSession.objects.filter(pk=session.pk).update(received=offset)
+    finally:
+        spool.unlink(missing_ok=True)
+
+    session.received = offset
+    if hasher is not None:
+        with _hashers_lock:
+            _hashers[key] = (offset, hasher)
+            while len(_hashers) > MAX_HASHERS:
+                _hashers.popitem(last=False)
+    if offset < end:
+        raise UploadError("Chunk incomplete; resume from the returned offset", status=400)
+    return offset
+
+
+def _digest(session: UploadSession) -> str:
+    with _hashers_lock:
+        state = _hashers.pop(str(session.pk), None)
+    if state is not None and state[0] == session.size:
+        return state[1].hexdigest()
+    block = get_upload_settings()["BLOCK_BYTES"]
+    hasher = hashlib.sha256()
+    with open(part_path(session), "rb") as fh:
+        for data in iter(lambda: fh.read(block), b""):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def _has_gps(path: Path) -> bool:
+    with open(path, "rb") as fh:
+        return read_exif(fh).has_gps
+
+
+def finalize_upload(session: UploadSession, latitude=None, longitude=None,
+                    location=None) -> GeoTaggedImage:
+    """
+    Verify a complete upload, store it by content (see DENRO/images.py)
+    and attach it to a new GeoTaggedImage, placed at the photo's EXIF GPS
+    position if it has one and otherwise at the coordinates given here or
+    when the session was opened. Finalizing again returns the same image.
+    """
+    if session.image_id is not None:
+        return session.image
+    if session.received != session.size:
+        raise UploadError(f"Upload incomplete ({session.received} of {session.size} bytes)", status=409)
+    latitude = _coordinate(latitude, 90, "latitude")
+    longitude = _coordinate(longitude, 180, "longitude")
+    if latitude is None or longitude is None:
+        latitude, longitude = session.latitude, session.longitude
+
+    path = part_path(session)
+    try:
+        digest = _digest(session)
+        if session.sha256 and digest != session.sha256:
+            # Start over: the bytes on disk aren't the client's file
+            UploadSession.objects.filter(pk=session.pk).update(received=0, updated_at=timezone.now())
+            session.received = 0
+            open(path, "wb").close()
+            raise UploadError("Checksum mismatch; upload restarted", status=422)
+
+        if latitude is None and not _has_gps(path):
+            raise UploadError("latitude and longitude are required (the photo has no GPS position)")
+        with open(path, "rb") as fh:
+            stored = store_image(File(fh), session.filename, digest)
+    except FileNotFoundError:
+        # A concurrent finalize of this session has already moved the file
+        image = _finalized_image(session)
+        if image is None:
+            raise
+        return image
+
+    try:
+        with transaction.atomic():
+            image = GeoTaggedImage(
+                image=stored.name,
+                sha256=stored.sha256,
+                qr_code=str(session.pk),
+                latitude=latitude,
+                longitude=longitude,
+                location=(location if location is not None else session.location) or "",
+                captured_by=session.user,
+            )
+            apply_exif(image, stored.exif)
+            image.save()
+            session.image = image
+            session.save(update_fields=["image", "updated_at"])
+            schedule_derivatives(stored)
+    except IntegrityError:
+        # A concurrent finalize of this session saved its image first
+        image = _finalized_image(session)
+        if image is None:
+            raise
+        return image
+    path.unlink(missing_ok=True)
+    return image
+
+
+def _finalized_image(session: UploadSession) -> Optional[GeoTaggedImage]:
+    # The image another finalize attached to this session, if any
+    image = GeoTaggedImage.objects.filter(qr_code=str(session.pk)).first()
+    if image is not None:
+        session.image = image
+    return image
+
+
+def abort_upload(session: UploadSession):
+    with _hashers_lock:
+        _hashers.pop(str(session.pk), None)
+    _remove_files(session)
+    session.delete()
+
+
+def purge_uploads(hours: Optional[int] = None) -> int:
+    """
+    Delete sessions untouched for `hours` (default EXPIRE_HOURS) with their
+    part files; finalized photos stay. Returns the number removed.
+    """
+    hours = get_upload_settings()["EXPIRE_HOURS"] if hours is None else hours
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=hours))
+    removed = 0
+    for session in stale.iterator():
+        _remove_files(session)
+        removed += 1
+    stale.delete()
+    return removed
@@ -38,6 +38,8 @@ urlpatterns = [
         views.mark_notification_read,
         name="mark_notification_read",
     ),
+    path("api/notifications/", views.notifications_feed, name="notifications_feed"),
+    path("api/notifications/mark-read/", views.mark_notifications_read, name="mark_notifications_read"),
     path("custom-admin/activity-logs/", views.admin_activity_logs, name="admin_activitylogs"),
     path("activitylogs/user/<int:user_id>/", views.user_activity_detail, name="user_activity_detail"),
     path("cenro/activitylogs/", views.cenro_activitylogs, name="CENRO_activitylogs"),
@@ -45,6 +47,16 @@ urlpatterns = [
     path("api/welcome/", views.welcome_api, name="welcome_api"),
     path("api/login/", views.api_login, name="api_login"),
     path("api/update-location/", views.update_location, name="update_location"),
+    path("api/update-location/batch/", views.update_location_batch, name="update_location_batch"),
+    path("api/reports/batch/", views.submit_reports_batch, name="submit_reports_batch"),
+    path("api/uploads/", views.upload_create, name="upload_create"),
+    path("api/uploads/<uuid:upload_id>/", views.upload_detail, name="upload_detail"),
+    path("api/uploads/<uuid:upload_id>/finalize/", views.upload_finalize, name="upload_finalize"),
+    path("images/<str:digest>/<str:variant>/", views.image_variant, name="image_variant"),
+    path("api/locations/stream/", views.location_stream, name="location_stream"),
+    path("api/map/features/", views.map_features, name="map_features"),
+    path("api/map/nearby/", views.map_nearby, name="map_nearby"),
+    path("api/location-filter/stats/", views.location_filter_stats, name="location_filter_stats"),
     path("forbidden/", views.forbidden_view, name="forbidden"),
 
 
@@ -1,21 +1,26 @@
 # DENRO/views.py
-from datetime import timedelta, datetime
+from datetime import datetime
+import asyncio
 import json
 import logging
+import mimetypes
 import random
+import time
 import uuid
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.core.mail import send_mail
-from django.http import JsonResponse
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
 from django.contrib.auth import authenticate, login
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.hashers import make_password
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from django.utils.timezone import now
+from django.db.models import Q
 from django.views.decorators.cache import cache_control
+from asgiref.sync import sync_to_async
 
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
@@ -24,7 +29,33 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 
-from .models import User, Notification, ActivityLog, EnumeratorsReport
+from .models import User, ActivityLog, EnumeratorsReport, GeoTaggedImage, UploadSession
+from .stats import get_dashboard_stats
+from .rollups import activity_metrics
+from .pagination import CursorPaginator
+from .logquery import LOG_SCOPES, filter_logs, log_filters
+from .activity import log_activity
+from .archive import archived_page
+from .duplicates import flag_duplicates
+from .images import StoredImage, derivative_name, get_image_settings, schedule_derivatives
+from .pubsub import get_broker
+from .uploads import (
+    UploadError, abort_upload, create_upload, finalize_upload, parse_content_range, write_chunk,
+)
+from .reports import (
+    MAX_BATCH_REPORTS, ReportError, clean_key, parse_report, parse_submission, store_reports,
+    submit_report,
+)
+from .mapfeatures import LAYERS, MAX_NEARBY, feature_collection, nearby_features, parse_bbox
+from .notifications import (
+    ADMIN_ROLES, broadcast, get_notification_settings, mark_all_read, mark_read,
+    notifications_for, notifications_since, state_token, unread_count,
+)
+from .locations import (
+    MAX_BATCH_FIXES, clean_fix, parse_timestamp, record_location, record_locations,
+    get_filter_stats, get_user_location, get_user_locations,
+    LOCATION_CHANNEL, get_live_settings, live_scope,
+)
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -36,12 +67,95 @@ from .permissions import IsSuperAdmin, IsAdminOrSuperAdmin
 # ----------------- Notifications -----------------
 @login_required
 def mark_notification_read(request, pk):
-    note = get_object_or_404(Notification, pk=pk, user=request.user)
-    note.is_read = True
-    note.save()
+    note = get_object_or_404(notifications_for(request.user), pk=pk)
+    mark_read(request.user, note)
     return redirect("admin_dashboard")
 
 
+@login_required
+async def notifications_feed(request):
+    """
+    Notifications newer than ?since=<id> (or ?since_time=<ISO timestamp>),
+    for polling clients. Send back the last ETag in If-None-Match to get an
+    empty 304 when nothing changed; add ?wait=<seconds> to long-poll for up
+    to NOTIFICATIONS["LONG_POLL_MAX_S"] until something does. Long-polling
+    needs the ASGI server; under WSGI the answer is immediate and carries
+    Retry-After with the interval to poll again at.
+    """
+    user = await request.auser()
+    since_id = since_time = None
+    try:
+        if request.GET.get("since"):
+            since_id = int(request.GET["since"])
+        elif request.GET.get("since_time"):
+            since_time = parse_timestamp(request.GET["since_time"])
+            if since_time is None:
+                raise ValueError
+        wait = float(request.GET.get("wait") or 0)
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid since or wait"}, status=400)
+
+    config = get_notification_settings()
+    # A synchronous worker would be tied up for the whole wait
+    held = "wsgi.version" not in request.META
+    wait = min(max(wait, 0), config["LONG_POLL_MAX_S"]) if held else 0
+    client_etag = request.headers.get("If-None-Match")
+
+    # Cache-only checks; the database is queried once something changed
+    @sync_to_async
+    def etag():
+        return f'W/"{user.pk}-{state_token(user)}"'
+
+    current = await etag()
+    deadline = time.monotonic() + wait
+    while current == client_etag and time.monotonic() < deadline:
+        await asyncio.sleep(min(config["LONG_POLL_INTERVAL_S"], deadline - time.monotonic()))
+        current = await etag()
+    if current == client_etag:
+        response = HttpResponseNotModified()
+    else:
+        response = await sync_to_async(_notifications_response)(user, since_id, since_time)
+    response["ETag"] = current
+    if not held:
+        response["Retry-After"] = str(int(config["POLL_INTERVAL_S"]))
+    return response
+
+
+def _notifications_response(user, since_id, since_time):
+    notes = notifications_since(user, since_id, since_time)
+    response = JsonResponse({
+        "notifications": [
+            {
+                "id": n.id,
+                "message": n.message,
+                "created_at": n.created_at.isoformat(),
+                "read": n.read,
+                "broadcast": n.user_id is None,
+            }
+            for n in notes
+        ],
+        "last_id": notes[-1].id if notes else since_id,
+        "unread_count": unread_count(user),
+    })
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def mark_notifications_read(request):
+    """Mark everything up to and including notification `up_to` as read."""
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body) if request.content_type == "application/json" else request.POST
+        up_to = int(data.get("up_to"))
+    except (TypeError, ValueError):
+        return JsonResponse({"status": "error", "message": "up_to must be a notification id"}, status=400)
+
+    marked = mark_all_read(request.user, up_to)
+    return JsonResponse({"status": "success", "marked": marked, "unread_count": unread_count(request.user)})
+
+
 # ----------------- Registration -----------------
 def register_view(request):
     if request.method == "POST":
@@ -71,10 +185,7 @@ def register_view(request):
         )
 
         # Send notification to admins about new registration
-        for admin in User.objects.filter(role__in=['ADMIN', 'SUPER_ADMIN']):
-            Notification.objects.create(
-                user=admin, message=f"New {role} registered: {username}"
-            )
+        broadcast(ADMIN_ROLES, f"New {role} registered: {username}")
 
         messages.success(request, "Your account is pending approval by Admin.")
         return redirect("login")
@@ -113,19 +224,19 @@ def approve_users(request):
             if action == "approve":
                 user.is_approved = True
                 user.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="APPROVE",
-                    details=f"Approved user {user.username}",
+                log_activity(
+                    request.user,
+                    "APPROVE",
+                    f"Approved user {user.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
             elif action == "reject":
                 user.is_rejected = True
                 user.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="REJECT",
-                    details=f"Rejected user {user.username}",
+                log_activity(
+                    request.user,
+                    "REJECT",
+                    f"Rejected user {user.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
             elif action == "deactivate":
@@ -189,8 +300,6 @@ def approve_users(request):
         rejected_users = rejected_users.filter(date_joined__date__lte=dto)
         deactivated_users = deactivated_users.filter(date_joined__date__lte=dto)
 
-    notifications, unread_count = get_unread_notifications(request)
-
     return render(
         request,
         "ADMIN/approve_users.html",
@@ -199,8 +308,6 @@ def approve_users(request):
             "approved_users": approved_users,
             "rejected_users": rejected_users,
             "deactivated_users": deactivated_users,
-            "notifications": notifications,
-            "unread_count": unread_count,
         },
     )
 
@@ -216,19 +323,19 @@ def admin_reports(request):
             if action == "accept":
                 report.status = "ACCEPTED"
                 report.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="APPROVE",
-                    details=f"Accepted report {report_id} by {report.enumerator.username}",
+                log_activity(
+                    request.user,
+                    "APPROVE",
+                    f"Accepted report {report_id} by {report.enumerator.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
             elif action == "decline":
                 report.status = "DECLINED"
                 report.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="REJECT",
-                    details=f"Declined report {report_id} by {report.enumerator.username}",
+                log_activity(
+                    request.user,
+                    "REJECT",
+                    f"Declined report {report_id} by {report.enumerator.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
         except EnumeratorsReport.DoesNotExist:
@@ -236,7 +343,7 @@ def admin_reports(request):
 
     # Base querysets
     pending_reports = EnumeratorsReport.objects.filter(status="PENDING").select_related(
-        "enumerator", "pa", "profile"
+        "enumerator", "pa", "profile", "geo_tag_image"
     )
     accepted_reports = EnumeratorsReport.objects.filter(status="ACCEPTED").select_related(
         "enumerator", "pa", "profile"
@@ -260,102 +367,35 @@ def admin_reports(request):
 
     # Get last login locations for CENRO users
     cenro_users = User.objects.filter(role='CENRO', is_approved=True, is_deactivated=False)
-    cenro_locations = []
-    for user in cenro_users:
-        last_location_log = ActivityLog.objects.filter(
-            user=user, action='LOCATION_UPDATE'
-        ).order_by('-created_at').first()
-        if last_location_log and last_location_log.details:
-            try:
-                parts = last_location_log.details.split(': ')
-                if len(parts) == 2:
-                    coords = parts[1].split(', ')
-                    if len(coords) == 2:
-                        lat = float(coords[0])
-                        lon = float(coords[1])
-                        cenro_locations.append({
-                            'id': user.id,
-                            'username': user.username,
-                            'role': user.role,
-                            'lat': lat,
-                            'lon': lon,
-                            'last_update': last_location_log.created_at,
-                        })
-            except ValueError:
-                pass
-
-    notifications, unread_count = get_unread_notifications(request)
+    cenro_locations = get_user_locations(cenro_users)
 
     return render(
         request,
         "ADMIN/admin_reports.html",
         {
-            "pending_reports": pending_reports,
+            "pending_reports": flag_duplicates(pending_reports),
             "accepted_reports": accepted_reports,
             "declined_reports": declined_reports,
-            "notifications": notifications,
-            "unread_count": unread_count,
+            "cenro_locations": cenro_locations,
         },
     )
 
 
 # ----------------- Helper Functions -----------------
-def get_dashboard_stats():
-    return {
-        "admins": User.objects.filter(role="ADMIN", is_approved=True, is_deactivated=False).count(),
-        "penros": User.objects.filter(role="PENRO", is_approved=True, is_deactivated=False).count(),
-        "cenros": User.objects.filter(role="CENRO", is_approved=True, is_deactivated=False).count(),
-        "evaluators": User.objects.filter(role="EVALUATOR", is_approved=True, is_deactivated=False).count(),
-        "approved_users": User.objects.filter(is_approved=True, is_deactivated=False).count(),
-        "pending_users": User.objects.filter(is_approved=False, is_rejected=False, is_deactivated=False).count(),
-        "rejected_users": User.objects.filter(is_rejected=True).count(),
-        "deactivated_users": User.objects.filter(is_deactivated=True).count(),
-        "pending_reports": EnumeratorsReport.objects.filter(status="PENDING").count(),
-        "accepted_reports": EnumeratorsReport.objects.filter(status="ACCEPTED").count(),
-        "declined_reports": EnumeratorsReport.objects.filter(status="DECLINED").count(),
-    }
-
-
 def get_recent_users(limit=5):
     return User.objects.order_by("-date_joined")[:limit]
 
 
-def get_unread_notifications(request):
-    notifications = Notification.objects.filter(user=request.user, is_read=False).order_by("-created_at")
-    return notifications, notifications.count()
-
-
 # ----------------- Admin Dashboard -----------------
 @login_required
 def admin_dashboard(request):
     stats = get_dashboard_stats()
     users = get_recent_users()
-    notifications, unread_count = get_unread_notifications(request)
-
-    logs_qs = ActivityLog.objects.all().select_related("user").order_by("-created_at")
-
-    # Filters
-    q = request.GET.get("q")
-    role = request.GET.get("role")
-    action = request.GET.get("action")
-    dfrom = request.GET.get("from")
-    dto = request.GET.get("to")
 
-    if q:
-        logs_qs = logs_qs.filter(
-            Q(user__username__icontains=q) | Q(details__icontains=q) | Q(action__icontains=q)
-        )
-    if role:
-        logs_qs = logs_qs.filter(user__role=role)
-    if action:
-        logs_qs = logs_qs.filter(action=action)
-    if dfrom:
-        logs_qs = logs_qs.filter(created_at__date__gte=dfrom)
-    if dto:
-        logs_qs = logs_qs.filter(created_at__date__lte=dto)
+    filters = log_filters(request.GET)
+    logs_qs = filter_logs(filters, roles=LOG_SCOPES["admin_dashboard"])
 
-    paginator = Paginator(logs_qs, 20)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
+    page_obj = CursorPaginator(logs_qs, 20, estimate_total=True).get_page(request.GET.get("cursor"))
 
     return render(
         request,
@@ -363,8 +403,6 @@ def admin_dashboard(request):
         {
             "stats": stats,
             "users": users,
-            "notifications": notifications,
-            "unread_count": unread_count,
             "logs": page_obj.object_list,
             "page_obj": page_obj,
         },
@@ -372,6 +410,16 @@ def admin_dashboard(request):
 
 
 # ----------------- Login -----------------
+def record_login_location(request, user):
+    # Only store a location if the login form sent a real device fix;
+    # there is no point recording a made-up default position.
+    try:
+        fix = clean_fix(request.POST)
+    except ValueError:
+        return
+    record_location(user, ip_address=request.META.get("REMOTE_ADDR"), **fix)
+
+
 def login_view(request):
     if request.method == "POST":
         username = request.POST.get("username")
@@ -391,19 +439,13 @@ def login_view(request):
 
             # Directly log in the user
             login(request, user)
-            ActivityLog.objects.create(
-                user=user,
-                action="LOGIN",
-                details=f"Logged in from {request.META.get('REMOTE_ADDR', 'unknown')}",
-                ip_address=request.META.get("REMOTE_ADDR"),
-            )
-            # Log location update on login (default to Cebu coordinates if no location provided)
-            ActivityLog.objects.create(
-                user=user,
-                action="LOCATION_UPDATE",
-                details="Location updated: 10.3157, 123.8854",  # Default Cebu coordinates
+            log_activity(
+                user,
+                "LOGIN",
+                f"Logged in from {request.META.get('REMOTE_ADDR', 'unknown')}",
                 ip_address=request.META.get("REMOTE_ADDR"),
             )
+            record_login_location(request, user)
 
             # Redirect based on role
             if user.role == "SUPER_ADMIN":
@@ -437,19 +479,13 @@ def verify_2fa(request):
         if code == stored_code and user_id:
             user = User.objects.get(id=user_id)
             login(request, user)
-            ActivityLog.objects.create(
-                user=user,
-                action="LOGIN",
-                details=f"Logged in from {request.META.get('REMOTE_ADDR', 'unknown')}",
-                ip_address=request.META.get("REMOTE_ADDR"),
-            )
-            # Log location update on login (default to Cebu coordinates if no location provided)
-            ActivityLog.objects.create(
-                user=user,
-                action="LOCATION_UPDATE",
-                details="Location updated: 10.3157, 123.8854",  # Default Cebu coordinates
+            log_activity(
+                user,
+                "LOGIN",
+                f"Logged in from {request.META.get('REMOTE_ADDR', 'unknown')}",
                 ip_address=request.META.get("REMOTE_ADDR"),
             )
+            record_login_location(request, user)
             # Clear session
             del request.session['2fa_code']
             del request.session['2fa_user_id']
@@ -512,22 +548,18 @@ def user_profile(request):
 
         request.user.save()
 
-        ActivityLog.objects.create(
-            user=request.user,
-            action="UPDATE",
-            details="Updated profile information" + (" and changed password" if password_changed else ""),
+        log_activity(
+            request.user,
+            "UPDATE",
+            "Updated profile information" + (" and changed password" if password_changed else ""),
             ip_address=request.META.get("REMOTE_ADDR"),
         )
 
         messages.success(request, "Profile updated successfully." + (" Password changed." if password_changed else ""))
         return redirect("user_profile")
 
-    notifications, unread_count = get_unread_notifications(request)
-
     return render(request, "user_profile.html", {
         "user": request.user,
-        "notifications": notifications,
-        "unread_count": unread_count,
     })
 
 
@@ -554,30 +586,24 @@ def change_password(request):
         request.user.set_password(new_password)
         request.user.save()
 
-        ActivityLog.objects.create(
-            user=request.user,
-            action="UPDATE",
-            details="Changed password",
+        log_activity(
+            request.user,
+            "UPDATE",
+            "Changed password",
             ip_address=request.META.get("REMOTE_ADDR"),
         )
 
         messages.success(request, "Password changed successfully.")
         return redirect("change_password")
 
-    notifications, unread_count = get_unread_notifications(request)
-
     return render(request, "change_password.html", {
         "user": request.user,
-        "notifications": notifications,
-        "unread_count": unread_count,
     })
 
 
 # ----------------- Admin Activity Logs -----------------
 @login_required
 def admin_activity_logs(request):
-    notifications, unread_count = get_unread_notifications(request)
-
     # Handle manual account creation
     if request.method == "POST" and request.POST.get("action") == "create_account":
         username = request.POST.get("username")
@@ -611,78 +637,31 @@ def admin_activity_logs(request):
             )
 
             # Send notification to admins about new account created
-            for admin in User.objects.filter(role__in=['ADMIN', 'SUPER_ADMIN']):
-                Notification.objects.create(
-                    user=admin, message=f"New {role} account created: {username} - Pending approval"
-                )
+            broadcast(ADMIN_ROLES, f"New {role} account created: {username} - Pending approval")
 
-            ActivityLog.objects.create(
-                user=request.user,
-                action="CREATE",
-                details=f"Created account for {username} ({role}) - ID: {id_number}",
+            log_activity(
+                request.user,
+                "CREATE",
+                f"Created account for {username} ({role}) - ID: {id_number}",
                 ip_address=request.META.get("REMOTE_ADDR"),
             )
 
             messages.success(request, f"Account for {username} created successfully")
             return redirect("admin_activitylogs")
 
-    logs_qs = ActivityLog.objects.all().select_related("user").order_by("-created_at")
+    filters = log_filters(request.GET)
+    logs_qs = filter_logs(filters, roles=LOG_SCOPES["admin_activity_logs"])
 
-    # Filters
-    q = request.GET.get("q")
-    role = request.GET.get("role")
-    action = request.GET.get("action")
-    dfrom = request.GET.get("from")
-    dto = request.GET.get("to")
-    if q:
-        logs_qs = logs_qs.filter(
-            Q(user__username__icontains=q) | Q(details__icontains=q) | Q(action__icontains=q)
-        )
-    if role:
-        logs_qs = logs_qs.filter(user__role=role)
-    if action:
-        logs_qs = logs_qs.filter(action=action)
-    if dfrom:
-        logs_qs = logs_qs.filter(created_at__date__gte=dfrom)
-    if dto:
-        logs_qs = logs_qs.filter(created_at__date__lte=dto)
+    page_obj = CursorPaginator(logs_qs, 20).get_page(request.GET.get("cursor"))
 
-    paginator = Paginator(logs_qs, 20)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
-
-    metrics = {
-        "total_events": logs_qs.count(),
-        "unique_users": logs_qs.values("user_id").distinct().count(),
-        "errors": logs_qs.filter(action="ERROR").count(),
-        "this_week": logs_qs.filter(created_at__gte=now() - timedelta(days=7)).count(),
-    }
-
-    total_events_breakdown = dict(logs_qs.values_list("action").annotate(c=Count("id")))
-    unique_user_ids = logs_qs.values("user_id").distinct()
-    unique_users_breakdown = dict(
-        logs_qs.filter(user_id__in=[u["user_id"] for u in unique_user_ids])
-        .values_list("action")
-        .annotate(c=Count("id"))
-    )
-    errors_breakdown = dict(
-        logs_qs.filter(action="ERROR").values_list("details").annotate(c=Count("id"))
-    )
-    this_week_qs = logs_qs.filter(created_at__gte=now() - timedelta(days=7))
-    this_week_breakdown = dict(this_week_qs.values_list("action").annotate(c=Count("id")))
+    metrics, breakdowns = activity_metrics(logs_qs, **filters)
 
     context = {
         "logs": page_obj.object_list,
         "page_obj": page_obj,
         "metrics": metrics,
-        "action_counts_json": json.dumps(total_events_breakdown),
-        "popup_data": {
-            "total_events": total_events_breakdown,
-            "unique_users": unique_users_breakdown,
-            "errors": errors_breakdown,
-            "this_week": this_week_breakdown,
-        },
-        "notifications": notifications,
-        "unread_count": unread_count,
+        "action_counts_json": json.dumps(breakdowns["total_events"]),
+        "popup_data": breakdowns,
     }
     return render(request, "ADMIN/admin_activitylogs.html", context)
 
@@ -702,81 +681,14 @@ def superadmin_dashboard(request):
 def penro_dashboard(request):
     stats = get_dashboard_stats()
     users = User.objects.filter(role__in=['PENRO', 'EVALUATOR'], last_login__isnull=False).order_by('-last_login')[:5]
-    notifications, unread_count = get_unread_notifications(request)
-
-    # Get last login locations for PENRO and EVALUATOR (excluding current user)
-    penro_evaluator_users = User.objects.filter(role__in=['PENRO', 'EVALUATOR'], is_approved=True, is_deactivated=False).exclude(id=request.user.id)
-    user_locations = []
-    for user in penro_evaluator_users:
-        last_location_log = ActivityLog.objects.filter(
-            user=user, action='LOCATION_UPDATE'
-        ).order_by('-created_at').first()
-        if last_location_log and last_location_log.details:
-            # Parse "Location updated: lat, lon"
-            try:
-                parts = last_location_log.details.split(': ')
-                if len(parts) == 2:
-                    coords = parts[1].split(', ')
-                    if len(coords) == 2:
-                        lat = float(coords[0])
-                        lon = float(coords[1])
-                        user_locations.append({
-                            'id': user.id,
-                            'username': user.username,
-                            'role': user.role,
-                            'lat': lat,
-                            'lon': lon,
-                            'last_update': last_location_log.created_at,
-                        })
-            except ValueError:
-                pass
 
     # Get current user's last location
-    current_user_location = None
-    last_location_log = ActivityLog.objects.filter(
-        user=request.user, action='LOCATION_UPDATE'
-    ).order_by('-created_at').first()
-    if last_location_log and last_location_log.details:
-        # Parse "Location updated: lat, lon"
-        try:
-            parts = last_location_log.details.split(': ')
-            if len(parts) == 2:
-                coords = parts[1].split(', ')
-                if len(coords) == 2:
-                    lat = float(coords[0])
-                    lon = float(coords[1])
-                    current_user_location = {
-                        'lat': lat,
-                        'lon': lon,
-                        'last_update': last_location_log.created_at,
-                    }
-        except ValueError:
-            pass
-
-    logs_qs = ActivityLog.objects.filter(user__role__in=['PENRO', 'EVALUATOR']).select_related("user").order_by("-created_at")
+    current_user_location = get_user_location(request.user)
 
-    # Filters
-    q = request.GET.get("q")
-    role = request.GET.get("role")
-    action = request.GET.get("action")
-    dfrom = request.GET.get("from")
-    dto = request.GET.get("to")
-
-    if q:
-        logs_qs = logs_qs.filter(
-            Q(user__username__icontains=q) | Q(details__icontains=q) | Q(action__icontains=q)
-        )
-    if role:
-        logs_qs = logs_qs.filter(user__role=role)
-    if action:
-        logs_qs = logs_qs.filter(action=action)
-    if dfrom:
-        logs_qs = logs_qs.filter(created_at__date__gte=dfrom)
-    if dto:
-        logs_qs = logs_qs.filter(created_at__date__lte=dto)
+    filters = log_filters(request.GET)
+    logs_qs = filter_logs(filters, roles=LOG_SCOPES["penro_dashboard"])
 
-    paginator = Paginator(logs_qs, 20)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
+    page_obj = CursorPaginator(logs_qs, 20, estimate_total=True).get_page(request.GET.get("cursor"))
 
     return render(
         request,
@@ -784,10 +696,7 @@ def penro_dashboard(request):
         {
             "stats": stats,
             "users": users,
-            "user_locations": user_locations,
             "current_user_location": current_user_location,
-            "notifications": notifications,
-            "unread_count": unread_count,
             "logs": page_obj.object_list,
             "page_obj": page_obj,
         },
@@ -800,81 +709,14 @@ def penro_dashboard(request):
 def cenro_dashboard(request):
     stats = get_dashboard_stats()
     users = User.objects.filter(role__in=['CENRO', 'EVALUATOR'], last_login__isnull=False).order_by('-last_login')[:5]
-    notifications, unread_count = get_unread_notifications(request)
-
-    # Get last login locations for CENRO and EVALUATOR (excluding current user)
-    cenro_evaluator_users = User.objects.filter(role__in=['CENRO', 'EVALUATOR'], is_approved=True, is_deactivated=False).exclude(id=request.user.id)
-    user_locations = []
-    for user in cenro_evaluator_users:
-        last_location_log = ActivityLog.objects.filter(
-            user=user, action='LOCATION_UPDATE'
-        ).order_by('-created_at').first()
-        if last_location_log and last_location_log.details:
-            # Parse "Location updated: lat, lon"
-            try:
-                parts = last_location_log.details.split(': ')
-                if len(parts) == 2:
-                    coords = parts[1].split(', ')
-                    if len(coords) == 2:
-                        lat = float(coords[0])
-                        lon = float(coords[1])
-                        user_locations.append({
-                            'id': user.id,
-                            'username': user.username,
-                            'role': user.role,
-                            'lat': lat,
-                            'lon': lon,
-                            'last_update': last_location_log.created_at,
-                        })
-            except ValueError:
-                pass
 
     # Get current user's last location
-    current_user_location = None
-    last_location_log = ActivityLog.objects.filter(
-        user=request.user, action='LOCATION_UPDATE'
-    ).order_by('-created_at').first()
-    if last_location_log and last_location_log.details:
-        # Parse "Location updated: lat, lon"
-        try:
-            parts = last_location_log.details.split(': ')
-            if len(parts) == 2:
-                coords = parts[1].split(', ')
-                if len(coords) == 2:
-                    lat = float(coords[0])
-                    lon = float(coords[1])
-                    current_user_location = {
-                        'lat': lat,
-                        'lon': lon,
-                        'last_update': last_location_log.created_at,
-                    }
-        except ValueError:
-            pass
+    current_user_location = get_user_location(request.user)
 
-    logs_qs = ActivityLog.objects.filter(user__role='EVALUATOR').select_related("user").order_by("-created_at")
+    filters = log_filters(request.GET)
+    logs_qs = filter_logs(filters, roles=LOG_SCOPES["cenro_dashboard"])
 
-    # Filters
-    q = request.GET.get("q")
-    role = request.GET.get("role")
-    action = request.GET.get("action")
-    dfrom = request.GET.get("from")
-    dto = request.GET.get("to")
-
-    if q:
-        logs_qs = logs_qs.filter(
-            Q(user__username__icontains=q) | Q(details__icontains=q) | Q(action__icontains=q)
-        )
-    if role:
-        logs_qs = logs_qs.filter(user__role=role)
-    if action:
-        logs_qs = logs_qs.filter(action=action)
-    if dfrom:
-        logs_qs = logs_qs.filter(created_at__date__gte=dfrom)
-    if dto:
-        logs_qs = logs_qs.filter(created_at__date__lte=dto)
-
-    paginator = Paginator(logs_qs, 20)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
+    page_obj = CursorPaginator(logs_qs, 20, estimate_total=True).get_page(request.GET.get("cursor"))
 
     return render(
         request,
@@ -882,10 +724,7 @@ def cenro_dashboard(request):
         {
             "stats": stats,
             "users": users,
-            "user_locations": user_locations,
             "current_user_location": current_user_location,
-            "notifications": notifications,
-            "unread_count": unread_count,
             "logs": page_obj.object_list,
             "page_obj": page_obj,
         },
@@ -898,54 +737,14 @@ def cenro_dashboard(request):
 def evaluator_dashboard(request):
     stats = get_dashboard_stats()
     users = User.objects.filter(role__in=['CENRO', 'EVALUATOR'], last_login__isnull=False).order_by('-last_login')[:5]
-    notifications, unread_count = get_unread_notifications(request)
 
     # Get current user's last location
-    user_location = None
-    last_location_log = ActivityLog.objects.filter(
-        user=request.user, action='LOCATION_UPDATE'
-    ).order_by('-created_at').first()
-    if last_location_log and last_location_log.details:
-        # Parse "Location updated: lat, lon"
-        try:
-            parts = last_location_log.details.split(': ')
-            if len(parts) == 2:
-                coords = parts[1].split(', ')
-                if len(coords) == 2:
-                    lat = float(coords[0])
-                    lon = float(coords[1])
-                    user_location = {
-                        'lat': lat,
-                        'lon': lon,
-                        'last_update': last_location_log.created_at,
-                    }
-        except ValueError:
-            pass
+    user_location = get_user_location(request.user)
 
-    logs_qs = ActivityLog.objects.filter(user__role__in=['CENRO', 'EVALUATOR']).select_related("user").order_by("-created_at")
+    filters = log_filters(request.GET)
+    logs_qs = filter_logs(filters, roles=LOG_SCOPES["evaluator_dashboard"])
 
-    # Filters
-    q = request.GET.get("q")
-    role = request.GET.get("role")
-    action = request.GET.get("action")
-    dfrom = request.GET.get("from")
-    dto = request.GET.get("to")
-
-    if q:
-        logs_qs = logs_qs.filter(
-            Q(user__username__icontains=q) | Q(details__icontains=q) | Q(action__icontains=q)
-        )
-    if role:
-        logs_qs = logs_qs.filter(user__role=role)
-    if action:
-        logs_qs = logs_qs.filter(action=action)
-    if dfrom:
-        logs_qs = logs_qs.filter(created_at__date__gte=dfrom)
-    if dto:
-        logs_qs = logs_qs.filter(created_at__date__lte=dto)
-
-    paginator = Paginator(logs_qs, 20)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
+    page_obj = CursorPaginator(logs_qs, 20, estimate_total=True).get_page(request.GET.get("cursor"))
 
     return render(
         request,
@@ -953,8 +752,6 @@ def evaluator_dashboard(request):
         {
             "stats": stats,
             "users": users,
-            "notifications": notifications,
-            "unread_count": unread_count,
             "logs": page_obj.object_list,
             "page_obj": page_obj,
             "user_location": user_location,
@@ -965,65 +762,19 @@ def evaluator_dashboard(request):
 @login_required
 @user_passes_test(is_cenro)
 def cenro_activitylogs(request):
-    notifications, unread_count = get_unread_notifications(request)
-
-    logs_qs = ActivityLog.objects.all().select_related("user").order_by("-created_at")
-
-    # Filters
-    q = request.GET.get("q")
-    role = request.GET.get("role")
-    action = request.GET.get("action")
-    dfrom = request.GET.get("from")
-    dto = request.GET.get("to")
-    if q:
-        logs_qs = logs_qs.filter(
-            Q(user__username__icontains=q) | Q(details__icontains=q) | Q(action__icontains=q)
-        )
-    if role:
-        logs_qs = logs_qs.filter(user__role=role)
-    if action:
-        logs_qs = logs_qs.filter(action=action)
-    if dfrom:
-        logs_qs = logs_qs.filter(created_at__date__gte=dfrom)
-    if dto:
-        logs_qs = logs_qs.filter(created_at__date__lte=dto)
+    filters = log_filters(request.GET)
+    logs_qs = filter_logs(filters, roles=LOG_SCOPES["cenro_activitylogs"])
 
-    paginator = Paginator(logs_qs, 20)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
+    page_obj = CursorPaginator(logs_qs, 20).get_page(request.GET.get("cursor"))
 
-    metrics = {
-        "total_events": logs_qs.count(),
-        "unique_users": logs_qs.values("user_id").distinct().count(),
-        "errors": logs_qs.filter(action="ERROR").count(),
-        "this_week": logs_qs.filter(created_at__gte=now() - timedelta(days=7)).count(),
-    }
-
-    total_events_breakdown = dict(logs_qs.values_list("action").annotate(c=Count("id")))
-    unique_user_ids = logs_qs.values("user_id").distinct()
-    unique_users_breakdown = dict(
-        logs_qs.filter(user_id__in=[u["user_id"] for u in unique_user_ids])
-        .values_list("action")
-        .annotate(c=Count("id"))
-    )
-    errors_breakdown = dict(
-        logs_qs.filter(action="ERROR").values_list("details").annotate(c=Count("id"))
-    )
-    this_week_qs = logs_qs.filter(created_at__gte=now() - timedelta(days=7))
-    this_week_breakdown = dict(this_week_qs.values_list("action").annotate(c=Count("id")))
+    metrics, breakdowns = activity_metrics(logs_qs, **filters)
 
     context = {
         "logs": page_obj.object_list,
         "page_obj": page_obj,
         "metrics": metrics,
-        "action_counts_json": json.dumps(total_events_breakdown),
-        "popup_data": {
-            "total_events": total_events_breakdown,
-            "unique_users": unique_users_breakdown,
-            "errors": errors_breakdown,
-            "this_week": this_week_breakdown,
-        },
-        "notifications": notifications,
-        "unread_count": unread_count,
+        "action_counts_json": json.dumps(breakdowns["total_events"]),
+        "popup_data": breakdowns,
     }
     return render(request, "CENRO/CENRO_activitylogs.html", context)
 
@@ -1038,19 +789,19 @@ def cenro_reports(request):
             if action == "accept":
                 report.status = "ACCEPTED"
                 report.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="APPROVE",
-                    details=f"Accepted report {report_id} by {report.enumerator.username}",
+                log_activity(
+                    request.user,
+                    "APPROVE",
+                    f"Accepted report {report_id} by {report.enumerator.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
             elif action == "decline":
                 report.status = "DECLINED"
                 report.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="REJECT",
-                    details=f"Declined report {report_id} by {report.enumerator.username}",
+                log_activity(
+                    request.user,
+                    "REJECT",
+                    f"Declined report {report_id} by {report.enumerator.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
         except EnumeratorsReport.DoesNotExist:
@@ -1058,7 +809,7 @@ def cenro_reports(request):
 
     # Base querysets
     pending_reports = EnumeratorsReport.objects.filter(status="PENDING").select_related(
-        "enumerator", "pa", "profile"
+        "enumerator", "pa", "profile", "geo_tag_image"
     )
     accepted_reports = EnumeratorsReport.objects.filter(status="ACCEPTED").select_related(
         "enumerator", "pa", "profile"
@@ -1082,267 +833,62 @@ def cenro_reports(request):
 
     # Get last login locations for CENRO users
     cenro_users = User.objects.filter(role='CENRO', is_approved=True, is_deactivated=False)
-    cenro_locations = []
-    for user in cenro_users:
-        last_location_log = ActivityLog.objects.filter(
-            user=user, action='LOCATION_UPDATE'
-        ).order_by('-created_at').first()
-        if last_location_log and last_location_log.details:
-            try:
-                parts = last_location_log.details.split(': ')
-                if len(parts) == 2:
-                    coords = parts[1].split(', ')
-                    if len(coords) == 2:
-                        lat = float(coords[0])
-                        lon = float(coords[1])
-                        cenro_locations.append({
-                            'id': user.id,
-                            'username': user.username,
-                            'role': user.role,
-                            'lat': lat,
-                            'lon': lon,
-                            'last_update': last_location_log.created_at,
-                        })
-            except ValueError:
-                pass
+    cenro_locations = get_user_locations(cenro_users)
 
     # Get last login locations for CENRO and EVALUATOR (excluding current user)
     cenro_evaluator_users = User.objects.filter(role__in=['CENRO', 'EVALUATOR'], is_approved=True, is_deactivated=False).exclude(id=request.user.id)
-    user_locations = []
-    for user in cenro_evaluator_users:
-        last_location_log = ActivityLog.objects.filter(
-            user=user, action='LOCATION_UPDATE'
-        ).order_by('-created_at').first()
-        if last_location_log and last_location_log.details:
-            try:
-                parts = last_location_log.details.split(': ')
-                if len(parts) == 2:
-                    coords = parts[1].split(', ')
-                    if len(coords) == 2:
-                        lat = float(coords[0])
-                        lon = float(coords[1])
-                        user_locations.append({
-                            'id': user.id,
-                            'username': user.username,
-                            'role': user.role,
-                            'lat': lat,
-                            'lon': lon,
-                            'last_update': last_location_log.created_at,
-                        })
-            except ValueError:
-                pass
-
-    notifications, unread_count = get_unread_notifications(request)
+    user_locations = get_user_locations(cenro_evaluator_users)
 
     return render(
         request,
         "CENRO/CENRO_reports.html",
         {
-            "pending_reports": pending_reports,
+            "pending_reports": flag_duplicates(pending_reports),
             "accepted_reports": accepted_reports,
             "declined_reports": declined_reports,
+            "cenro_locations": cenro_locations,
             "user_locations": user_locations,
-            "notifications": notifications,
-            "unread_count": unread_count,
         },
     )
 
 
 @login_required
 def cenro_templates(request):
-    return render(request, "CENRO/CENRO_templates.html")
+    return render(request, "CENRO/CENRO_templates.html", {"idempotency_key": uuid.uuid4().hex})
 
 
 @login_required
 def cenro_submit_report(request):
     if request.method == 'POST':
-        # Extract data
-        report_date = request.POST.get('report_date')
-        pa_name = request.POST.get('protected_area')
-        proponent_name = request.POST.get('proponent_name')
-        contact_no = request.POST.get('contact_number')
-        location = request.POST.get('location')
-        lot_status = request.POST.get('lot_status')
-        land_classification = request.POST.get('land_classification')
-        title_no = request.POST.get('title_no')
-        lot_no = request.POST.get('lot_no')
-        lot_owner = request.POST.get('lot_owner')
-        latitude = request.POST.get('latitude')
-        longitude = request.POST.get('longitude')
-        area_covered = request.POST.get('area')
-        pa_zone = request.POST.get('management_zone')
-        easement = request.POST.get('easement') == 'Yes'
-        establishment_status = request.POST.get('establishment_status')
-        establishment_types = request.POST.getlist('establishment_type')
-        other_establishment = request.POST.get('establishment_others')
-        establishment_description = request.POST.get('description')
-        # Permits LGU
-        mayors_permit = request.POST.get('mayors_permit') == 'on'
-        mp_number = request.POST.get('mayors_permit_number')
-        mp_date_issued = request.POST.get('mayors_permit_issued')
-        mp_expiration = request.POST.get('mayors_permit_expiry')
-        business_permit = request.POST.get('business_permit') == 'on'
-        bp_number = request.POST.get('business_permit_number')
-        bp_date_issued = request.POST.get('business_permit_issued')
-        bp_expiration = request.POST.get('business_permit_expiry')
-        building_permit = request.POST.get('building_permit') == 'on'
-        bldg_number = request.POST.get('building_permit_number')
-        bldg_date_issued = request.POST.get('building_permit_issued')
-        bldg_expiration = request.POST.get('building_permit_expiry')
-        # Permits DENR EMB
-        pamb = request.POST.get('pamb') == 'on'
-        pamb_no = request.POST.get('pamb_number')
-        pamb_di = request.POST.get('pamb_issued')
-        sapa = request.POST.get('sapa') == 'on'
-        sapa_no = request.POST.get('sapa_number')
-        sapa_di = request.POST.get('sapa_issued')
-        pacbrma = request.POST.get('pacbrma') == 'on'
-        pacbrma_no = request.POST.get('pacbrma_number')
-        pacbrma_di = request.POST.get('pacbrma_issued')
-        ecc = request.POST.get('ecc') == 'on'
-        ecc_no = request.POST.get('ecc_number')
-        ecc_di = request.POST.get('ecc_issued')
-        discharge_permit = request.POST.get('discharge_permit') == 'on'
-        dp_no = request.POST.get('discharge_permit_number')
-        dp_di = request.POST.get('discharge_permit_issued')
-        permit_operate = request.POST.get('permit_operate') == 'on'
-        pto_no = request.POST.get('operate_permit_number')
-        pto_di = request.POST.get('operate_permit_issued')
-        emb_rp = request.POST.get('other_emb')
-        # Photos
-        photos = request.FILES.getlist('photos')
-        # Signatures
-        enumerator_signature = request.POST.get('enumerator_signature')
-        enumerator_date = request.POST.get('enumerator_date')
-        informant_signature = request.POST.get('informant_signature')
-        informant_date = request.POST.get('informant_date')
-        informant_reason = request.POST.get('refusal_reason')
-        pa_coordinator_signature = request.POST.get('pa_coordinator_signature')
-        apas_signature = request.POST.get('apas_signature')
-
-        # Create ProtectedArea
-        pa, created = ProtectedArea.objects.get_or_create(name=pa_name)
-
-        # Create LeasedPropertyProfile
-        profile = LeasedPropertyProfile.objects.create(
-            report_date=report_date,
-            proponent_name=proponent_name,
-            contact_no=contact_no,
-            location=location,
-            lot_status=lot_status,
-            land_classification_status=land_classification,
-            title_no=title_no,
-            lot_no=lot_no,
-            lot_owner=lot_owner,
-            latitude=latitude,
-            longitude=longitude,
-            area_covered=area_covered,
-            pa_management_zone=pa_zone,
-            establishment_status=establishment_status,
-            easement=easement,
-        )
-
-        # Create TypeOfEstablishment
-        types_str = ', '.join(establishment_types)
-        if other_establishment:
-            types_str += ', ' + other_establishment
-        establishment = TypeOfEstablishment.objects.create(
-            name=types_str,
-            description=establishment_description,
-        )
-
-        # Create PermitsLGU
-        lgu_permit = PermitsLGU.objects.create(
-            mayors_permit=mayors_permit,
-            mp_number=mp_number,
-            mpdi=mp_date_issued,
-            mped=mp_expiration,
-            business_permit=business_permit,
-            bp_number=bp_number,
-            bpdi=bp_date_issued,
-            bped=bp_expiration,
-            building_permit=building_permit,
-            bldg_number=bldg_number,
-            bldgdi=bldg_date_issued,
-            bldged=bldg_expiration,
-        )
-
-        # Create PermitsDENREMB
-        denr_emb = PermitsDENREMB.objects.create(
-            pamb_resolution=pamb,
-            pamb_resolution_no=pamb_no,
-            pamb_di=pamb_di,
-            sapa=sapa,
-            sapa_no=sapa_no,
-            sapa_di=sapa_di,
-            pacbrma=pacbrma,
-            pacbrma_no=pacbrma_no,
-            pacbrma_di=pacbrma_di,
-            ecc=ecc,
-            ecc_no=ecc_no,
-            ecc_di=ecc_di,
-            discharge_permit=discharge_permit,
-            dp_no=dp_no,
-            dp_di=dp_di,
-            permit_to_operate=permit_operate,
-            pto_no=pto_no,
-            pto_di=pto_di,
-            emb_rp=emb_rp,
-        )
-
-        # Create AttestationNotation
-        attestation = AttestationNotation.objects.create(
-            attested_by_name=pa_coordinator_signature,
-            attested_by_position="PA Coordinator",
-            noted_by_name=apas_signature,
-            noted_by_position="APAS",
-        )
-
-        # Handle photos
-        geo_images = []
-        for photo in photos:
-            import uuid
-            qr_code = str(uuid.uuid4())
-            geo_image = GeoTaggedImage.objects.create(
-                image=photo,
-                qr_code=qr_code,
-                latitude=latitude,
-                longitude=longitude,
-                location=location,
-                captured_by=request.user,
+        # The form carries a per-render key (see cenro_templates); API
+        # clients send an Idempotency-Key header. Retries of the same
+        # submission then return the original report.
+        try:
+            key = clean_key(
+                request.headers.get("Idempotency-Key") or request.POST.get("idempotency_key")
             )
-            geo_images.append(geo_image)
-
-        # Create EnumeratorsReport
-        report = EnumeratorsReport.objects.create(
-            report_date=report_date,
-            pa=pa,
-            profile=profile,
-            establishment=establishment,
-            lgu_permit=lgu_permit,
-            denr_emb=denr_emb,
-            attestation=attestation,
-            enumerator=request.user,
-            informant=None,  # Assuming no informant user
-            geo_tag_image=geo_images[0] if geo_images else None,
-            status='PENDING',
-        )
-
-        # Create notifications for CENRO users
-        cenro_users = User.objects.filter(role='CENRO', is_approved=True, is_deactivated=False)
-        for cenro in cenro_users:
-            Notification.objects.create(
-                user=cenro,
-                message=f"New enumerator report submitted by {request.user.username} and is pending approval.",
+            fields = parse_report(request.POST)
+            report, created = submit_report(
+                request.user, fields, request.FILES.getlist('photos'), key=key
+            )
+        except ReportError as e:
+            messages.error(request, str(e))
+            return redirect('CENRO_templates')
+
+        if created:
+            # Notify CENRO users
+            broadcast(
+                ["CENRO"],
+                f"New enumerator report submitted by {request.user.username} and is pending approval.",
             )
 
-        # Activity log
-        ActivityLog.objects.create(
-            user=request.user,
-            action="REPORT_CENRO",
-            details=f"Submitted enumerator report {report.id}",
-            ip_address=request.META.get("REMOTE_ADDR"),
-        )
+            # Activity log
+            log_activity(
+                request.user,
+                "REPORT_CENRO",
+                f"Submitted enumerator report {report.id}",
+                ip_address=request.META.get("REMOTE_ADDR"),
+            )
 
         messages.success(request, "Report submitted successfully and is pending approval by CENRO.")
         return redirect('CENRO_templates')
@@ -1353,8 +899,6 @@ def cenro_submit_report(request):
 # ----------------- PENRO Create Account -----------------
 @login_required
 def penro_create_account(request):
-    notifications, unread_count = get_unread_notifications(request)
-
     # Handle manual account creation
     if request.method == "POST" and request.POST.get("action") == "create_account":
         username = request.POST.get("username")
@@ -1397,15 +941,12 @@ def penro_create_account(request):
                 )
 
                 # Send notification to admins about new account created
-                for admin in User.objects.filter(role__in=['ADMIN', 'SUPER_ADMIN']):
-                    Notification.objects.create(
-                        user=admin, message=f"New {role} account created: {username} - Pending approval"
-                    )
-
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="CREATE",
-                    details=f"Created account for {username} ({role}) - ID: {id_number}",
+                broadcast(ADMIN_ROLES, f"New {role} account created: {username} - Pending approval")
+
+                log_activity(
+                    request.user,
+                    "CREATE",
+                    f"Created account for {username} ({role}) - ID: {id_number}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
 
@@ -1416,8 +957,6 @@ def penro_create_account(request):
                 return redirect("penro_create_account")
 
     return render(request, "PENRO/PENRO_create_account.html", {
-        "notifications": notifications,
-        "unread_count": unread_count,
     })
 
 
@@ -1432,19 +971,19 @@ def penro_reports(request):
             if action == "accept":
                 report.status = "ACCEPTED"
                 report.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="APPROVE",
-                    details=f"Accepted report {report_id} by {report.enumerator.username}",
+                log_activity(
+                    request.user,
+                    "APPROVE",
+                    f"Accepted report {report_id} by {report.enumerator.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
             elif action == "decline":
                 report.status = "DECLINED"
                 report.save()
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="REJECT",
-                    details=f"Declined report {report_id} by {report.enumerator.username}",
+                log_activity(
+                    request.user,
+                    "REJECT",
+                    f"Declined report {report_id} by {report.enumerator.username}",
                     ip_address=request.META.get("REMOTE_ADDR"),
                 )
         except EnumeratorsReport.DoesNotExist:
@@ -1452,7 +991,7 @@ def penro_reports(request):
 
     # Base querysets
     pending_reports = EnumeratorsReport.objects.filter(status="PENDING").select_related(
-        "enumerator", "pa", "profile"
+        "enumerator", "pa", "profile", "geo_tag_image"
     )
     accepted_reports = EnumeratorsReport.objects.filter(status="ACCEPTED").select_related(
         "enumerator", "pa", "profile"
@@ -1474,66 +1013,22 @@ def penro_reports(request):
         accepted_reports = accepted_reports.filter(report_date__lte=dto)
         declined_reports = declined_reports.filter(report_date__lte=dto)
 
-    # Get last login locations for CENRO users
+    # Get last login locations for CENRO users (for the table)
     cenro_users = User.objects.filter(role='CENRO', is_approved=True, is_deactivated=False)
-    cenro_locations = []
-    for user in cenro_users:
-        last_location_log = ActivityLog.objects.filter(
-            user=user, action='LOCATION_UPDATE'
-        ).order_by('-created_at').first()
-        if last_location_log and last_location_log.details:
-            try:
-                parts = last_location_log.details.split(': ')
-                if len(parts) == 2:
-                    coords = parts[1].split(', ')
-                    if len(coords) == 2:
-                        lat = float(coords[0])
-                        lon = float(coords[1])
-                        cenro_locations.append({
-                            'id': user.id,
-                            'username': user.username,
-                            'role': user.role,
-                            'lat': lat,
-                            'lon': lon,
-                            'last_update': last_location_log.created_at,
-                        })
-            except ValueError:
-                pass
+    cenro_locations = get_user_locations(cenro_users)
 
     # Get current user's last location
-    current_user_location = None
-    last_location_log = ActivityLog.objects.filter(
-        user=request.user, action='LOCATION_UPDATE'
-    ).order_by('-created_at').first()
-    if last_location_log and last_location_log.details:
-        try:
-            parts = last_location_log.details.split(': ')
-            if len(parts) == 2:
-                coords = parts[1].split(', ')
-                if len(coords) == 2:
-                    lat = float(coords[0])
-                    lon = float(coords[1])
-                    current_user_location = {
-                        'lat': lat,
-                        'lon': lon,
-                        'last_update': last_location_log.created_at,
-                    }
-        except ValueError:
-            pass
-
-    notifications, unread_count = get_unread_notifications(request)
+    current_user_location = get_user_location(request.user)
 
     return render(
         request,
         "PENRO/PENRO_reports.html",
         {
-            "pending_reports": pending_reports,
+            "pending_reports": flag_duplicates(pending_reports),
             "accepted_reports": accepted_reports,
             "declined_reports": declined_reports,
             "cenro_locations": cenro_locations,
             "current_user_location": current_user_location,
-            "notifications": notifications,
-            "unread_count": unread_count,
         },
     )
 
@@ -1541,65 +1036,19 @@ def penro_reports(request):
 # ----------------- PENRO Activity Logs -----------------
 @login_required
 def penro_activity_logs(request):
-    notifications, unread_count = get_unread_notifications(request)
+    filters = log_filters(request.GET)
+    logs_qs = filter_logs(filters, roles=LOG_SCOPES["penro_activity_logs"])
 
-    logs_qs = ActivityLog.objects.filter(user__role__in=['CENRO', 'EVALUATOR']).select_related("user").order_by("-created_at")
+    page_obj = CursorPaginator(logs_qs, 20).get_page(request.GET.get("cursor"))
 
-    # Filters
-    q = request.GET.get("q")
-    role = request.GET.get("role")
-    action = request.GET.get("action")
-    dfrom = request.GET.get("from")
-    dto = request.GET.get("to")
-    if q:
-        logs_qs = logs_qs.filter(
-            Q(user__username__icontains=q) | Q(details__icontains=q) | Q(action__icontains=q)
-        )
-    if role:
-        logs_qs = logs_qs.filter(user__role=role)
-    if action:
-        logs_qs = logs_qs.filter(action=action)
-    if dfrom:
-        logs_qs = logs_qs.filter(created_at__date__gte=dfrom)
-    if dto:
-        logs_qs = logs_qs.filter(created_at__date__lte=dto)
-
-    paginator = Paginator(logs_qs, 20)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
-
-    metrics = {
-        "total_events": logs_qs.count(),
-        "unique_users": logs_qs.values("user_id").distinct().count(),
-        "errors": logs_qs.filter(action="ERROR").count(),
-        "this_week": logs_qs.filter(created_at__gte=now() - timedelta(days=7)).count(),
-    }
-
-    total_events_breakdown = dict(logs_qs.values_list("action").annotate(c=Count("id")))
-    unique_user_ids = logs_qs.values("user_id").distinct()
-    unique_users_breakdown = dict(
-        logs_qs.filter(user_id__in=[u["user_id"] for u in unique_user_ids])
-        .values_list("action")
-        .annotate(c=Count("id"))
-    )
-    errors_breakdown = dict(
-        logs_qs.filter(action="ERROR").values_list("details").annotate(c=Count("id"))
-    )
-    this_week_qs = logs_qs.filter(created_at__gte=now() - timedelta(days=7))
-    this_week_breakdown = dict(this_week_qs.values_list("action").annotate(c=Count("id")))
+    metrics, breakdowns = activity_metrics(logs_qs, **filters, scope_roles=LOG_SCOPES["penro_activity_logs"])
 
     context = {
         "logs": page_obj.object_list,
         "page_obj": page_obj,
         "metrics": metrics,
-        "action_counts_json": json.dumps(total_events_breakdown),
-        "popup_data": {
-            "total_events": total_events_breakdown,
-            "unique_users": unique_users_breakdown,
-            "errors": errors_breakdown,
-            "this_week": this_week_breakdown,
-        },
-        "notifications": notifications,
-        "unread_count": unread_count,
+        "action_counts_json": json.dumps(breakdowns["total_events"]),
+        "popup_data": breakdowns,
     }
     return render(request, "PENRO/PENRO_activitylogs.html", context)
 
@@ -1626,7 +1075,13 @@ class UserViewSet(viewsets.ModelViewSet):
 @login_required
 def user_activity_detail(request, user_id):
     user = get_object_or_404(User, id=user_id)
-    logs = ActivityLog.objects.filter(user=user).order_by("-created_at")[:20]
+    # ?archived=1 pages through history already moved out by archive_activity_logs
+    archived = request.GET.get("archived") == "1"
+    if archived:
+        page_obj = archived_page(user, request.GET.get("cursor"), 20)
+    else:
+        page_obj = CursorPaginator(ActivityLog.objects.filter(user=user), 20).get_page(request.GET.get("cursor"))
+    logs = page_obj.object_list
 
     # Return JSON if AJAX request
     if request.headers.get("Accept") == "application/json":
@@ -1647,13 +1102,16 @@ def user_activity_detail(request, user_id):
                 "last_name": user.last_name,
             },
             "logs": logs_data,
+            "next_cursor": page_obj.next_cursor,
+            "previous_cursor": page_obj.previous_cursor,
+            "archived": archived,
         })
 
     # Otherwise render template
     return render(
         request,
         "ADMIN/user_activity_detail.html",
-        {"user": user, "logs": logs},
+        {"user": user, "logs": logs, "page_obj": page_obj, "archived": archived},
     )
 
 
@@ -1662,26 +1120,148 @@ def user_activity_detail(request, user_id):
 def update_location(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            latitude = data.get('latitude')
-            longitude = data.get('longitude')
-
-            if latitude and longitude:
-                # Log the location update
-                ActivityLog.objects.create(
-                    user=request.user,
-                    action="LOCATION_UPDATE",
-                    details=f"Location updated: {latitude}, {longitude}",
-                    ip_address=request.META.get("REMOTE_ADDR"),
-                )
-                return JsonResponse({"status": "success", "message": "Location updated successfully"})
-            else:
-                return JsonResponse({"status": "error", "message": "Invalid coordinates"}, status=400)
+            try:
+                data = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+            if not isinstance(data, dict):
+                return JsonResponse({"status": "error", "message": "Expected a location object"}, status=400)
+            try:
+                fix = clean_fix(data)
+            except ValueError as e:
+                return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+            # Store the location fix (unless it is redundant with the previous one)
+            ping = record_location(request.user, ip_address=request.META.get("REMOTE_ADDR"), **fix)
+            return JsonResponse({
+                "status": "success",
+                "message": "Location updated successfully",
+                "recorded": ping is not None,
+            })
         except Exception as e:
             return JsonResponse({"status": "error", "message": str(e)}, status=500)
     return JsonResponse({"status": "error", "message": "Method not allowed"}, status=405)
 
 
+@login_required
+def update_location_batch(request):
+    """
+    Batch variant of update_location for devices replaying an offline buffer.
+    Body: {"fixes": [{"latitude", "longitude", "accuracy", "timestamp"}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({"status": "error", "message": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+
+    fixes = data.get('fixes') if isinstance(data, dict) else data
+    if not isinstance(fixes, list) or not fixes:
+        return JsonResponse({"status": "error", "message": "Expected a non-empty list of fixes"}, status=400)
+    if len(fixes) > MAX_BATCH_FIXES:
+        return JsonResponse(
+            {"status": "error", "message": f"At most {MAX_BATCH_FIXES} fixes per request"}, status=400
+        )
+
+    results = record_locations(request.user, fixes, ip_address=request.META.get("REMOTE_ADDR"))
+    return JsonResponse({
+        "status": "success",
+        "accepted": sum(1 for r in results if r["status"] == "ok"),
+        "dropped": sum(1 for r in results if r["status"] == "dropped"),
+        "rejected": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
+    })
+
+
+async def location_stream(request):
+    """
+    Server-sent events stream of position changes for the dashboard maps
+    (event "location", data as in get_user_locations()). Limited to the
+    roles the viewer's maps show; ?roles=A,B narrows it further. Each
+    stream ends after LIVE_LOCATIONS["MAX_STREAM_S"] and the browser
+    reconnects on its own. Needs an ASGI server.
+    """
+    if "wsgi.version" in request.META:
+        return JsonResponse({"status": "error", "message": "Live updates need the ASGI server"}, status=501)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"status": "error", "message": "Authentication required"}, status=401)
+    try:
+        scope = live_scope(user.role, request.GET.get("roles"))
+    except KeyError:
+        return JsonResponse({"status": "error", "message": "Forbidden"}, status=403)
+
+    config = get_live_settings()
+
+    async def events():
+        yield f"retry: {int(config['RETRY_MS'])}\n\n"
+        deadline = time.monotonic() + config["MAX_STREAM_S"]
+        async with get_broker().subscribe(LOCATION_CHANNEL) as sub:
+            while time.monotonic() < deadline:
+                message = await sub.get(config["HEARTBEAT_S"])
+                if message is None:
+                    yield ": keep-alive\n\n"
+                elif message["id"] != user.pk and (scope is None or message["role"] in scope):
+                    yield f"event: location\ndata: {json.dumps(message)}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+def map_features(request):
+    """
+    GeoJSON for the dashboard maps: ?layers=staff,reports,images inside
+    ?bbox=west,south,east,north, grid-clustered for ?zoom. Staff positions
+    are limited to the roles the viewer may see (?roles= narrows them).
+    """
+    try:
+        roles = live_scope(request.user.role, request.GET.get("roles"))
+    except KeyError:
+        return JsonResponse({"status": "error", "message": "Forbidden"}, status=403)
+    layers = request.GET.get("layers", "staff").split(",")
+    if not set(layers) <= set(LAYERS):
+        return JsonResponse({"status": "error", "message": "Unknown layer"}, status=400)
+    try:
+        bbox = parse_bbox(request.GET.get("bbox"))
+        zoom = int(request.GET.get("zoom", 8))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid bbox or zoom"}, status=400)
+    return JsonResponse(feature_collection(request.user, layers, bbox, zoom, roles))
+
+
+@login_required
+def map_nearby(request):
+    """
+    Nearest report locations or geotagged images to ?lat=&lon=: everything
+    within ?radius= metres, or the ?k= nearest (at most MAX_NEARBY).
+    """
+    try:
+        live_scope(request.user.role)
+    except KeyError:
+        return JsonResponse({"status": "error", "message": "Forbidden"}, status=403)
+    layer = request.GET.get("layer", "reports")
+    if layer not in LAYERS or not LAYERS[layer].indexed:
+        return JsonResponse({"status": "error", "message": "Unknown layer"}, status=400)
+    try:
+        lat, lon = float(request.GET["lat"]), float(request.GET["lon"])
+        radius = float(request.GET["radius"]) if request.GET.get("radius") else None
+        k = min(int(request.GET.get("k", 10)), MAX_NEARBY)
+    except (KeyError, ValueError):
+        return JsonResponse({"status": "error", "message": "lat and lon are required"}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or k < 1 or (radius is not None and radius <= 0):
+        return JsonResponse({"status": "error", "message": "Invalid lat, lon, radius or k"}, status=400)
+    return JsonResponse(nearby_features(request.user, layer, lat, lon, radius, k))
+
+
+@user_passes_test(is_admin)
+def location_filter_stats(request):
+    return JsonResponse(get_filter_stats())
+
+
 # ----------------- Welcome API -----------------
 def welcome_api(request):
     logging.info(f"Request received: {request.method} {request.path}")
@@ -1707,10 +1287,10 @@ def api_login(request):
 
             token, created = Token.objects.get_or_create(user=user)
             user_serializer = UserSerializer(user)
-            ActivityLog.objects.create(
-                user=user,
-                action="LOGIN",
-                details=f"Logged in via API from {request.META.get('REMOTE_ADDR', 'unknown')}",
+            log_activity(
+                user,
+                "LOGIN",
+                f"Logged in via API from {request.META.get('REMOTE_ADDR', 'unknown')}",
                 ip_address=request.META.get("REMOTE_ADDR"),
             )
             return Response({
@@ -1722,6 +1302,190 @@ def api_login(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ----------------- Bulk Report API -----------------
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_reports_batch(request):
+    """
+    Sync queued enumerator reports from the mobile app in one request.
+    Body: {"reports": [{<enumerator form fields>, "photos": [...],
+    "idempotency_key": "..."}, ...]}. Every report is validated before
+    anything is written; the response lists, per report and in order,
+    {"status": "created" | "duplicate", "id"} or {"status": "error",
+    "message"}. Resending a report with the same key is safe.
+    """
+    items = request.data.get('reports') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list) or not items:
+        return Response({"status": "error", "message": "Expected a non-empty list of reports"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_BATCH_REPORTS:
+        return Response({"status": "error", "message": f"At most {MAX_BATCH_REPORTS} reports per request"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    submissions, results = [], [None] * len(items)
+    for i, item in enumerate(items):
+        try:
+            submissions.append((i, parse_submission(item)))
+        except ReportError as e:
+            results[i] = {"status": "error", "message": str(e)}
+
+    outcomes = store_reports(request.user, [s for _, s in submissions])
+    created = []
+    for (i, _), outcome in zip(submissions, outcomes):
+        if outcome.error:
+            results[i] = {"status": "error", "message": outcome.error}
+        else:
+            results[i] = {"status": "created" if outcome.created else "duplicate", "id": outcome.report.id}
+            if outcome.created:
+                created.append(outcome.report.id)
+
+    if created:
+        broadcast(
+            ["CENRO"],
+            f"{len(created)} new enumerator report(s) submitted by {request.user.username} and pending approval.",
+        )
+        log_activity(
+            request.user,
+            "REPORT_CENRO",
+            f"Submitted enumerator reports {', '.join(map(str, created))}",
+            ip_address=request.META.get("REMOTE_ADDR"),
+        )
+    return Response({
+        "status": "success",
+        "created": len(created),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "rejected": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
+    })
+
+
+# ----------------- Resumable Photo Uploads -----------------
+def _upload_state(session):
+    return {
+        "id": str(session.id),
+        "offset": session.received,
+        "size": session.size,
+        "complete": session.received == session.size,
+        "image_id": session.image_id,
+    }
+
+
+def _upload_error(e, session=None):
+    body = {"status": "error", "message": str(e)}
+    if session is not None:
+        body["offset"] = session.received
+    return Response(body, status=e.status)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_create(request):
+    """
+    Start a resumable photo upload.
+    Body: {"filename", "size", "sha256"?, "latitude"?, "longitude"?, "location"?}
+    Then PUT byte ranges to the returned url with a Content-Range header
+    (GET it for the offset to resume from) and POST to url + "finalize/".
+    """
+    data = request.data if isinstance(request.data, dict) else {}
+    try:
+        session = create_upload(
+            request.user, data.get("filename"), data.get("size"), data.get("sha256"),
+            data.get("latitude"), data.get("longitude"), data.get("location"),
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    url = reverse("upload_detail", args=[session.id])
+    return Response({**_upload_state(session), "url": url}, status=status.HTTP_201_CREATED,
+                    headers={"Location": url})
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_detail(request, upload_id):
+    """
+    GET: the offset to resume from. PUT: bytes <first>-<last>/<size> of the
+    file as the raw body, <first> being the current offset. DELETE: abort.
+    """
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method == 'DELETE':
+        abort_upload(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    if request.method == 'PUT':
+        try:
+            start, end = parse_content_range(request.headers.get("Content-Range"), session.size)
+            try:
+                length = int(request.headers.get("Content-Length") or 0)
+            except ValueError:
+                raise UploadError("Invalid Content-Length")
+            if length != end - start:
+                raise UploadError("Content-Length does not match Content-Range")
+            # Read the raw stream; request.data would buffer the body
+            write_chunk(session, request.stream, start, end)
+        except UploadError as e:
+            return _upload_error(e, session)
+    return Response(_upload_state(session), headers={"Upload-Offset": str(session.received)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_finalize(request, upload_id):
+    """
+    Check a complete upload against its sha256 and attach it to a new
+    GeoTaggedImage. Body (optional): {"latitude", "longitude", "location"}.
+    The returned image_id can be listed in a report's "photos".
+    """
+    session = get_object_or_404(
+        UploadSession.objects.select_related("image"), pk=upload_id, user=request.user
+    )
+    data = request.data if isinstance(request.data, dict) else {}
+    try:
+        image = finalize_upload(session, data.get("latitude"), data.get("longitude"), data.get("location"))
+    except UploadError as e:
+        return _upload_error(e, session)
+    return Response({**_upload_state(session), "image": image.image})
+
+
+# ----------------- Photos -----------------
+@login_required
+def image_variant(request, digest, variant):
+    """
+    A stored photo ("original") or one of its IMAGES["VARIANTS"]. Files
+    are content-addressed and never change, so they are cached for
+    CACHE_MAX_AGE and revalidated by ETag. While a derivative is still
+    being rendered the original is sent instead, uncached.
+    """
+    config = get_image_settings()
+    if variant != "original" and variant not in config["VARIANTS"]:
+        return JsonResponse({"status": "error", "message": "Unknown variant"}, status=404)
+    image = get_object_or_404(GeoTaggedImage.objects.filter(sha256=digest).only("image")[:1])
+
+    name, served = image.image, "original"
+    if variant != "original":
+        derived = derivative_name(digest, variant)
+        if default_storage.exists(derived):
+            name, served = derived, variant
+        else:
+            schedule_derivatives(StoredImage(image.image, digest))
+
+    etag = f'"{digest}-{served}"'
+    if served == variant:
+        cache_headers = {"Cache-Control": f"private, max-age={config['CACHE_MAX_AGE']}, immutable"}
+    else:
+        cache_headers = {"Cache-Control": "private, no-cache"}
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            response = FileResponse(default_storage.open(name, "rb"),
+                                    content_type=mimetypes.guess_type(name)[0] or "image/jpeg")
+        except FileNotFoundError:
+            return JsonResponse({"status": "error", "message": "Photo file missing"}, status=404)
+    response["ETag"] = etag
+    for header, value in cache_headers.items():
+        response[header] = value
+    return response
+
+
 # ----------------- CSRF Failure -----------------
 def csrf_failure(request, reason=""):
     return render(request, '403.html', status=403)